@@ -0,0 +1,85 @@
+""" Measures the overhead the global filter criteria of `FilteredSession`
+add to each query.
+
+Compares a plain session, the criteria created anew for each query (how
+`FilteredSession` used to work) and the precomputed criteria::
+
+    python benchmarks/loader_criteria.py development.ini
+
+"""
+from __future__ import annotations
+import click
+from pyramid.paster import get_appsettings
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, with_loader_criteria
+from time import perf_counter
+
+from privatim.models import Consultation
+from privatim.models.soft_delete import all_soft_delete_models
+from privatim.orm import FilteredSession, get_engine
+from privatim.orm.instrumentation import collect_sql_stats, instrument_engine
+
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.orm import ORMExecuteState
+
+
+class PerQueryCriteriaSession(Session):
+    """ Creates the criteria for every query. """
+
+    def __init__(self, *args: object, **kwargs: object) -> None:
+        super().__init__(*args, **kwargs)  # type:ignore[arg-type]
+
+        @event.listens_for(self, 'do_orm_execute')
+        def add_criteria(state: ORMExecuteState) -> None:
+            if (
+                state.is_select
+                and not state.is_column_load
+                and not state.is_relationship_load
+            ):
+                state.statement = state.statement.options(
+                    with_loader_criteria(
+                        Consultation,
+                        Consultation.is_latest_version == 1
+                    ),
+                    *(
+                        with_loader_criteria(model, model.deleted.is_(False))
+                        for model in all_soft_delete_models()
+                    )
+                )
+
+
+def run(engine: Engine, session_class: type[Session], rounds: int) -> str:
+    with session_class(bind=engine) as session:
+        # warm up the connection and the compiled cache
+        session.execute(select(Consultation).limit(1)).all()
+
+        with collect_sql_stats() as stats:
+            start = perf_counter()
+            for __ in range(rounds):
+                session.execute(select(Consultation).limit(1)).all()
+            duration = perf_counter() - start
+
+    return (
+        f'{session_class.__name__:<24} '
+        f'{duration / rounds * 1_000_000:8.1f}µs per query, '
+        f'{stats.cache_hits}/{rounds} compiled cache hits'
+    )
+
+
+@click.command()
+@click.argument('config_uri')
+@click.option('--rounds', default=2000)
+def main(config_uri: str, rounds: int) -> None:
+    settings = get_appsettings(config_uri)
+    engine = get_engine(settings)
+    instrument_engine(engine)
+
+    for session_class in (Session, PerQueryCriteriaSession, FilteredSession):
+        click.echo(run(engine, session_class, rounds))
+
+
+if __name__ == '__main__':
+    main()
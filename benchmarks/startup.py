@@ -0,0 +1,166 @@
+""" Measures the import time and memory of the application and of each
+console script, each in a fresh interpreter::
+
+    python benchmarks/startup.py
+
+It fails if one of the heavy dependencies, which should only be loaded
+on first use, is imported at startup.
+
+To catch regressions, record a baseline on the machine running the
+benchmark first. Later runs fail if they are slower or use more memory
+than the baseline allows for::
+
+    python benchmarks/startup.py --update
+    python benchmarks/startup.py --baseline benchmarks/startup.json
+
+"""
+from __future__ import annotations
+import click
+import json
+import subprocess  # nosec:B404
+import sys
+from configparser import ConfigParser
+from pathlib import Path
+
+
+from typing import Any
+
+
+ROOT = Path(__file__).parent.parent
+
+# loaded lazily by the report, text extraction and avatar code
+HEAVY_MODULES = (
+    'bleach',
+    'docx',
+    'html2text',
+    'lxml',
+    'magic',
+    'pdftotext',
+    'PIL',
+    'weasyprint',
+)
+
+MEASURE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+obj = {module}.{attr}
+duration = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': duration,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'heavy': sorted(m for m in {heavy!r} if m in sys.modules),
+}}))
+"""
+
+
+def entry_points() -> dict[str, str]:
+    """ The application and the console scripts of setup.cfg. """
+    config = ConfigParser()
+    config.read(ROOT / 'setup.cfg')
+    scripts = config['options.entry_points']['console_scripts']
+    targets = {'privatim.main': 'privatim:main'}
+    for line in scripts.strip().splitlines():
+        name, __, target = line.partition('=')
+        targets[name.strip()] = target.strip()
+    return targets
+
+
+def measure(target: str, rounds: int) -> dict[str, Any]:
+    """ Imports the target in `rounds` fresh interpreters and returns the
+    fastest import time and the smallest peak memory. """
+    module, __, attr = target.partition(':')
+    code = MEASURE.format(module=module, attr=attr, heavy=HEAVY_MODULES)
+    results = []
+    for __ in range(rounds):
+        output = subprocess.run(  # nosec:B603
+            [sys.executable, '-c', code],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+
+    return {
+        'seconds': min(r['seconds'] for r in results),
+        'rss_kb': min(r['rss_kb'] for r in results),
+        'heavy': results[0]['heavy'],
+    }
+
+
+@click.command()
+@click.option('--rounds', default=5)
+@click.option(
+    '--baseline',
+    type=click.Path(path_type=Path),
+    default=ROOT / 'benchmarks' / 'startup.json',
+    show_default=True,
+)
+@click.option('--update', is_flag=True, help='Record a new baseline')
+@click.option(
+    '--time-tolerance',
+    default=1.5,
+    help='Allowed factor over the baseline import time'
+)
+@click.option(
+    '--memory-tolerance',
+    default=1.1,
+    help='Allowed factor over the baseline memory'
+)
+def main(
+    rounds: int,
+    baseline: Path,
+    update: bool,
+    time_tolerance: float,
+    memory_tolerance: float
+) -> None:
+    previous = {}
+    if baseline.exists() and not update:
+        previous = json.loads(baseline.read_text())
+
+    results = {}
+    failures = []
+    for name, target in entry_points().items():
+        result = results[name] = measure(target, rounds)
+        click.echo(
+            f'{name:<18} {result["seconds"] * 1000:7.1f}ms '
+            f'{result["rss_kb"] / 1024:7.1f}MB'
+        )
+        if result['heavy']:
+            failures.append(
+                f'{name} imports {", ".join(result["heavy"])} at startup'
+            )
+
+        expected = previous.get(name)
+        if expected is None:
+            continue
+        if result['seconds'] > expected['seconds'] * time_tolerance:
+            failures.append(
+                f'{name} takes {result["seconds"] * 1000:.1f}ms to import, '
+                f'{expected["seconds"] * 1000:.1f}ms before'
+            )
+        if result['rss_kb'] > expected['rss_kb'] * memory_tolerance:
+            failures.append(
+                f'{name} uses {result["rss_kb"] / 1024:.1f}MB after import, '
+                f'{expected["rss_kb"] / 1024:.1f}MB before'
+            )
+
+    if update:
+        baseline.write_text(json.dumps(
+            {
+                name: {'seconds': r['seconds'], 'rss_kb': r['rss_kb']}
+                for name, r in results.items()
+            },
+            indent=2,
+            sort_keys=True,
+        ))
+        click.echo(f'Recorded the baseline in {baseline}')
+
+    if failures:
+        for failure in failures:
+            click.echo(failure, err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
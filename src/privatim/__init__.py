@@ -13,11 +13,18 @@ from privatim import helpers
 from pyramid.config import Configurator
 from pyramid_beaker import session_factory_from_settings
 from sqlalchemy import (Column, ForeignKey, String, TIMESTAMP, func, Computed,
-                        VARCHAR, text, Boolean, table, column)
+                        VARCHAR, text, Boolean, table, column, exists, or_,
+                        select)
 from email.headerregistry import Address
 
 from privatim.mail import PostmarkMailer
+from privatim.models import GeneralFile, ImageVariant, User
 from privatim.models.comment import COMMENT_DELETED_MSG
+from privatim.models.profile_pic import (
+    profile_pic_cache,
+    resolve_default_profile_pic,
+)
+from privatim.orm import Base
 from privatim.orm.uuid_type import UUIDStr as UUIDStrType
 
 from pyramid.settings import asbool
@@ -25,8 +32,12 @@ from privatim.file.setup import setup_filestorage
 from privatim.flash import MessageQueue
 from privatim.i18n import LocaleNegotiator
 from privatim.route_factories.root_factory import root_factory
+from privatim.static import get_default_profile_pic_data
 from privatim.security import authenticated_user
 from privatim.security_policy import SessionSecurityPolicy
+from privatim.sessions import (
+    session_factory_from_settings as pg_session_factory_from_settings
+)
 from privatim.sms.sms_gateway import ASPSMSGateway
 
 
@@ -57,7 +68,9 @@ def includeme(config: Configurator) -> None:
         Address(addr_spec=default_sender),
         token,
         stream,
-        blackhole=blackhole
+        blackhole=blackhole,
+        retries=int(settings.get('mail.postmark_retries', 3)),
+        pool_size=int(settings.get('mail.postmark_pool_size', 10)),
     ))
     smsdir = settings.get('sms.queue_path', '')
     config.registry.registerUtility(ASPSMSGateway(smsdir))
@@ -76,7 +89,16 @@ def includeme(config: Configurator) -> None:
 
     register_subscribers(config)
 
-    session_factory = session_factory_from_settings(settings)
+    if settings.get('session.type') == 'postgresql':
+        dbsession_factory = config.registry[  # type:ignore[index]
+            'dbsession_factory'
+        ]
+        # the class is the factory, its instances are the sessions
+        session_factory: Any = pg_session_factory_from_settings(
+            settings, dbsession_factory.kw['bind']
+        )
+    else:
+        session_factory = session_factory_from_settings(settings)
     config.set_session_factory(session_factory)
 
     security_policy = SessionSecurityPolicy(timeout=28800)
@@ -88,16 +110,22 @@ def includeme(config: Configurator) -> None:
     config.add_request_method(authenticated_user, 'user', property=True)
 
     def profile_pic(request: IRequest) -> str:
-        user = request.user
-        if not user:
+        identity = request.identity
+        if not identity:
             return ''
-        return request.route_url('download_file', id=user.picture.id)
+        # sized for the navbar
+        return profile_pic_cache.url(request, identity.id, 80)
 
-    # todo: this can probably be cached:
     config.add_request_method(profile_pic, 'profile_pic', property=True)
 
     config.add_request_method(MessageQueue, 'messages', reify=True)
 
+    if asbool(settings.get('sql_stats.enabled')):
+        config.add_tween('privatim.tweens.sql_stats_tween_factory')
+
+    if settings.get('metrics.token'):
+        config.add_tween('privatim.tweens.metrics_tween_factory')
+
     rev = settings.get('git_revision', '')
     config.add_request_method(lambda r: rev, 'git_revision')
 
@@ -145,7 +173,10 @@ def main(
             dsn=sentry_dsn,
             environment=sentry_environment,
             integrations=[PyramidIntegration(), SqlalchemyIntegration()],
-            traces_sample_rate=1.0,
+            # with metrics enabled, tracing every request is rarely needed
+            traces_sample_rate=float(
+                settings.get('sentry_traces_sample_rate', 1.0)
+            ),
             profiles_sample_rate=0.25,
         )
 
@@ -155,6 +186,10 @@ def main(
         includeme(config)
         config.add_subscriber(add_renderer_globals, BeforeRender)
 
+    resolve_default_profile_pic(
+        config.registry['dbsession_factory']  # type:ignore[index]
+    )
+
     app = config.make_wsgi_app()
     return Fanstatic(app, versioning=True)
 
@@ -258,6 +293,265 @@ def create_meeting_edit_events_and_migrate_data(
         print(f'Created {len(edit_events_to_insert)} meeting edit evnt items.')
 
 
+def migrate_agenda_item_state_preferences(context: UpgradeContext) -> None:
+    """
+    Moves the agenda item display states from one row per agenda item to one
+    row per user and meeting, then drops the old table. Duplicate rows of the
+    old table collapse into a single entry.
+    """
+    old_table = 'agenda_item_state_preferences'
+    if not context.has_table(old_table):
+        return
+
+    assert context.has_table('agenda_item_display_states')
+    context.operations.execute(
+        f"""
+        INSERT INTO agenda_item_display_states (user_id, meeting_id, states)
+        SELECT p.user_id, a.meeting_id,
+               jsonb_object_agg(p.agenda_item_id::text, p.state)
+        FROM {old_table} p
+        JOIN agenda_items a ON a.id = p.agenda_item_id
+        GROUP BY p.user_id, a.meeting_id
+        ON CONFLICT (user_id, meeting_id) DO NOTHING
+        """  # nosec[B608]
+    )
+    context.drop_table(old_table)
+    print(f'Migrated {old_table} to agenda_item_display_states.')
+
+
+def generate_image_variants(context: UpgradeContext) -> None:
+    """ Generates the scaled down variants of existing profile pictures,
+    see `ImageVariant`. """
+    session = context.session
+    default_filename, __ = get_default_profile_pic_data()
+    files = session.scalars(
+        select(GeneralFile)
+        .where(or_(
+            GeneralFile.id.in_(select(User.profile_pic_id)),
+            GeneralFile.filename == default_filename,
+        ))
+        .where(~exists().where(ImageVariant.file_id == GeneralFile.id))
+    ).all()
+
+    for general_file in files:
+        try:
+            general_file.generate_variants()
+        except Exception as e:
+            # e.g. the file is missing in the storage
+            print(f'Skipped variants of file {general_file.id}: {e!s}')
+    session.flush()
+    if files:
+        print(f'Generated image variants for {len(files)} files.')
+
+
+# partial indexes matching the global filters of `FilteredSession`
+PARTIAL_INDEXES = (
+    ('consultations', 'ix_consultations_latest_created'),
+    ('searchable_files', 'ix_searchable_files_consultation_id_not_deleted'),
+    ('searchable_files', 'ix_searchable_files_meeting_id_not_deleted'),
+)
+
+
+def create_partial_indexes(context: UpgradeContext) -> None:
+    """ Builds the partial indexes declared on the models concurrently,
+    so the tables stay writable on large installations. """
+    for table_name, index_name in PARTIAL_INDEXES:
+        index = next(
+            index for index in Base.metadata.tables[table_name].indexes
+            if index.name == index_name
+        )
+        if context.create_index_concurrently(index):
+            print(f'Created index {index_name}.')
+
+
+# the expiry of the TANs and password change tokens, see `TAN.expires`
+TOKEN_EXPIRY = (
+    ('tans', "interval '72 hours'"),
+    ('password_change_tokens', "interval '48 hours'"),
+)
+
+
+def add_token_expiry(context: UpgradeContext) -> None:
+    """ Adds the indexed expiry timestamp of the TANs and password change
+    tokens, so the expired ones can be purged, see `purge_tokens`. """
+    for table_name, lifetime in TOKEN_EXPIRY:
+        if context.add_column(
+            table_name,
+            Column('expires', TIMESTAMP(timezone=False), nullable=True)
+        ):
+            # LEAST ignores the time_expired of the unexpired ones
+            context.session.execute(text(f"""
+                UPDATE {table_name}
+                   SET expires = LEAST(time_requested + {lifetime},
+                                       time_expired)
+            """))  # nosec[B608]
+            context.alter_column(table_name, 'expires', nullable=False)
+        context.create_index(
+            f'ix_{table_name}_expires', table_name, ['expires']
+        )
+
+    # the lookup of `MTanTool.tan` replaces the separate indexes
+    context.create_index('ix_tans_user_id_tan', 'tans', ['user_id', 'tan'])
+    context.drop_index('ix_tans_user_id', 'tans')
+    context.drop_index('ix_tans_tan', 'tans')
+
+
+def migrate_searchable_file_parents(context: UpgradeContext) -> None:
+    """ Replaces the generic parent of searchable files with a foreign key
+    for each type of parent. """
+    print("Migrating SearchableFile parent structure...")
+    table_name = 'searchable_files'
+    old_parent_id_col = 'parent_id'  # Old column storing the parent ID
+    old_parent_type_col = 'parent_type'  # Old column storing parent type
+    consultation_fk_col = 'consultation_id'  # New FK for Consultations
+    meeting_fk_col = 'meeting_id'  # New FK column for Meetings
+    constraint_name = f'chk_{table_name}_one_parent'  # Ensures one FK is set
+    consultation_idx = f'ix_{table_name}_{consultation_fk_col}'
+    meeting_idx = f'ix_{table_name}_{meeting_fk_col}'
+
+    # Step 1: Add new FK columns (nullable initially) if they don't exist
+    consultation_col_exists = context.has_column(
+        table_name, consultation_fk_col)
+    if not consultation_col_exists:
+        print(f"  Adding column {consultation_fk_col} to {table_name}")
+        context.add_column(
+            table_name,
+            Column(
+                consultation_fk_col,
+                UUIDStrType,
+                ForeignKey('consultations.id', ondelete='CASCADE'),
+                nullable=True
+            )
+        )
+    else:
+        print(f"  Column {consultation_fk_col} already exists in {table_name}")
+        # Ensure it's nullable for data migration step if it exists
+        context.alter_column(table_name, consultation_fk_col, nullable=True)
+
+    meeting_col_exists = context.has_column(table_name, meeting_fk_col)
+    if not meeting_col_exists:
+        print(f"  Adding column {meeting_fk_col} to {table_name}")
+        context.add_column(
+            table_name,
+            Column(
+                meeting_fk_col,
+                UUIDStrType,
+                ForeignKey('meetings.id', ondelete='CASCADE'),
+                nullable=True
+            )
+        )
+    else:
+        print(f"  Column {meeting_fk_col} already exists in {table_name}")
+        # Ensure it's nullable for data migration step if it exists
+        context.alter_column(table_name, meeting_fk_col, nullable=True)
+
+    # Step 2: Migrate data from old columns to new columns if old columns exist
+    old_id_col_exists = context.has_column(table_name, old_parent_id_col)
+    old_type_col_exists = context.has_column(table_name, old_parent_type_col)
+
+    if old_id_col_exists and old_type_col_exists:
+        print("  Migrating data from old parent columns to new FK columns...")
+        # Migrate Consultations
+        update_consultations = text(f"""
+            UPDATE {table_name}
+            SET {consultation_fk_col} = {old_parent_id_col}::uuid
+            WHERE {old_parent_type_col} = 'consultations'
+            AND {consultation_fk_col} IS NULL -- Only update if not already set
+        """)  # nosec[B608]
+        context.session.execute(update_consultations)
+
+        # Migrate Meetings (if they were ever supported by old columns)
+        update_meetings = text(f"""
+            UPDATE {table_name}
+            SET {meeting_fk_col} = {old_parent_id_col}::uuid
+            WHERE {old_parent_type_col} = 'meetings'
+            AND {meeting_fk_col} IS NULL -- Only update if not already set
+        """)  # nosec[B608]
+        context.session.execute(update_meetings)
+        print("  Data migration complete.")
+    else:
+        print("  Old parent columns not found, skipping data migration.")
+
+    # Step 3: Add Check Constraint if it doesn't exist
+    # This ensures exactly one parent FK is set going forward.
+    # We add this *after* data migration.
+    if not context.has_constraint(table_name, constraint_name, 'CHECK'):
+        print(f"  Adding check constraint {constraint_name} to {table_name}")
+        try:
+            context.operations.create_check_constraint(
+                constraint_name=constraint_name,
+                table_name=table_name,
+                condition=f"num_nonnulls({consultation_fk_col}, "
+                f"{meeting_fk_col}) = 1"
+            )
+            print(f"  Added check constraint {constraint_name}.")
+        except Exception as e:
+            # It might fail if there's data violating the constraint *after*
+            # migration
+            print(
+                f"  ERROR: Could not add check constraint {constraint_name}. "
+                f"Check data in {table_name} - rows must have exactly one "
+                f"of {consultation_fk_col} or {meeting_fk_col} set. "
+                f"Error: {e}"
+            )
+            # Depending on policy, you might raise an error here or just warn
+    else:
+        print(f"  Check constraint {constraint_name} already exists.")
+
+    # Step 4: Add Indexes for new FK columns if they don't exist
+    if not context.index_exists(table_name, consultation_idx):
+        print(f"  Adding index {consultation_idx} to {table_name}")
+        context.operations.create_index(
+            consultation_idx, table_name, [consultation_fk_col]
+        )
+    else:
+        print(f"  Index {consultation_idx} already exists.")
+
+    if not context.index_exists(table_name, meeting_idx):
+        print(f"  Adding index {meeting_idx} to {table_name}")
+        context.operations.create_index(
+            meeting_idx, table_name, [meeting_fk_col]
+        )
+    else:
+        print(f"  Index {meeting_idx} already exists.")
+
+    # Step 5: Drop old columns if they exist
+    if context.drop_column(table_name, old_parent_id_col):
+        print(f"  Dropped old column {old_parent_id_col} from {table_name}.")
+    if context.drop_column(table_name, old_parent_type_col):
+        print(f"  Dropped old column {old_parent_type_col} from {table_name}.")
+
+    print("Finished migrating SearchableFile parent structure.")
+
+
+def require_user_names(context: UpgradeContext) -> None:
+    """ Makes the name of users not nullable anymore. """
+    # First, update any existing NULL values to an empty string
+    context.operations.execute(
+        "UPDATE users SET first_name = '' WHERE first_name IS NULL"
+    )
+    context.operations.execute(
+        "UPDATE users SET last_name = '' WHERE last_name IS NULL"
+    )
+
+    # Now, alter the columns to be NOT NULL
+    context.alter_column(
+        'users',
+        'first_name',
+        existing_type=VARCHAR(length=256),
+        nullable=False,
+        server_default='',
+    )
+
+    context.alter_column(
+        'users',
+        'last_name',
+        existing_type=VARCHAR(length=256),
+        nullable=False,
+        server_default='',
+    )
+
+
 def upgrade(context: UpgradeContext) -> None:
     context.add_column(
         'meetings',
@@ -342,16 +636,12 @@ def upgrade(context: UpgradeContext) -> None:
 
     )
 
-    if not context.index_exists(
-        'searchable_files', 'idx_searchable_files_searchable_text_de_CH'
-    ):
-        # this needs to be added in the second run
-        context.operations.create_index(
-            'idx_searchable_files_searchable_text_de_CH',
-            'searchable_files',
-            ['searchable_text_de_CH'],
-            postgresql_using='gin',
-        )
+    context.create_index(
+        'idx_searchable_files_searchable_text_de_CH',
+        'searchable_files',
+        ['searchable_text_de_CH'],
+        postgresql_using='gin',
+    )
 
     # Drop all existing comments and related tables
     context.drop_table('comments_for_consultations_comments')
@@ -375,33 +665,7 @@ def upgrade(context: UpgradeContext) -> None:
         Column('locale', String(32), nullable=True)
     )
 
-    # Make name of user not nullable anymore
-    # First, update any existing NULL values to an empty string
-    context.operations.execute(
-        "UPDATE users SET first_name = '' WHERE first_name IS NULL"
-    )
-    context.operations.execute(
-        "UPDATE users SET last_name = '' WHERE last_name IS NULL"
-    )
-
-    # Now, alter the columns to be NOT NULL
-    context.alter_column(
-        'users',
-        'first_name',
-        existing_type=VARCHAR(length=256),
-        nullable=False,
-        server_default='',
-    )
-
-    context.alter_column(
-        'users',
-        'last_name',
-        existing_type=VARCHAR(length=256),
-        nullable=False,
-        server_default='',
-    )
-
-    fix_user_constraints_to_work_with_hard_delete(context)
+    context.run_step(require_user_names)
 
     # Add 'deleted' column to 'consultations' table
     context.add_column(
@@ -425,25 +689,12 @@ def upgrade(context: UpgradeContext) -> None:
         ),
     )
 
-    if not context.index_exists(
-            'consultations', 'ix_consultations_deleted'
-    ):
-        context.operations.create_index(
-            context.operations.f('ix_consultations_deleted'),
-            'consultations',
-            ['deleted'],
-            unique=False,
-        )
-
-    if not context.index_exists(
-        'searchable_files', 'ix_searchable_files_deleted'
-    ):
-        context.operations.create_index(
-            context.operations.f('ix_searchable_files_deleted'),
-            'searchable_files',
-            ['deleted'],
-            unique=False,
-        )
+    context.create_index(
+        'ix_consultations_deleted', 'consultations', ['deleted']
+    )
+    context.create_index(
+        'ix_searchable_files_deleted', 'searchable_files', ['deleted']
+    )
 
     context.add_column('users', Column('tags', String(255), nullable=True))
 
@@ -532,137 +783,13 @@ def upgrade(context: UpgradeContext) -> None:
 
     context.drop_column('consultations', 'updated')
 
-    # --- Migrate SearchableFile parent relationship ---
-    print("Migrating SearchableFile parent structure...")
-    table_name = 'searchable_files'
-    old_parent_id_col = 'parent_id'  # Old column storing the parent ID
-    old_parent_type_col = 'parent_type'  # Old column storing parent type
-    consultation_fk_col = 'consultation_id'  # New FK for Consultations
-    meeting_fk_col = 'meeting_id'  # New FK column for Meetings
-    constraint_name = f'chk_{table_name}_one_parent'  # Ensures one FK is set
-    consultation_idx = f'ix_{table_name}_{consultation_fk_col}'
-    meeting_idx = f'ix_{table_name}_{meeting_fk_col}'
-
-    # Step 1: Add new FK columns (nullable initially) if they don't exist
-    consultation_col_exists = context.has_column(
-        table_name, consultation_fk_col)
-    if not consultation_col_exists:
-        print(f"  Adding column {consultation_fk_col} to {table_name}")
-        context.add_column(
-            table_name,
-            Column(
-                consultation_fk_col,
-                UUIDStrType,
-                ForeignKey('consultations.id', ondelete='CASCADE'),
-                nullable=True
-            )
-        )
-    else:
-        print(f"  Column {consultation_fk_col} already exists in {table_name}")
-        # Ensure it's nullable for data migration step if it exists
-        context.alter_column(table_name, consultation_fk_col, nullable=True)
-
-    meeting_col_exists = context.has_column(table_name, meeting_fk_col)
-    if not meeting_col_exists:
-        print(f"  Adding column {meeting_fk_col} to {table_name}")
-        context.add_column(
-            table_name,
-            Column(
-                meeting_fk_col,
-                UUIDStrType,
-                ForeignKey('meetings.id', ondelete='CASCADE'),
-                nullable=True
-            )
-        )
-    else:
-        print(f"  Column {meeting_fk_col} already exists in {table_name}")
-        # Ensure it's nullable for data migration step if it exists
-        context.alter_column(table_name, meeting_fk_col, nullable=True)
-
-    # Step 2: Migrate data from old columns to new columns if old columns exist
-    old_id_col_exists = context.has_column(table_name, old_parent_id_col)
-    old_type_col_exists = context.has_column(table_name, old_parent_type_col)
+    context.run_step(migrate_searchable_file_parents)
 
-    if old_id_col_exists and old_type_col_exists:
-        print("  Migrating data from old parent columns to new FK columns...")
-        # Migrate Consultations
-        update_consultations = text(f"""
-            UPDATE {table_name}
-            SET {consultation_fk_col} = {old_parent_id_col}::uuid
-            WHERE {old_parent_type_col} = 'consultations'
-            AND {consultation_fk_col} IS NULL -- Only update if not already set
-        """)  # nosec[B608]
-        context.session.execute(update_consultations)
-
-        # Migrate Meetings (if they were ever supported by old columns)
-        update_meetings = text(f"""
-            UPDATE {table_name}
-            SET {meeting_fk_col} = {old_parent_id_col}::uuid
-            WHERE {old_parent_type_col} = 'meetings'
-            AND {meeting_fk_col} IS NULL -- Only update if not already set
-        """)  # nosec[B608]
-        context.session.execute(update_meetings)
-        print("  Data migration complete.")
-    else:
-        print("  Old parent columns not found, skipping data migration.")
-
-    # Step 3: Add Check Constraint if it doesn't exist
-    # This ensures exactly one parent FK is set going forward.
-    # We add this *after* data migration.
-    if not context.has_constraint(table_name, constraint_name, 'CHECK'):
-        print(f"  Adding check constraint {constraint_name} to {table_name}")
-        try:
-            context.operations.create_check_constraint(
-                constraint_name=constraint_name,
-                table_name=table_name,
-                condition=f"num_nonnulls({consultation_fk_col}, "
-                f"{meeting_fk_col}) = 1"
-            )
-            print(f"  Added check constraint {constraint_name}.")
-        except Exception as e:
-            # It might fail if there's data violating the constraint *after*
-            # migration
-            print(
-                f"  ERROR: Could not add check constraint {constraint_name}. "
-                f"Check data in {table_name} - rows must have exactly one "
-                f"of {consultation_fk_col} or {meeting_fk_col} set. "
-                f"Error: {e}"
-            )
-            # Depending on policy, you might raise an error here or just warn
-    else:
-        print(f"  Check constraint {constraint_name} already exists.")
-
-    # Step 4: Add Indexes for new FK columns if they don't exist
-    if not context.index_exists(table_name, consultation_idx):
-        print(f"  Adding index {consultation_idx} to {table_name}")
-        context.operations.create_index(
-            consultation_idx, table_name, [consultation_fk_col]
-        )
-    else:
-        print(f"  Index {consultation_idx} already exists.")
-
-    if not context.index_exists(table_name, meeting_idx):
-        print(f"  Adding index {meeting_idx} to {table_name}")
-        context.operations.create_index(
-            meeting_idx, table_name, [meeting_fk_col]
-        )
-    else:
-        print(f"  Index {meeting_idx} already exists.")
-
-    # Step 5: Drop old columns if they exist
-    if context.drop_column(table_name, old_parent_id_col):
-        print(f"  Dropped old column {old_parent_id_col} from {table_name}.")
-    if context.drop_column(table_name, old_parent_type_col):
-        print(f"  Dropped old column {old_parent_type_col} from {table_name}.")
-
-    print("Finished migrating SearchableFile parent structure.")
-    # --- End of SearchableFile parent migration ---
-
-    create_meeting_edit_events_and_migrate_data(context)
+    context.run_step(create_meeting_edit_events_and_migrate_data)
 
     fix_agenda_item_positions(context)
     # Ensure this is called after FKs are potentially modified
-    fix_user_constraints_to_work_with_hard_delete(context)
+    context.run_step(fix_user_constraints_to_work_with_hard_delete)
 
     context.add_column(
         'consultations',
@@ -691,14 +818,22 @@ def upgrade(context: UpgradeContext) -> None:
             ),
         )
 
-    if not context.has_constraint(
-        'agenda_item_state_preferences', '_user_agenda_item_uc', 'UNIQUE'
+    migrate_agenda_item_state_preferences(context)
+    context.run_step(generate_image_variants)
+
+    # indexes for the paginated people list and person page
+    for table_name, index_name, columns in (
+        ('users', 'ix_users_last_name_first_name',
+         ['last_name', 'first_name']),
+        ('meetings_users_attendance', 'ix_meetings_users_attendance_user_id',
+         ['user_id']),
+        ('consultations', 'ix_consultations_creator_id', ['creator_id']),
     ):
-        context.operations.create_unique_constraint(
-            '_user_agenda_item_uc',
-            'agenda_item_state_preferences',
-            ['user_id', 'agenda_item_id']
-        )
+        context.create_index(index_name, table_name, columns)
+
+    add_token_expiry(context)
 
     context.commit()
+    # has to run outside of the upgrade transaction
+    create_partial_indexes(context)
     print("Database schema upgrade process finished.")
@@ -1,18 +1,28 @@
 from __future__ import annotations
+import threading
+from collections import OrderedDict
 from functools import wraps
+from time import monotonic
 from typing import Any
+from typing import Generic
 from typing import TypeVar
 from typing import cast
 
 from pyramid.threadlocal import get_current_request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from collections.abc import Callable
     from collections.abc import Hashable
+    from collections.abc import Iterable
+    from sqlalchemy.orm import UOWTransaction
 
 F = TypeVar('F', bound='Callable[..., Any]')
+K = TypeVar('K', bound='Hashable')
+V = TypeVar('V')
 _marker = object()
 
 
@@ -85,3 +95,77 @@ def request_cache() -> Callable[[F], F]:
         return cast('F', wrapper)
 
     return decorating_function
+
+
+class ProcessCache(Generic[K, V]):
+    """ A bounded cache shared by all requests of the process.
+
+    Changes which invalidate entries are registered with `invalidated_by`,
+    the entries are invalidated once the transaction of the change ends.
+    Changes made by other processes can't be observed, so entries expire
+    after ``ttl`` seconds. Only cache what may be stale for that long.
+
+    The entries are shared by the threads of the process, they are only
+    changed while holding ``lock``. Values are loaded without it.
+
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get(self, key: K, load: Callable[[], V]) -> V:
+        now = monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] >= now:
+                self.entries.move_to_end(key)
+                return entry[1]
+
+        value = load()
+        with self.lock:
+            self.entries[key] = (now + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: K) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def invalidated_by(
+        self,
+        collect: Callable[[Session], Iterable[K]]
+    ) -> Callable[[Session], Iterable[K]]:
+        """ Registers a function, which returns the keys invalidated by the
+        changes of a flushed session. """
+        _invalidations.append((self, collect))
+        return collect
+
+
+_invalidations: list[tuple[ProcessCache[Any, Any], Callable[..., Any]]] = []
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_invalidated_keys(
+    session: Session,
+    flush_context: UOWTransaction
+) -> None:
+    pending = session.info.setdefault('process_cache_keys', set())
+    for cache, collect in _invalidations:
+        pending.update((cache, key) for key in collect(session))
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def invalidate_collected_keys(session: Session) -> None:
+    # on rollback as well, we might have cached uncommitted changes
+    for cache, key in session.info.pop('process_cache_keys', ()):
+        cache.invalidate(key)
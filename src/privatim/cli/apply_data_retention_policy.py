@@ -1,18 +1,26 @@
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import timedelta
 import logging
 import click
+from libcloud.storage.types import ObjectDoesNotExistError
 from pyramid.paster import bootstrap
 from pyramid.paster import get_appsettings
 from sedate import utcnow
-from sqlalchemy import select
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
 from sqlalchemy.sql import delete
+from sqlalchemy_file.storage import StorageManager
 from privatim.models import Consultation
 from privatim.orm import get_engine, Base
 
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+    from datetime import datetime
+    from sqlalchemy import Select
     from privatim.orm import FilteredSession
 
 from privatim.models.file import SearchableFile
@@ -20,91 +28,165 @@ from privatim.models.file import SearchableFile
 log = logging.getLogger(__name__)
 
 
-def format_consultation_tree(
-    consultation: Consultation, level: int = 0
-) -> list[str]:
-    """Format a single consultation and its version history recursively."""
-    tree_lines = []
-    indent = '  ' * level
-    version_status = 'LATEST' if consultation.is_latest() else 'OLD'
-    tree_lines.append(
-        f'{indent}├── {consultation.title} ({version_status}) '
-        f'[ID: {consultation.id}]'
-    )
-    if consultation.previous_version:
-        tree_lines.extend(
-            format_consultation_tree(consultation.previous_version, level + 1)
+# the blobs are deleted by this many threads in parallel
+BLOB_DELETE_WORKERS = 8
+
+
+@dataclass
+class RetentionReport:
+    """ What has been (or, for a dry run, would be) deleted. """
+
+    dry_run: bool = False
+    chains: int = 0
+    consultation_ids: list[str] = field(default_factory=list)
+    files: int = 0
+    bytes: int = 0
+
+    @property
+    def consultations(self) -> int:
+        return len(self.consultation_ids)
+
+
+def expired_chains_query(
+    cutoff_date: datetime,
+    after: str | None,
+    limit: int
+) -> Select[tuple[str, str]]:
+    """ Returns the ids of all versions of the next `limit` chains, whose
+    latest version has been soft deleted before the cutoff date.
+
+    The chains are ordered by the id of their latest version, `after`
+    continues after the given id.
+
+    """
+    consultations = Consultation.__table__
+    latest = (
+        select(consultations.c.id)
+        .where(
+            consultations.c.is_latest_version == 1,
+            consultations.c.deleted.is_(True),
+            consultations.c.created <= cutoff_date,
         )
-    return tree_lines
+        .order_by(consultations.c.id)
+        .limit(limit)
+    )
+    if after is not None:
+        latest = latest.where(consultations.c.id > after)
+
+    latest_cte = latest.cte('latest')
+    chain = select(
+        latest_cte.c.id.label('chain_id'),
+        latest_cte.c.id.label('id'),
+    ).cte('chain', recursive=True)
+    previous = consultations.alias('previous')
+    chain = chain.union(
+        select(chain.c.chain_id, previous.c.id)
+        .where(previous.c.replaced_consultation_id == chain.c.id)
+    )
+    return select(chain.c.chain_id, chain.c.id).order_by(chain.c.chain_id)
+
+
+def delete_blobs(paths: Iterable[str]) -> None:
+    """ Removes the given files from the storage, in parallel. """
+
+    def delete_blob(path: str) -> None:
+        try:
+            StorageManager.delete_file(path)
+        except ObjectDoesNotExistError:
+            pass
+        except Exception:
+            log.exception('Could not delete the stored file %s', path)
+
+    with ThreadPoolExecutor(max_workers=BLOB_DELETE_WORKERS) as executor:
+        # consume the results, so exceptions surface
+        list(executor.map(delete_blob, paths))
+
+
+@event.listens_for(Session, 'after_commit')
+def delete_retained_blobs(session: Session) -> None:
+    paths = session.info.pop('retention_blobs', None)
+    if paths:
+        delete_blobs(paths)
+
+
+@event.listens_for(Session, 'after_rollback')
+def keep_retained_blobs(session: Session) -> None:
+    session.info.pop('retention_blobs', None)
 
 
 def delete_old_consultation_chains(
         session: FilteredSession,
-        days_threshold: int = 30
-) -> list[str]:
+        days_threshold: int = 30,
+        batch_size: int = 100,
+        dry_run: bool = False,
+        commit: Callable[[], None] | None = None,
+) -> RetentionReport:
     """
     Delete entire consultation chains where the latest version is:
     1. Soft deleted
     2. Older than the threshold
 
-    Returns the IDs of all deleted consultations.
+    The chains are deleted in batches of `batch_size` chains. `commit` is
+    called after each batch, so each batch can run in its own transaction.
+    The stored files are removed once the transaction of their batch has
+    been committed.
+
+    Returns a report of the deleted consultations and files.
     """
 
     cutoff_date = utcnow() - timedelta(days=days_threshold)
-
-    with session.no_consultation_filter():
-        with session.no_soft_delete_filter():
-
-            # First find latest versions that are soft-deleted and old enough
-            latest_query = (
-                select(Consultation)
-                .where(
-                    Consultation.is_latest_version == 1,
-                    Consultation.deleted.is_(True),
-                    Consultation.created <= cutoff_date
-                )
+    files = SearchableFile.__table__
+    report = RetentionReport(dry_run=dry_run)
+
+    after = None
+    while True:
+        chains: dict[str, list[str]] = {}
+        for chain_id, consultation_id in session.execute(
+            expired_chains_query(cutoff_date, after, batch_size)
+        ):
+            chains.setdefault(chain_id, []).append(consultation_id)
+
+        if not chains:
+            break
+
+        # the last chain in the order of the database
+        after = next(reversed(chains))
+        ids = [id for chain in chains.values() for id in chain]
+        stored = [
+            file for file, in session.execute(
+                select(files.c.file)
+                .where(files.c.consultation_id.in_(ids))
             )
+        ]
+
+        report.chains += len(chains)
+        report.consultation_ids.extend(ids)
+        report.files += len(stored)
+        report.bytes += sum(file.get('size') or 0 for file in stored)
+
+        if dry_run:
+            continue
+
+        # the files first, to prevent a ForeignKeyViolation
+        session.execute(
+            delete(SearchableFile)
+            .where(SearchableFile.consultation_id.in_(ids))
+        )
+        session.execute(
+            delete(Consultation)
+            .where(Consultation.id.in_(ids))
+        )
+        session.info.setdefault('retention_blobs', []).extend(
+            file['path'] for file in stored if file.get('path')
+        )
+        log.info(
+            'Deleted %d consultation chains (%d versions, %d files)',
+            len(chains), len(ids), len(stored)
+        )
+        if commit is not None:
+            commit()
 
-            to_delete = session.execute(latest_query).scalars().all()
-            ids_to_delete = []
-            for latest in to_delete:
-                # Log the tree structure before deletion
-                tree_lines = format_consultation_tree(latest)
-                log.info(
-                    'Will delete consultation tree:'
-                    '\n%s', '\n'.join(tree_lines))
-
-                # Follow chain backwards and collect IDs
-                current: Consultation | None = latest
-                while current is not None:
-                    ids_to_delete.append(current.id)
-                    current = current.previous_version
-
-            if ids_to_delete:
-                # First, delete associated SearchableFile records
-                # to prevent ForeignKeyViolation during bulk Consultation
-                # delete.
-                bulk_delete_files_stmt = delete(SearchableFile).where(
-                    SearchableFile.consultation_id.in_(ids_to_delete)
-                )
-                session.execute(bulk_delete_files_stmt)
-                log.info(
-                    'Bulk deletion of associated files complete for '
-                    'consultation IDs: %s',
-                    ', '.join(map(str, ids_to_delete)))
-                # Perform bulk delete
-                bulk_delete_stmt = delete(Consultation).where(
-                    Consultation.id.in_(ids_to_delete)
-                )
-                session.execute(bulk_delete_stmt)
-                log.info(
-                    'Bulk deletion complete. Removed consultations '
-                    'with IDs: %s',
-                    ', '.join(map(str, ids_to_delete)),
-                )
-                session.flush()
-                return ids_to_delete
-            return []
+    return report
 
 
 @click.command()
@@ -114,7 +196,23 @@ def delete_old_consultation_chains(
     default=30,
     help='Number of days after which to delete soft-deleted consultations'
 )
-def hard_delete(config_uri: str, days: int) -> None:
+@click.option(
+    '--batch-size',
+    default=100,
+    help='Number of consultation chains deleted per transaction'
+)
+@click.option(
+    '--dry-run',
+    is_flag=True,
+    default=False,
+    help='Only report what would be deleted'
+)
+def hard_delete(
+    config_uri: str,
+    days: int,
+    batch_size: int,
+    dry_run: bool
+) -> None:
     """
     Hard delete consultation chains where the latest version is soft-deleted
     and older than the specified number of days.
@@ -124,16 +222,31 @@ def hard_delete(config_uri: str, days: int) -> None:
     engine = get_engine(settings)
     Base.metadata.create_all(engine)
 
-    with env['request'].tm:
+    tm = env['request'].tm
+
+    def commit() -> None:
+        tm.commit()
+        tm.begin()
+
+    with tm:
         session = env['request'].dbsession
-        deleted_ids = delete_old_consultation_chains(session, days)
-
-        if deleted_ids:
-            print(f"Deleted {len(deleted_ids)} consultations:")
-            for id in deleted_ids:
-                print(f"  - Consultation ID: {id}")
-        else:
-            print("No consultations were deleted.")
+        report = delete_old_consultation_chains(
+            session,
+            days,
+            batch_size=batch_size,
+            dry_run=dry_run,
+            commit=commit
+        )
+
+    if not report.chains:
+        print("No consultations were deleted.")
+        return
+
+    print(
+        f"{'Would delete' if dry_run else 'Deleted'} "
+        f"{report.consultations} consultations in {report.chains} chains "
+        f"and {report.files} files ({report.bytes} bytes)."
+    )
 
 
 if __name__ == '__main__':
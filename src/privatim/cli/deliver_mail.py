@@ -0,0 +1,65 @@
+from __future__ import annotations
+import time
+import click
+from pyramid.paster import bootstrap
+
+from privatim.mail import IMailer
+from privatim.mail.outbox import MAX_ATTEMPTS
+from privatim.mail.outbox import deliver_queued_mails
+from privatim.mail.outbox import outbox_depth
+
+
+@click.command()
+@click.argument('config_uri')
+@click.option('--batch-size', type=int, default=500)
+@click.option('--max-attempts', type=int, default=MAX_ATTEMPTS)
+@click.option(
+    '--interval',
+    type=float,
+    default=0,
+    help='Keep delivering, checking the outbox every this many seconds'
+)
+def main(
+    config_uri: str,
+    batch_size: int,
+    max_attempts: int,
+    interval: float
+) -> None:
+    """ Sends the mails in the outbox, see `privatim.mail.outbox`. """
+
+    env = bootstrap(config_uri)
+    mailer = env['registry'].getUtility(IMailer)
+    tm = env['request'].tm
+    session = env['request'].dbsession
+
+    def commit() -> None:
+        tm.commit()
+        tm.begin()
+
+    while True:
+        with tm:
+            report = deliver_queued_mails(
+                session,
+                mailer,
+                batch_size=batch_size,
+                max_attempts=max_attempts,
+                commit=commit
+            )
+            depth = outbox_depth(session)
+
+        if report.sent or report.deferred or report.failed:
+            click.echo(
+                f'Sent {report.sent} mails, deferred {report.deferred}, '
+                f'{report.failed} failed.'
+            )
+        if not interval:
+            click.echo(', '.join(
+                f'{count} {state.name}' for state, count in depth.items()
+            ))
+            break
+
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+import time
+import click
+from pyramid.paster import get_appsettings
+
+from privatim.orm import get_engine, Base
+from privatim.sessions import PostgresSessionStore
+
+
+@click.command()
+@click.argument('config_uri')
+@click.option(
+    '--older-than',
+    type=int,
+    default=None,
+    help='Purge sessions not accessed for this many seconds, defaults to '
+         'session.timeout or session.cookie_expires'
+)
+@click.option('--batch-size', type=int, default=5000)
+def main(config_uri: str, older_than: int | None, batch_size: int) -> None:
+    """ Deletes expired sessions from the ``http_sessions`` table. """
+
+    settings = get_appsettings(config_uri)
+    if older_than is None:
+        for name in ('session.timeout', 'session.cookie_expires'):
+            value = str(settings.get(name, ''))
+            if value.isdigit():
+                older_than = int(value)
+                break
+        else:
+            raise click.UsageError(
+                'No session timeout configured, please pass --older-than'
+            )
+
+    engine = get_engine(settings)
+    Base.metadata.create_all(engine)
+    store = PostgresSessionStore(engine)
+    count = store.purge(time.time() - older_than, batch_size=batch_size)
+    click.echo(f'Purged {count} sessions.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+from datetime import timedelta
+import click
+from pyramid.paster import get_appsettings
+from sedate import utcnow
+from sqlalchemy import delete, or_, select
+
+from privatim.models import PasswordChangeToken, TAN, User
+from privatim.orm import get_engine, Base
+
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from datetime import datetime
+    from sqlalchemy import Engine
+
+
+def purge_expired(
+    engine: Engine,
+    model: type[TAN] | type[PasswordChangeToken],
+    expired_before: datetime,
+    batch_size: int = 5000
+) -> int:
+    """ Deletes the rows which expired before the given time, in batches
+    so no single transaction holds on to too many locks.
+
+    The initial password set links of users without a password don't
+    expire, see `PasswordChangeToken.consume`, so they are kept unless
+    they have been used.
+
+    """
+    query = select(model.id)
+    if model is PasswordChangeToken:
+        # the tokens are stored without a timezone
+        expired_before = expired_before.replace(tzinfo=None)
+        query = (
+            query
+            .join(User, User.id == PasswordChangeToken.user_id)
+            .where(or_(
+                User.password.isnot(None),
+                PasswordChangeToken.time_consumed.isnot(None)
+            ))
+        )
+
+    total = 0
+    while True:
+        batch = (
+            query
+            .where(model.expires < expired_before)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        with engine.begin() as connection:
+            deleted = len(connection.execute(
+                delete(model)
+                .where(model.id.in_(batch))
+                .returning(model.id)
+            ).all())
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+@click.command()
+@click.argument('config_uri')
+@click.option(
+    '--keep-days',
+    type=int,
+    default=0,
+    help='Keep the expired TANs and tokens for this many days'
+)
+@click.option('--batch-size', type=int, default=5000)
+def main(config_uri: str, keep_days: int, batch_size: int) -> None:
+    """ Deletes expired TANs and password change tokens. """
+
+    settings = get_appsettings(config_uri)
+    engine = get_engine(settings)
+    Base.metadata.create_all(engine)
+
+    expired_before = utcnow() - timedelta(days=keep_days)
+    tans = purge_expired(engine, TAN, expired_before, batch_size)
+    tokens = purge_expired(
+        engine, PasswordChangeToken, expired_before, batch_size
+    )
+    click.echo(f'Purged {tans} TANs and {tokens} password change tokens.')
+
+
+if __name__ == '__main__':
+    main()
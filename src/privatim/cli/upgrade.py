@@ -1,6 +1,7 @@
 from __future__ import annotations
 import logging
 import os
+import re
 from enum import Enum
 
 import click
@@ -8,19 +9,23 @@ import plaster
 import transaction
 from alembic.migration import MigrationContext
 from alembic.operations import Operations
-from sqlalchemy import inspect, bindparam
+from sqlalchemy import event, inspect, bindparam, select
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.sql import text
 from zope.sqlalchemy import mark_changed
+from privatim.file.setup import setup_filestorage
 from privatim.models import get_engine
 from privatim.models import get_session_factory
+from privatim.models.upgrade_step import UpgradeStep
 from privatim.orm import Base
 
 
 from typing import TYPE_CHECKING, Any, Literal
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
     from sqlalchemy import Column as _Column
-    from sqlalchemy import Engine
+    from sqlalchemy import Connection, Engine, Index
     from sqlalchemy.orm import Session
     from sqlalchemy.engine.interfaces import ReflectedColumn
 
@@ -28,6 +33,32 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger('privatim.upgrade')
 
+DDL_STATEMENT = re.compile(r'^\s*(ALTER|COMMENT|CREATE|DROP)\b', re.IGNORECASE)
+
+
+class SchemaSnapshot:
+    """ The tables of the database with their columns, indexes and foreign
+    keys, read from the catalog with a handful of queries. """
+
+    def __init__(self, connection: Connection) -> None:
+        inspector = inspect(connection)
+        self.tables = set(inspector.get_table_names())
+        self.columns: dict[str, dict[str, ReflectedColumn]] = {
+            table: {column['name']: column for column in columns}
+            for (__, table), columns
+            in inspector.get_multi_columns().items()
+        }
+        self.indexes: dict[str, set[str | None]] = {
+            table: {index['name'] for index in indexes}
+            for (__, table), indexes
+            in inspector.get_multi_indexes().items()
+        }
+        self.foreign_keys: dict[str, set[str | None]] = {
+            table: {fk['name'] for fk in foreign_keys}
+            for (__, table), foreign_keys
+            in inspector.get_multi_foreign_keys().items()
+        }
+
 
 class UpgradeContext:
 
@@ -46,9 +77,34 @@ class UpgradeContext:
         # Default schema is 'public' for PostgreSQL
         self.schema = self.engine.url.query.get('schema', 'public')
 
+        self._snapshot: SchemaSnapshot | None = None
+        self._applied_steps: set[str] | None = None
+        # the snapshot is outdated once the schema changes
+        event.listen(
+            self.operations_connection,
+            'after_cursor_execute',
+            self._after_cursor_execute
+        )
+
+    def _after_cursor_execute(
+        self,
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        *args: Any
+    ) -> None:
+        if DDL_STATEMENT.match(statement):
+            self._snapshot = None
+
+    @property
+    def snapshot(self) -> SchemaSnapshot:
+        """ The current schema, which answers the existence checks. """
+        if self._snapshot is None:
+            self._snapshot = SchemaSnapshot(self.operations_connection)
+        return self._snapshot
+
     def has_table(self, table: str) -> bool:
-        inspector = inspect(self.operations_connection)
-        return table in inspector.get_table_names()
+        return table in self.snapshot.tables
 
     def drop_table(self, table: str) -> bool:
         if self.has_table(table):
@@ -57,13 +113,111 @@ class UpgradeContext:
         return False
 
     def index_exists(self, table_name: str, index_name: str) -> bool:
-        inspector = inspect(self.operations_connection)
-        indexes = inspector.get_indexes(table_name)
-        return any(index['name'] == index_name for index in indexes)
+        return index_name in self.snapshot.indexes.get(table_name, ())
+
+    def _autocommit_connection(self) -> Connection:
+        return self.engine.connect().execution_options(
+            isolation_level='AUTOCOMMIT'
+        )
+
+    def _prepare_concurrent_build(
+        self,
+        connection: Connection,
+        index_name: str
+    ) -> bool:
+        """ Returns False if the index exists already. An index left invalid
+        by an interrupted build is dropped, so it can be built again. """
+        valid = connection.execute(
+            text("""
+            SELECT pg_index.indisvalid
+              FROM pg_index
+              JOIN pg_class
+                ON pg_class.oid = pg_index.indexrelid
+             WHERE pg_class.relname = :name
+            """),
+            {'name': index_name}
+        ).scalar()
+        if valid:
+            return False
+
+        if valid is not None:
+            name = connection.dialect.identifier_preparer.quote(index_name)
+            connection.exec_driver_sql(
+                f'DROP INDEX CONCURRENTLY IF EXISTS {name}'
+            )
+        return True
+
+    def create_index(
+        self,
+        index_name: str,
+        table_name: str,
+        columns: Sequence[str],
+        *,
+        concurrently: bool = False,
+        **kw: Any
+    ) -> bool:
+        """ Creates the index, unless it exists already.
+
+        With ``concurrently`` the index is built without locking the table
+        against writes, see `create_index_concurrently`.
+
+        """
+        if not concurrently:
+            if not self.has_table(table_name):
+                return False
+            if self.index_exists(table_name, index_name):
+                return False
+            self.operations.create_index(
+                index_name, table_name, columns, **kw
+            )
+            return True
+
+        with self._autocommit_connection() as connection:
+            if not self._prepare_concurrent_build(connection, index_name):
+                return False
+            Operations(MigrationContext.configure(connection)).create_index(
+                index_name,
+                table_name,
+                columns,
+                postgresql_concurrently=True,
+                **kw
+            )
+        self._snapshot = None
+        return True
+
+    def create_index_concurrently(self, index: Index) -> bool:
+        """ Creates the index without locking the table against writes.
+
+        ``CREATE INDEX CONCURRENTLY`` can't run inside a transaction, so this
+        uses its own connection. Commit the pending changes of the upgrade
+        first, the build waits for all transactions touching the table.
+
+        An index left invalid by an interrupted build is rebuilt.
+
+        """
+        assert index.table is not None and index.name is not None
+        options = index.dialect_options['postgresql']
+        with self._autocommit_connection() as connection:
+            if not self._prepare_concurrent_build(connection, index.name):
+                return False
+
+            options['concurrently'] = True
+            try:
+                connection.execute(CreateIndex(index))
+            finally:
+                options['concurrently'] = False
+        self._snapshot = None
+        return True
+
+    def drop_index(self, index_name: str, table_name: str) -> bool:
+        """ Drops the index, if it exists. """
+        if self.index_exists(table_name, index_name):
+            self.operations.drop_index(index_name, table_name=table_name)
+            return True
+        return False
 
     def has_column(self, table: str, column: str) -> bool:
-        inspector = inspect(self.operations_connection)
-        return column in {c['name'] for c in inspector.get_columns(table)}
+        return column in self.snapshot.columns.get(table, ())
 
     def add_column(self, table:  str, column: Column) -> bool:
         if self.has_table(table):
@@ -117,9 +271,7 @@ class UpgradeContext:
         return False
 
     def has_foreign_key(self, table: str, constraint_name: str) -> bool:
-        inspector = inspect(self.operations_connection)
-        foreign_keys = inspector.get_foreign_keys(table)
-        return any(fk['name'] == constraint_name for fk in foreign_keys)
+        return constraint_name in self.snapshot.foreign_keys.get(table, ())
 
     def create_foreign_key(
         self,
@@ -168,12 +320,7 @@ class UpgradeContext:
                 do_something()
         """
 
-        inspector = inspect(self.operations_connection)
-        columns = inspector.get_columns(table)
-        for col in columns:
-            if col['name'] == column:
-                return col
-        return None
+        return self.snapshot.columns.get(table, {}).get(column)
 
     def get_enum_values(self, enum_name: str) -> set[str]:
         if self.engine.name != 'postgresql':
@@ -253,6 +400,36 @@ class UpgradeContext:
         )).scalar()
         return bool(result)  # Ensure boolean return
 
+    @property
+    def applied_steps(self) -> set[str]:
+        if self._applied_steps is None:
+            self._applied_steps = set(
+                self.session.scalars(select(UpgradeStep.name))
+            )
+        return self._applied_steps
+
+    def run_step(
+        self,
+        step: Callable[[UpgradeContext], object],
+        name: str | None = None
+    ) -> bool:
+        """ Runs the step, unless it has been completed before.
+
+        Completed steps are recorded in the ``upgrade_steps`` table, in the
+        same transaction as their changes. Use it for one-time migrations,
+        whose existence checks are expensive or impossible.
+
+        """
+        name = name or step.__name__
+        if name in self.applied_steps:
+            return False
+
+        step(self)
+        self.session.add(UpgradeStep(name=name))
+        self.session.flush()
+        self.applied_steps.add(name)
+        return True
+
     def commit(self) -> None:
         mark_changed(self.session)
         transaction.commit()
@@ -270,6 +447,9 @@ def upgrade(config_uri: str, dry: bool) -> None:
     settings = plaster.get_settings(config_uri, 'app:main',
                                     defaults=defaults)
 
+    # Data migrations may need to read stored files.
+    setup_filestorage(settings)
+
     # Setup DB.
     engine = get_engine(settings)
     Base.metadata.create_all(engine)
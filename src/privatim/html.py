@@ -1,8 +1,13 @@
 from __future__ import annotations
-from bleach.sanitizer import Cleaner
+from functools import cache
 from markupsafe import Markup
 
 
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from bleach.sanitizer import Cleaner
+
+
 # html tags allowed by bleach
 SANE_HTML_TAGS = [
     "a",
@@ -52,7 +57,11 @@ SANE_HTML_ATTRS = {
 }
 
 
-cleaner = Cleaner(tags=SANE_HTML_TAGS, attributes=SANE_HTML_ATTRS)
+@cache
+def get_cleaner() -> Cleaner:
+    from bleach.sanitizer import Cleaner
+
+    return Cleaner(tags=SANE_HTML_TAGS, attributes=SANE_HTML_ATTRS)
 
 
 def sanitize_html(html: str | None) -> Markup:
@@ -60,4 +69,4 @@ def sanitize_html(html: str | None) -> Markup:
     from it.
 
     """
-    return Markup(cleaner.clean(html or ""))
+    return Markup(get_cleaner().clean(html or ""))
@@ -49,9 +49,9 @@ class LocaleNegotiator:
             return locale
 
         # 2. Get language from user object
-        user = request.user
-        if user:
-            locale = user.locale
+        identity = request.identity
+        if identity:
+            locale = identity.locale
             if locale and locale in available:
                 return locale
 
@@ -2,6 +2,7 @@ from __future__ import annotations
 from .exceptions import InactiveRecipient
 from .exceptions import MailConnectionError
 from .exceptions import MailError
+from .exceptions import MalformedResponse
 from .interfaces import IMailer
 from .mailer import PostmarkMailer
 from .types import MailState
@@ -11,4 +12,5 @@ InactiveRecipient
 MailConnectionError
 MailError
 MailState
+MalformedResponse
 PostmarkMailer
@@ -9,6 +9,10 @@ class MailConnectionError(MailError, ConnectionError):
     pass
 
 
+class MalformedResponse(MailError):
+    pass
+
+
 class InactiveRecipient(MailError):
     pass
 
@@ -8,17 +8,19 @@ from string import ascii_letters
 from string import digits
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from zope.interface import implementer
 
 from .exceptions import InactiveRecipient
 from .exceptions import MailConnectionError
 from .exceptions import MailError
+from .exceptions import MalformedResponse
 from .interfaces import IMailer
 from .types import MailState
 
 
 from typing import Any
-from typing import ClassVar
 from typing import cast
 from typing import overload
 from typing import TYPE_CHECKING
@@ -46,6 +48,45 @@ QP_SUFFIX_LENGTH = len(qp_suffix)
 QP_MAX_WORD_LENGTH = 75
 QP_CONTENT_LENGTH = QP_MAX_WORD_LENGTH - QP_PREFIX_LENGTH - QP_SUFFIX_LENGTH
 
+# the responses retried with an exponential backoff, for these Postmark
+# has not accepted the message, so it is safe to send it again
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# the builtin ConnectionError is not a RequestException
+CONNECTION_ERRORS = (ConnectionError, requests.RequestException)
+
+
+def create_http_session(
+    retries:        int = 3,
+    backoff_factor: float = 0.5,
+    pool_size:      int = 10
+) -> requests.Session:
+    """ Returns a session, which keeps up to `pool_size` connections alive
+    and retries failed connections and the `RETRY_STATUS_CODES`. """
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        # the request might have been processed already
+        read=0,
+        status=retries,
+        status_forcelist=RETRY_STATUS_CODES,
+        # also retry POST requests, see RETRY_STATUS_CODES
+        allowed_methods=None,
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=True,
+        # return the last response, so we get the error message
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
 
 def needs_header_encode(name: str) -> bool:
     # NOTE: Backslash escaping is forbidden in Postmark API
@@ -129,22 +170,40 @@ def format_address(addresses: Address | Sequence[Address]) -> str:
 
 @implementer(IMailer)
 class PostmarkMailer:
-    api_url:        ClassVar[str] = 'https://api.postmarkapp.com'
+    api_url:        str = 'https://api.postmarkapp.com'
     default_sender: str
     server_token:   str
     stream:         str
     blackhole:      bool
+    timeout:        tuple[float, float]
+    session:        requests.Session
 
     def __init__(self,
                  default_sender: Address,
                  server_token:   str,
                  stream:         str,
-                 blackhole:      bool = False) -> None:
+                 blackhole:      bool = False,
+                 *,
+                 api_url:        str | None = None,
+                 timeout:        tuple[float, float] = (5, 10),
+                 retries:        int = 3,
+                 backoff_factor: float = 0.5,
+                 pool_size:      int = 10) -> None:
 
         self.default_sender = format_single_address(default_sender)
         self.server_token = server_token
         self.stream = stream
         self.blackhole = blackhole
+        if api_url is not None:
+            self.api_url = api_url
+        # connect and read timeout
+        self.timeout = timeout
+        # NOTE: The session is shared by all threads, which is fine for
+        #       requests made with the same headers and adapters.
+        self.session = create_http_session(retries, backoff_factor, pool_size)
+
+    def close(self) -> None:
+        self.session.close()
 
     def request_headers(self) -> dict[str, str]:
         return {'X-Postmark-Server-Token': self.server_token}
@@ -214,7 +273,7 @@ class PostmarkMailer:
                 raise MailError(data['Message'])
             return data
         except (ValueError, KeyError) as exception:
-            raise MailError(
+            raise MalformedResponse(
                 'Malformed response from Postmark API'
             ) from exception
 
@@ -223,13 +282,13 @@ class PostmarkMailer:
         send_data = self.prepare_message(params)
         headers = self.request_headers()
         try:
-            response = requests.post(
+            response = self.session.post(
                 send_url,
                 json=send_data,
                 headers=headers,
-                timeout=(5, 10)
+                timeout=self.timeout
             )
-        except ConnectionError as exception:
+        except CONNECTION_ERRORS as exception:
             raise MailConnectionError(
                 'Failed to connect to Postmark API') from exception
         data = self.get_response_data(response)
@@ -368,16 +427,22 @@ class PostmarkMailer:
                 assert buffer.tell() <= SIZE_LIMIT
 
                 try:
-                    response = requests.post(
+                    response = self.session.post(
                         bulk_url,
                         data=buffer.getvalue(),
                         headers=headers,
-                        timeout=(5, 10)
+                        timeout=self.timeout
                     )
+                    if response.status_code in RETRY_STATUS_CODES:
+                        # the session ran out of retries
+                        raise MailConnectionError(
+                            f'Postmark API unavailable '
+                            f'({response.status_code})'
+                        )
                     data = self.get_response_data(response)
                     if not isinstance(data, list) or len(data) != num_included:
                         # TODO: should probably log this as a warning
-                        raise MailError('Invalid API data.')
+                        raise MalformedResponse('Invalid API data.')
 
                     for message in data:
                         if (
@@ -399,8 +464,9 @@ class PostmarkMailer:
                             # so we just pretend the mail has been delivered
                             result.append(message['MessageID'])  # type:ignore
 
-                except ConnectionError:
-                    # we'll treat these as a temporary failures
+                except (*CONNECTION_ERRORS, MalformedResponse):
+                    # we'll treat these as a temporary failures, e.g. a
+                    # proxy might answer with an HTML page during outages
                     result.extend([MailState.temporary_failure]*num_included)
                 except MailError:
                     # we'll treat these as more permanent failures for now
@@ -448,12 +514,12 @@ class PostmarkMailer:
         headers = self.request_headers()
         headers['Accept'] = 'application/json'
         try:
-            response = requests.get(
+            response = self.session.get(
                 details_url,
                 headers=headers,
-                timeout=(5, 10)
+                timeout=self.timeout
             )
-        except ConnectionError as exception:
+        except CONNECTION_ERRORS as exception:
             raise MailConnectionError(
                 'Failed to connect to Postmark API') from exception
         return self.get_response_data(response)
@@ -487,11 +553,11 @@ class PostmarkMailer:
     def validate_template(self, template_data: dict[str, str]) -> list[str]:
         validate_url = self.api_url + '/templates/validate'
         try:
-            response = requests.post(
+            response = self.session.post(
                 validate_url,
                 json=template_data,
                 headers=self.request_headers(),
-                timeout=(5, 10)
+                timeout=self.timeout
             )
             if not response.ok:
                 return ['Template failed to validate.']
@@ -504,7 +570,7 @@ class PostmarkMailer:
                 data['HtmlBody']['ValidationErrors'] +
                 data['TextBody']['ValidationErrors']
             )
-        except ConnectionError as exception:
+        except CONNECTION_ERRORS as exception:
             raise MailConnectionError(
                 'Failed to connect to Postmark API') from exception
 
@@ -513,13 +579,13 @@ class PostmarkMailer:
         try:
             headers = self.request_headers()
             headers['Accept'] = 'application/json'
-            response = requests.get(
+            response = self.session.get(
                 template_url,
                 headers=headers,
-                timeout=(5, 10)
+                timeout=self.timeout
             )
             return response.ok
-        except ConnectionError as exception:
+        except CONNECTION_ERRORS as exception:
             raise MailConnectionError(
                 'Failed to connect to Postmark API') from exception
 
@@ -0,0 +1,286 @@
+""" A transactional outbox for mails.
+
+Instead of sending mails while handling a request, they are added to the
+``mail_outbox`` table in the same transaction as the changes they are
+about. So they are only sent if the transaction is committed and a slow
+or unavailable mail server doesn't slow down the request.
+
+The ``deliver_mail`` script sends the queued mails in batches::
+
+    deliver_mail development.ini --interval 10
+
+"""
+from __future__ import annotations
+import base64
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from email.headerregistry import Address
+
+from sedate import utcnow
+from sqlalchemy import func, select
+
+from privatim.models import QueuedMail
+from .exceptions import MailError
+from .types import MailState
+
+
+from typing import cast, Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+    from sqlalchemy.orm import Session
+    from ..types import JSONObject
+    from .interfaces import IMailer
+    from .types import MailAttachment, MailParams, TemplateMailParams
+    AnyMailParams = MailParams | TemplateMailParams
+
+
+log = logging.getLogger('privatim.mail.outbox')
+
+
+# temporary failures are retried this many times, waiting twice as long
+# after each attempt, starting with RETRY_DELAY
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=1)
+
+
+@dataclass
+class DeliveryReport:
+    sent: int = 0
+    deferred: int = 0
+    failed: int = 0
+
+
+def serialize_params(params: AnyMailParams) -> dict[str, Any]:
+    receivers = params['receivers']
+    if isinstance(receivers, Address):
+        receivers = [receivers]
+
+    result: dict[str, Any] = {
+        key: value
+        for key, value in params.items()
+        if key not in ('receivers', 'sender', 'attachments')
+    }
+    result['receivers'] = [
+        [address.display_name, address.addr_spec]
+        for address in receivers
+    ]
+    if 'sender' in params:
+        sender = params['sender']
+        result['sender'] = [sender.display_name, sender.addr_spec]
+    if 'attachments' in params:
+        result['attachments'] = [
+            {
+                **attachment,
+                'content': base64.b64encode(
+                    attachment['content']
+                ).decode('ascii')
+            }
+            for attachment in params['attachments']
+        ]
+    return result
+
+
+def deserialize_params(data: dict[str, Any]) -> AnyMailParams:
+    params = data.copy()
+    receivers = [
+        Address(display_name, addr_spec=addr_spec)
+        for display_name, addr_spec in data['receivers']
+    ]
+    params['receivers'] = receivers[0] if len(receivers) == 1 else receivers
+    if 'sender' in data:
+        display_name, addr_spec = data['sender']
+        params['sender'] = Address(display_name, addr_spec=addr_spec)
+    if 'attachments' in data:
+        params['attachments'] = [
+            {**attachment, 'content': base64.b64decode(attachment['content'])}
+            for attachment in data['attachments']
+        ]
+    return params  # type:ignore[return-value]
+
+
+def queue_mail(
+    session:     Session,
+    sender:      Address | None,
+    receivers:   Address | Sequence[Address],
+    subject:     str,
+    content:     str,
+    *,
+    tag:         str | None = None,
+    attachments: list[MailAttachment] | None = None,
+) -> QueuedMail:
+    """ Adds a mail to the outbox, see `IMailer.send`. """
+
+    params: MailParams = {
+        'receivers': receivers,
+        'subject': subject,
+        'content': content
+    }
+    if sender:
+        params['sender'] = sender
+    if tag:
+        params['tag'] = tag
+    if attachments:
+        params['attachments'] = attachments
+
+    mail = QueuedMail(params=serialize_params(params))
+    session.add(mail)
+    return mail
+
+
+def queue_template_mail(
+    session:     Session,
+    sender:      Address | None,
+    receivers:   Address | Sequence[Address],
+    template:    str,
+    data:        JSONObject,
+    *,
+    subject:     str | None = None,
+    tag:         str | None = None,
+    attachments: list[MailAttachment] | None = None,
+) -> QueuedMail:
+    """ Adds a template mail to the outbox, see `IMailer.send_template`. """
+
+    params: TemplateMailParams = {
+        'receivers': receivers,
+        'template': template,
+        'data': data
+    }
+    if sender:
+        params['sender'] = sender
+    if subject:
+        params['subject'] = subject
+    if tag:
+        params['tag'] = tag
+    if attachments:
+        params['attachments'] = attachments
+
+    mail = QueuedMail(params=serialize_params(params))
+    session.add(mail)
+    return mail
+
+
+def outbox_depth(session: Session) -> dict[MailState, int]:
+    """ Returns the number of mails in the outbox by state. """
+    counts = {
+        state: count
+        for state, count in session.execute(
+            select(QueuedMail.state, func.count())
+            .group_by(QueuedMail.state)
+        )
+    }
+    return {
+        state: counts.get(state, 0)
+        for state in (
+            MailState.queued,
+            MailState.failed,
+            MailState.inactive_recipient
+        )
+    }
+
+
+def send_batch(
+    mailer: IMailer,
+    mails:  Sequence[QueuedMail]
+) -> list[tuple[QueuedMail, Any, str | None]]:
+    """ Sends the mails with the bulk API of the mailer and returns the
+    message id or the `MailState` of each mail, with an error message. """
+
+    results: list[tuple[QueuedMail, Any, str | None]] = []
+    plain = [mail for mail in mails if 'template' not in mail.params]
+    templated = [mail for mail in mails if 'template' in mail.params]
+    for batch in (plain, templated):
+        if not batch:
+            continue
+
+        params = [deserialize_params(mail.params) for mail in batch]
+        try:
+            if batch is templated:
+                sent = mailer.bulk_send_template(
+                    cast('list[TemplateMailParams]', params)
+                )
+            else:
+                sent = mailer.bulk_send(cast('list[MailParams]', params))
+        except MailError as exception:
+            # `PostmarkMailer` reports failures as the state of each mail,
+            # but other mailers may raise instead
+            log.warning('Sending %d mails failed', len(batch), exc_info=True)
+            results.extend(
+                (mail, MailState.temporary_failure, str(exception))
+                for mail in batch
+            )
+        else:
+            results.extend(
+                (mail, result, None)
+                for mail, result in zip(batch, sent, strict=True)
+            )
+    return results
+
+
+def deliver_queued_mails(
+    session:      Session,
+    mailer:       IMailer,
+    batch_size:   int = 500,
+    max_attempts: int = MAX_ATTEMPTS,
+    commit:       Callable[[], None] | None = None,
+) -> DeliveryReport:
+    """ Sends the queued mails, which are due, in batches of `batch_size`.
+
+    Delivered mails are removed from the outbox. Temporary failures are
+    retried later, until they failed `max_attempts` times.
+
+    The mails of a batch are locked until the end of the transaction,
+    other workers skip them. `commit` is called after each batch, so each
+    batch can run in its own transaction.
+
+    """
+
+    report = DeliveryReport()
+    while True:
+        # pending mails get their next attempt when they are flushed
+        session.flush()
+        now = utcnow()
+        mails = session.scalars(
+            select(QueuedMail)
+            .where(
+                QueuedMail.state == MailState.queued,
+                QueuedMail.next_attempt <= now,
+            )
+            .order_by(QueuedMail.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not mails:
+            break
+
+        for mail, result, error in send_batch(mailer, mails):
+            if not isinstance(result, MailState):
+                # we got a message id
+                session.delete(mail)
+                report.sent += 1
+                continue
+
+            mail.attempts += 1
+            mail.last_error = error or result.name
+            if (
+                result == MailState.temporary_failure
+                and mail.attempts < max_attempts
+            ):
+                mail.next_attempt = (
+                    now + RETRY_DELAY * 2 ** (mail.attempts - 1)
+                )
+                report.deferred += 1
+            else:
+                if result == MailState.temporary_failure:
+                    result = MailState.failed
+                mail.state = result
+                report.failed += 1
+                log.warning(
+                    'Giving up on mail %d after %d attempts: %s',
+                    mail.id, mail.attempts, mail.last_error
+                )
+
+        if commit is not None:
+            commit()
+
+    return report
@@ -0,0 +1,137 @@
+""" Application metrics in the Prometheus text format.
+
+The metrics are collected once ``metrics.token`` is set, they are served
+on ``/metrics`` to clients sending the token as bearer token.
+
+When running multiple worker processes, point the environment variable
+``PROMETHEUS_MULTIPROC_DIR`` to an empty directory shared by all workers
+(it has to be set before the application is imported). The workers then
+write their metrics to that directory and ``/metrics`` aggregates them.
+The live gauges of a worker have to be removed once it exits, with
+gunicorn this is done by adding the following to its configuration::
+
+    from privatim.metrics import child_exit
+
+"""
+from __future__ import annotations
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+    Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+
+
+from typing import Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+
+
+SIZE_BUCKETS = (
+    1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000,
+    float('inf')
+)
+SLOW_BUCKETS = (
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf')
+)
+
+REQUEST_DURATION = Histogram(
+    'privatim_request_duration_seconds',
+    'Time spent handling requests, by route',
+    ['route', 'method'],
+)
+RESPONSE_SIZE = Histogram(
+    'privatim_response_size_bytes',
+    'Size of the response bodies, by route',
+    ['route'],
+    buckets=SIZE_BUCKETS,
+)
+DB_POOL_CHECKOUTS = Counter(
+    'privatim_db_pool_checkouts',
+    'Connections checked out from the pool',
+)
+DB_POOL_OVERFLOWS = Counter(
+    'privatim_db_pool_overflows',
+    'Connections checked out beyond the pool size',
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'privatim_db_pool_checked_out',
+    'Connections currently checked out from the pool',
+    multiprocess_mode='livesum',
+)
+SEARCH_DURATION = Histogram(
+    'privatim_search_duration_seconds',
+    'Time spent running full text searches',
+)
+REPORT_RENDER_DURATION = Histogram(
+    'privatim_report_render_duration_seconds',
+    'Time spent rendering meeting reports, by format',
+    ['format'],
+    buckets=SLOW_BUCKETS,
+)
+FILE_EXTRACTION_DURATION = Histogram(
+    'privatim_file_extraction_duration_seconds',
+    'Time spent extracting the text of uploaded files, by content type',
+    ['content_type'],
+    buckets=SLOW_BUCKETS,
+)
+MAIL_OUTBOX = Gauge(
+    'privatim_mail_outbox',
+    'Mails in the outbox, by state',
+    ['state'],
+    multiprocess_mode='mostrecent',
+)
+SMS_QUEUE_DEPTH = Gauge(
+    'privatim_sms_queue_depth',
+    'Messages in the SMS queue directory',
+    multiprocess_mode='mostrecent',
+)
+SMS_MESSAGES = Counter(
+    'privatim_sms_messages',
+    'SMS messages handled by the delivery, by result',
+    ['result'],
+)
+SMS_SEND_DURATION = Histogram(
+    'privatim_sms_send_duration_seconds',
+    'Time spent sending a message to the SMS API',
+)
+
+
+def instrument_pool(engine: Engine) -> None:
+    """ Tracks the connection pool of the given engine. """
+
+    pool = engine.pool
+
+    def checkout(*args: Any) -> None:
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_CHECKED_OUT.inc()
+        # only the QueuePool has an overflow
+        overflow = getattr(pool, 'overflow', None)
+        if overflow is not None and overflow() > 0:
+            DB_POOL_OVERFLOWS.inc()
+
+    def checkin(*args: Any) -> None:
+        DB_POOL_CHECKED_OUT.dec()
+
+    event.listen(engine, 'checkout', checkout)
+    event.listen(engine, 'checkin', checkin)
+
+
+def generate_metrics() -> tuple[bytes, str]:
+    """ Returns the current metrics and their content type. """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """ Removes the live gauges of an exited worker process. """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+def child_exit(server: Any, worker: Any) -> None:
+    """ The gunicorn server hook called after a worker exited. """
+    mark_process_dead(worker.pid)
@@ -18,12 +18,18 @@ from privatim.models.association_tables import (
     AgendaItemDisplayState,
     AgendaItemStatePreference,
 )
-from privatim.models.file import GeneralFile, SearchableFile
+from privatim.models.file import GeneralFile, ImageVariant, SearchableFile
+from privatim.models.http_session import HTTPSession
 from privatim.models.password_change_token import PasswordChangeToken
+from privatim.models.queued_mail import QueuedMail
 from privatim.models.tan import TAN
-from privatim.orm import get_engine
+from privatim.models.upgrade_step import UpgradeStep
+from privatim.metrics import instrument_pool
+from privatim.orm import get_engine, get_replica_engine
 from privatim.orm import get_session_factory
 from privatim.orm import get_tm_session
+from privatim.orm.replica import ReplicaRouting
+from privatim.orm.timeouts import StatementTimeouts, apply_timeouts
 
 
 # Prevent linters from complaining about unused imports
@@ -39,16 +45,22 @@ MeetingUserAttendance
 AgendaItemDisplayState
 AgendaItemStatePreference
 AgendaItem
+HTTPSession
 PasswordChangeToken
+QueuedMail
 GeneralFile
+ImageVariant
 SearchableFile
 SearchableMixin
 TAN
+UpgradeStep
 
 
 from typing import TYPE_CHECKING  # noqa: E402
 if TYPE_CHECKING:
     from pyramid.config import Configurator
+    from pyramid.interfaces import IRequest
+    from privatim.orm import FilteredSession
 
 
 logger = logging.getLogger(__name__)
@@ -70,16 +82,28 @@ def includeme(config: Configurator) -> None:
     # use pyramid_retry to retry a request when transient exceptions occur
     config.include('pyramid_retry')
 
-    session_factory = get_session_factory(get_engine(settings))
+    engine = get_engine(settings)
+    replica = get_replica_engine(settings)
+    if settings.get('metrics.token'):
+        instrument_pool(engine)
+    session_factory = get_session_factory(engine, replica)
     config.registry['dbsession_factory'] = session_factory  # type:ignore
 
+    timeouts = StatementTimeouts.from_settings(settings)
+    routing = ReplicaRouting.from_settings(settings) if replica else None
+
+    def dbsession(request: IRequest) -> FilteredSession:
+        # request.tm is the transaction manager used by pyramid_tm
+        session = get_tm_session(
+            session_factory,
+            request.tm,
+            use_replica=routing is not None and routing.use_replica(request)
+        )
+        apply_timeouts(session, *timeouts.for_request(request))
+        return session
+
     # make request.dbsession available for use in Pyramid
-    config.add_request_method(
-        # r.tm is the transaction manager used by pyramid_tm
-        lambda r: get_tm_session(session_factory, r.tm),
-        'dbsession',
-        reify=True
-    )
+    config.add_request_method(dbsession, 'dbsession', reify=True)
 
 
 configure_mappers()
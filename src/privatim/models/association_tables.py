@@ -1,8 +1,8 @@
 from __future__ import annotations
 from enum import Enum as PyEnum
 from enum import IntEnum
-from sqlalchemy import ForeignKey, Integer, Enum, UniqueConstraint
-from privatim.orm.meta import UUIDStrPK
+from sqlalchemy import ForeignKey, Enum, Text, select, update
+from sqlalchemy.dialects.postgresql import JSONB, array, insert
 
 from sqlalchemy.orm import relationship, mapped_column, Mapped
 from privatim.orm import Base
@@ -11,6 +11,8 @@ from privatim.orm.uuid_type import UUIDStr
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
+    from collections.abc import Collection, Mapping
+    from sqlalchemy.orm import Session
     from privatim.models import Meeting, User
 
 
@@ -27,8 +29,11 @@ class MeetingUserAttendance(Base):
     meeting_id: Mapped[UUIDStr] = mapped_column(
         ForeignKey('meetings.id'), primary_key=True
     )
+    # the primary key starts with meeting_id, so lookups of the meetings
+    # of a user need their own index
     user_id: Mapped[UUIDStr] = mapped_column(
-        ForeignKey('users.id', ondelete='SET NULL'), primary_key=True
+        ForeignKey('users.id', ondelete='SET NULL'), primary_key=True,
+        index=True
     )
 
     status: Mapped[AttendanceStatus] = mapped_column(
@@ -54,36 +59,110 @@ class AgendaItemDisplayState(IntEnum):
 
 
 class AgendaItemStatePreference(Base):
-    """Tracks user preferences for agenda item display states
-    (expanded/collapsed)"""
-
-    __tablename__ = 'agenda_item_state_preferences'
-    __table_args__ = (
-        UniqueConstraint(
-            'user_id', 'agenda_item_id',
-            name='_user_agenda_item_uc'
-        ),
-    )
+    """Tracks the display state (expanded/collapsed) of the agenda items
+    of a meeting for a single user.
+
+    All the states of a meeting are kept in a single row, as a map of agenda
+    item id to `AgendaItemDisplayState`. This way the meeting page reads
+    them with one query and every change is written with one upsert.
+    """
 
-    id: Mapped[UUIDStrPK]
+    __tablename__ = 'agenda_item_display_states'
 
     user_id: Mapped[UUIDStr] = mapped_column(
-        ForeignKey('users.id', ondelete='CASCADE')
+        ForeignKey('users.id', ondelete='CASCADE'),
+        primary_key=True
     )
 
-    agenda_item_id: Mapped[UUIDStr] = mapped_column(
-        ForeignKey('agenda_items.id', ondelete='CASCADE')
+    meeting_id: Mapped[UUIDStr] = mapped_column(
+        ForeignKey('meetings.id', ondelete='CASCADE'),
+        primary_key=True
     )
 
-    state: Mapped[AgendaItemDisplayState] = mapped_column(
-        Integer,
-        default=AgendaItemDisplayState.COLLAPSED
+    states: Mapped[dict[str, int]] = mapped_column(
+        JSONB,
+        nullable=False,
+        default=dict,
+        server_default='{}'
     )
 
-    user: Mapped[User] = relationship(
-        'User',
-        back_populates='agenda_item_state_preferences'
-    )
+    @classmethod
+    def get_states(
+        cls,
+        session: Session,
+        user_id: str,
+        meeting_id: str
+    ) -> dict[str, AgendaItemDisplayState]:
+        """ Returns the display states of a meeting's agenda items, keyed by
+        agenda item id. Items without a stored state are absent. """
+
+        states = session.execute(
+            select(cls.states).where(
+                cls.user_id == user_id,
+                cls.meeting_id == meeting_id,
+            )
+        ).scalar_one_or_none()
+        return {
+            agenda_item_id: AgendaItemDisplayState(state)
+            for agenda_item_id, state in (states or {}).items()
+        }
+
+    @classmethod
+    def set_states(
+        cls,
+        session: Session,
+        user_id: str,
+        meeting_id: str,
+        states: Mapping[str, AgendaItemDisplayState],
+        replace: bool = False
+    ) -> None:
+        """ Stores the given states with a single upsert.
+
+        By default the states are merged into the stored ones. With
+        ``replace`` the stored states are overwritten, which also drops the
+        states of agenda items that no longer exist.
+        """
+
+        values = {
+            str(agenda_item_id): int(state)
+            for agenda_item_id, state in states.items()
+        }
+        stmt = insert(cls).values(
+            user_id=user_id,
+            meeting_id=meeting_id,
+            states=values,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.user_id, cls.meeting_id],
+            set_={
+                'states': (
+                    stmt.excluded.states if replace
+                    else cls.states.concat(stmt.excluded.states)
+                )
+            }
+        )
+        session.execute(stmt)
+
+    @classmethod
+    def remove_states(
+        cls,
+        session: Session,
+        meeting_id: str,
+        agenda_item_ids: Collection[str],
+    ) -> None:
+        """ Drops the states of the given agenda items for all users. """
+
+        if not agenda_item_ids:
+            return
+        session.execute(
+            update(cls)
+            .where(cls.meeting_id == meeting_id)
+            .values(states=cls.states.op('-')(
+                array(
+                    [str(item_id) for item_id in agenda_item_ids], type_=Text
+                )
+            ))
+        )
 
     def __repr__(self) -> str:
-        return f'<AgendaItemStatePreference {self.state}>'
+        return f'<AgendaItemStatePreference {self.states}>'
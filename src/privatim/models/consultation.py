@@ -3,7 +3,7 @@ import uuid
 from datetime import datetime
 
 from sedate import utcnow
-from sqlalchemy import ForeignKey, Integer, Index, ARRAY, String
+from sqlalchemy import ForeignKey, Integer, Index, ARRAY, String, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from pyramid.authorization import Allow
 from pyramid.authorization import Authenticated
@@ -116,7 +116,8 @@ class Consultation(Base, SearchableMixin, SoftDeleteMixin):
     # in theory this could be nullable=False, but let's avoid problems with
     # user deletion
     creator_id: Mapped[UUIDStrType] = mapped_column(
-        ForeignKey('users.id', ondelete='SET NULL'), nullable=True
+        ForeignKey('users.id', ondelete='SET NULL'), nullable=True,
+        index=True
     )
     creator: Mapped[User | None] = relationship(
         'User',
@@ -214,4 +215,13 @@ class Consultation(Base, SearchableMixin, SoftDeleteMixin):
 
     __table_args__ = (
         Index('ix_consultations_deleted', 'deleted'),
+        # matches the global filter of `FilteredSession`, see the upgrade
+        # step `create_partial_indexes`
+        Index(
+            'ix_consultations_latest_created',
+            text('created DESC'),
+            postgresql_where=text(
+                'is_latest_version = 1 AND deleted IS false'
+            ),
+        ),
     )
@@ -3,7 +3,8 @@ import uuid
 from io import BytesIO
 import logging
 
-import magic
+from functools import cache
+from pyramid.authorization import Allow, Authenticated
 from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy_file import File
 from sqlalchemy.orm import (
@@ -14,13 +15,16 @@ from sqlalchemy.orm import (
     declared_attr,
 )
 
+from privatim.metrics import FILE_EXTRACTION_DURATION
 from privatim.forms.validators import word_mimetypes, DEFAULT_DOCX_MIME
 from privatim.models.soft_delete import SoftDeleteMixin
 from privatim.models.utils import extract_pdf_info, word_count, get_docx_text
 from privatim.orm.uuid_type import UUIDStr as UUIDStrType
+from privatim.orm import Base
+from privatim.orm.meta import FileContents, str_64
 from privatim.orm.abstract import AbstractFile
 from sqlalchemy import (
-    Text, Integer, ForeignKey, Computed, Index, CheckConstraint
+    Text, Integer, ForeignKey, Computed, Index, CheckConstraint, text
 )
 
 
@@ -29,7 +33,78 @@ logger = logging.getLogger('privatim.models.file')
 
 from typing import TYPE_CHECKING  # noqa:E402
 if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pyramid.interfaces import IRequest
     from privatim.models import Consultation, Meeting
+    from privatim.types import ACL
+
+
+# The square sizes (in pixels) profile pictures are scaled down to, pick
+# the smallest one which is at least twice the displayed size.
+IMAGE_VARIANT_SIZES = (40, 80, 250)
+
+# larger images are rejected, rather than decoded in the web worker
+MAX_IMAGE_PIXELS = 25_000_000
+
+
+@cache
+def variant_format() -> tuple[str, str]:
+    """ The image format and content type of the variants. """
+    from PIL import features
+
+    if features.check('webp'):
+        return 'WEBP', 'image/webp'
+    return 'PNG', 'image/png'  # pragma: no cover
+
+
+def scale_image(
+    content: bytes,
+    sizes: Iterable[int] = IMAGE_VARIANT_SIZES
+) -> list[tuple[int, str, bytes]]:
+    """ Scales and crops an image to squares of the given sizes.
+
+    Returns a list of (size, content type, content), which is empty if the
+    content is not an image or has more than `MAX_IMAGE_PIXELS`.
+
+    """
+    # Pillow is only loaded once images are processed
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    sizes = list(sizes)
+    try:
+        image: Image.Image = Image.open(BytesIO(content))
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            return []
+        # JPEGs can be decoded at a fraction of their size
+        largest = max(sizes, default=0)
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return []
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    image_format, content_type = variant_format()
+    variants = []
+    for size in sizes:
+        scaled = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        output = BytesIO()
+        scaled.save(output, format=image_format, quality=85)
+        variants.append((size, content_type, output.getvalue()))
+    return variants
+
+
+def image_url(
+    request: IRequest,
+    file_id: str,
+    size: int | None = None
+) -> str:
+    """ The download url of an image, scaled down to `size`, which has to
+    be one of `IMAGE_VARIANT_SIZES`. """
+    if size is None:
+        return request.route_url('download_file', id=file_id)
+    return request.route_url('download_file_variant', id=file_id, size=size)
 
 
 class GeneralFile(AbstractFile):
@@ -46,6 +121,50 @@ class GeneralFile(AbstractFile):
         'polymorphic_identity': 'general_file',
     }
 
+    variants: Mapped[list[ImageVariant]] = relationship(
+        'ImageVariant',
+        back_populates='file',
+        cascade='all, delete-orphan',
+        passive_deletes=True,
+    )
+
+    def generate_variants(self, content: bytes | None = None) -> None:
+        """ Replaces the scaled down variants of this image, does nothing
+        for files which aren't images. """
+        if content is None:
+            content = self.content
+        self.variants = [
+            ImageVariant(size=size, content_type=content_type, content=data)
+            for size, content_type, data in scale_image(content)
+        ]
+
+
+class ImageVariant(Base):
+    """ A scaled down, square copy of an image stored as `GeneralFile`.
+
+    These are small enough to be stored in the database directly and are
+    what lists of people download instead of the original upload.
+
+    """
+
+    __tablename__ = 'image_variants'
+
+    file_id: Mapped[UUIDStrType] = mapped_column(
+        ForeignKey('general_files.id', ondelete='CASCADE'),
+        primary_key=True,
+    )
+    file: Mapped[GeneralFile] = relationship(
+        GeneralFile, back_populates='variants'
+    )
+    size: Mapped[int] = mapped_column(primary_key=True)
+    content_type: Mapped[str_64]
+    content: Mapped[FileContents]
+
+    def __acl__(self) -> list[ACL]:
+        return [
+            (Allow, Authenticated, ['view']),
+        ]
+
 
 class SearchableFile(AbstractFile, SoftDeleteMixin):
     """
@@ -106,6 +225,17 @@ class SearchableFile(AbstractFile, SoftDeleteMixin):
                 postgresql_using='gin'
             ),
             Index('ix_searchable_files_deleted', 'deleted'),
+            # the files of a parent, as loaded through `FilteredSession`
+            Index(
+                'ix_searchable_files_consultation_id_not_deleted',
+                'consultation_id',
+                postgresql_where=text('deleted IS false'),
+            ),
+            Index(
+                'ix_searchable_files_meeting_id_not_deleted',
+                'meeting_id',
+                postgresql_where=text('deleted IS false'),
+            ),
             # Ensure exactly one parent FK is set
             CheckConstraint(
                 "num_nonnulls(consultation_id, meeting_id) = 1",
@@ -137,24 +267,27 @@ class SearchableFile(AbstractFile, SoftDeleteMixin):
         if content_type is None:
             content_type = self.get_content_type(content)
 
-        if content_type == 'application/pdf':
-            pages, extract = extract_pdf_info(BytesIO(content))
-            self.extract = (extract or '').strip()
-            self.pages_count = pages
-            self.word_count = word_count(extract)
-        elif content_type in word_mimetypes:
-            self.extract = (get_docx_text(BytesIO(content)) or '').strip()
-        elif content_type == 'text/plain':
-            self.extract = content.decode('utf-8').strip()
-            self.pages_count = None  # Not applicable for text files
-            self.word_count = word_count(content.decode('utf-8'))
-        elif content_type == 'application/octet-stream':
-            self.extract = content.decode('utf-8').strip()
-            self.pages_count = None  # Not applicable for text files
-            self.word_count = word_count(content.decode('utf-8'))
-        else:
-            logger.info(f'Unsupported file type: {content_type}')
-            raise ValueError(f'Unsupported file type: {content_type}')
+        with FILE_EXTRACTION_DURATION.labels(
+            content_type=content_type
+        ).time():
+            if content_type == 'application/pdf':
+                pages, extract = extract_pdf_info(BytesIO(content))
+                self.extract = (extract or '').strip()
+                self.pages_count = pages
+                self.word_count = word_count(extract)
+            elif content_type in word_mimetypes:
+                self.extract = (get_docx_text(BytesIO(content)) or '').strip()
+            elif content_type == 'text/plain':
+                self.extract = content.decode('utf-8').strip()
+                self.pages_count = None  # Not applicable for text files
+                self.word_count = word_count(content.decode('utf-8'))
+            elif content_type == 'application/octet-stream':
+                self.extract = content.decode('utf-8').strip()
+                self.pages_count = None  # Not applicable for text files
+                self.word_count = word_count(content.decode('utf-8'))
+            else:
+                logger.info(f'Unsupported file type: {content_type}')
+                raise ValueError(f'Unsupported file type: {content_type}')
 
         self.file = File(
             content=content,
@@ -205,6 +338,8 @@ class SearchableFile(AbstractFile, SoftDeleteMixin):
         Determine the content type of a file using libmagic.
         """
 
+        import magic
+
         mime = magic.Magic(mime=True)
         file_type = mime.from_buffer(content)
         return file_type
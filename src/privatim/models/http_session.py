@@ -0,0 +1,26 @@
+from __future__ import annotations
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from privatim.orm import Base
+from privatim.orm.meta import str_64
+
+
+from typing import Any
+
+
+class HTTPSession(Base):
+    """ The server-side state of a browser session, see `privatim.sessions`.
+
+    Times are stored as unix timestamps, like the session API exposes them.
+
+    """
+
+    __tablename__ = 'http_sessions'
+
+    # sha256 of the session id in the cookie, so the contents of this table
+    # can't be used to take over sessions
+    id: Mapped[str_64] = mapped_column(primary_key=True)
+    data: Mapped[dict[str, Any]] = mapped_column(JSONB)
+    created: Mapped[float]
+    accessed: Mapped[float] = mapped_column(index=True)
@@ -2,8 +2,10 @@ from __future__ import annotations
 import uuid
 
 from sedate import utcnow
-from sqlalchemy import Integer, select, func, Text, Select, ARRAY, JSON
-from sqlalchemy.orm import Mapped, mapped_column, contains_eager
+from sqlalchemy import (
+    Integer, select, func, Text, Select, ARRAY, JSON, insert, literal
+)
+from sqlalchemy.orm import Mapped, mapped_column, contains_eager, aliased
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -23,8 +25,9 @@ from privatim.orm.meta import UUIDStrPK, DateTimeWithTz
 from privatim.models.user import User
 
 
-from typing import TYPE_CHECKING, Any, TypedDict
+from typing import TYPE_CHECKING, Any, TypedDict, cast
 if TYPE_CHECKING:
+    from sqlalchemy import CursorResult
     from collections.abc import Iterator
     from sqlalchemy.orm import Session
     from privatim.models import WorkingGroup
@@ -109,6 +112,49 @@ class AgendaItem(Base, SearchableMixin):
 
         return new_agenda_item
 
+    @classmethod
+    def copy_from_meeting(
+        cls,
+        session: Session,
+        source_meeting_id: str,
+        target_meeting: Meeting,
+        copy_description: bool = True,
+    ) -> int:
+        """ Copies all agenda items of the source meeting to the end of the
+        target meeting with a single ``INSERT ... SELECT``.
+
+        The new positions continue after the current maximum position of the
+        target meeting, in the order of the source items. Returns the number
+        of copied agenda items.
+        """
+        # aliased, so the subquery doesn't correlate with the source rows
+        existing = aliased(cls)
+        offset = (
+            select(func.coalesce(func.max(existing.position) + 1, 0))
+            .where(existing.meeting_id == target_meeting.id)
+            .scalar_subquery()
+        )
+        source = (
+            select(
+                func.gen_random_uuid(),
+                cls.title,
+                cls.description if copy_description else literal(''),
+                offset + func.row_number().over(order_by=cls.position) - 1,
+                literal(target_meeting.id, UUIDStr()),
+            )
+            .where(cls.meeting_id == source_meeting_id)
+        )
+        stmt = insert(cls).from_select(
+            ['id', 'title', 'description', 'position', 'meeting_id'],
+            source,
+        )
+        result = cast('CursorResult[Any]', session.execute(
+            stmt, execution_options={'preserve_rowcount': True}
+        ))
+        # the collection on the target is stale after the bulk insert
+        session.expire(target_meeting, ['agenda_items'])
+        return result.rowcount
+
     id: Mapped[UUIDStrPK]
 
     title: Mapped[str] = mapped_column(Text, nullable=False)
@@ -143,14 +189,10 @@ class AgendaItem(Base, SearchableMixin):
         if not session:
             return AgendaItemDisplayState.COLLAPSED
 
-        preference = session.execute(
-            select(AgendaItemStatePreference).where(
-                AgendaItemStatePreference.agenda_item_id
-                == self.id, AgendaItemStatePreference.user_id == user.id,
-            )
-        ).scalar_one_or_none()
-        return preference.state if preference \
-            else (AgendaItemDisplayState.COLLAPSED)
+        states = AgendaItemStatePreference.get_states(
+            session, user.id, str(self.meeting_id)
+        )
+        return states.get(self.id, AgendaItemDisplayState.COLLAPSED)
 
     def __acl__(self) -> list[ACL]:
         return [
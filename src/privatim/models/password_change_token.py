@@ -16,6 +16,11 @@ from ..security_policy import PasswordException
 from .user import User
 
 
+# how long a token may be used after it has been requested, unless the
+# user hasn't set a password yet (these are kept by `purge_tokens`)
+TOKEN_LIFETIME = timedelta(hours=48)
+
+
 class PasswordChangeToken(Base):
 
     __tablename__ = 'password_change_tokens'
@@ -28,6 +33,8 @@ class PasswordChangeToken(Base):
     time_requested: Mapped[DateTimeWithoutTz]
     time_consumed: Mapped[DateTimeWithoutTz | None]
     time_expired: Mapped[DateTimeWithoutTz | None]
+    # when the token expires or has expired, see `privatim.cli.purge_tokens`
+    expires: Mapped[DateTimeWithoutTz] = mapped_column(index=True)
     token: Mapped[str] = mapped_column(String)
     ip_address: Mapped[str] = mapped_column(String)
 
@@ -51,6 +58,7 @@ class PasswordChangeToken(Base):
         if time_requested is None:
             time_requested = datetime.utcnow()
         self.time_requested = time_requested.replace(tzinfo=None)
+        self.expires = self.time_requested + TOKEN_LIFETIME
         self.time_consumed = None
         self.token = secrets.token_urlsafe()
 
@@ -85,6 +93,7 @@ class PasswordChangeToken(Base):
                 expired = datetime.utcnow()
             expired = expired.replace(tzinfo=None)
             self.time_expired = expired
+            self.expires = min(self.expires, expired)
 
     @property
     def expired(self) -> bool:
@@ -92,7 +101,6 @@ class PasswordChangeToken(Base):
         if expired and expired < datetime.utcnow():
             return True
 
-        expiring_time = self.time_requested + timedelta(hours=48)
-        if datetime.utcnow() > expiring_time:
+        if datetime.utcnow() > self.expires:
             return True
         return False
@@ -1,28 +1,133 @@
 from __future__ import annotations
+import logging
+import transaction
+from privatim.cache import ProcessCache
 from privatim.static import get_default_profile_pic_data
-from functools import cache
-from sqlalchemy import select
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import SQLAlchemyError
 
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
-    from sqlalchemy.orm import Session
+    from collections.abc import Iterator
+    from pyramid.interfaces import IRequest
+    from sqlalchemy.orm import Session, sessionmaker
+    from privatim.orm import FilteredSession
     from privatim.models.file import GeneralFile
 
 
-@cache
+logger = logging.getLogger('privatim.profile_pic')
+
+
 def get_or_create_default_profile_pic(session: Session) -> GeneralFile:
     from privatim.models.file import GeneralFile
+    filename, data = get_default_profile_pic_data()
     stmt = select(GeneralFile).where(
-        GeneralFile.filename == 'default_profile_picture.png'
-    )
+        GeneralFile.filename == filename
+    ).order_by(GeneralFile.id).limit(1)
     default_profile_picture = session.execute(stmt).scalar_one_or_none()
     if default_profile_picture is not None:
         return default_profile_picture
 
-    filename, data = get_default_profile_pic_data()
     default_profile_picture = GeneralFile(filename=filename, content=data)
+    default_profile_picture.generate_variants(data)
     session.add(default_profile_picture)
     session.flush()
     session.refresh(default_profile_picture)
     return default_profile_picture
+
+
+class ProfilePicCache(ProcessCache[str, str | None]):
+    """ Process-wide lookup of the profile picture shown for a user, see
+    `ProcessCache`.
+
+    Maps user ids to the id of their profile picture, falling back to the
+    default picture, which is only resolved once.
+
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300) -> None:
+        super().__init__(maxsize, ttl)
+        self.default_id: str | None = None
+
+    def default_pic_id(self, session: Session) -> str:
+        if self.default_id is None:
+            default = get_or_create_default_profile_pic(session)
+            self.default_id = str(default.id)
+        return self.default_id
+
+    def pic_id(self, session: Session, user_id: str) -> str:
+        from privatim.models.user import User
+
+        def load() -> str | None:
+            pic_id = session.scalar(
+                select(User.profile_pic_id).where(User.id == user_id)
+            )
+            return str(pic_id) if pic_id else None
+
+        return self.get(user_id, load) or self.default_pic_id(session)
+
+    def url(
+        self,
+        request: IRequest,
+        user_id: str,
+        size: int | None = None
+    ) -> str:
+        from privatim.models.file import image_url
+        pic_id = self.pic_id(request.dbsession, user_id)
+        return image_url(request, pic_id, size)
+
+    def invalidate(self, key: str) -> None:
+        """ Invalidates the entry of a user, or the entries showing a
+        picture, given the id of the file. """
+        with self.lock:
+            super().invalidate(key)
+            if key == self.default_id:
+                self.default_id = None
+            for user_id, (__, pic_id) in list(self.entries.items()):
+                if pic_id == key:
+                    self.entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            super().clear()
+            self.default_id = None
+
+
+profile_pic_cache = ProfilePicCache()
+
+
+def resolve_default_profile_pic(
+    session_factory: sessionmaker[FilteredSession]
+) -> None:
+    """ Resolves the default profile picture when the app starts, so the
+    first requests don't have to.
+
+    """
+    from privatim.orm import get_tm_session
+    profile_pic_cache.clear()
+    try:
+        with transaction.manager:
+            session = get_tm_session(session_factory, transaction.manager)
+            profile_pic_cache.default_pic_id(session)
+    except SQLAlchemyError:
+        # the database might not be set up yet, we'll try again later
+        logger.warning('Could not resolve the default profile picture')
+
+
+@profile_pic_cache.invalidated_by
+def changed_profile_pics(session: Session) -> Iterator[str]:
+    from privatim.models.file import GeneralFile
+    from privatim.models.user import User
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        attrs = inspect(obj).attrs
+        if (
+            attrs.profile_pic_id.history.has_changes()
+            or attrs.profile_pic.history.has_changes()
+        ):
+            yield str(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, (User, GeneralFile)):
+            yield str(obj.id)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+from datetime import datetime
+
+from sedate import utcnow
+from sqlalchemy import Index
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from privatim.mail.types import MailState
+from privatim.orm import Base
+from privatim.orm.meta import BigIntPK
+
+
+from typing import Any
+
+
+class QueuedMail(Base):
+    """ A mail in the outbox, which is delivered by the ``deliver_mail``
+    script, see `privatim.mail.outbox`.
+
+    Delivered mails are removed, mails which could not be delivered are
+    kept with the state `MailState.failed` or `MailState.inactive_recipient`.
+
+    """
+
+    __tablename__ = 'mail_outbox'
+
+    # delivered in the order they have been queued
+    id: Mapped[BigIntPK]
+    created: Mapped[datetime] = mapped_column(default=utcnow)
+    # the serialized MailParams or TemplateMailParams
+    params: Mapped[dict[str, Any]] = mapped_column(JSONB)
+    state: Mapped[int] = mapped_column(default=MailState.queued)
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt: Mapped[datetime] = mapped_column(default=utcnow)
+    last_error: Mapped[str | None]
+
+    __table_args__ = (
+        # the mails waiting for delivery
+        Index(
+            'ix_mail_outbox_pending',
+            'next_attempt',
+            postgresql_where=text(f'state = {MailState.queued:d}')
+        ),
+    )
@@ -1,18 +1,23 @@
 from __future__ import annotations
+from collections import defaultdict
 from functools import cache
-from sqlalchemy import Boolean
+from sqlalchemy import Boolean, and_, or_, select, update
 from sqlalchemy.orm import (
     Mapped,
     mapped_column,
+    object_mapper,
     object_session,
 )
+from sqlalchemy.orm.attributes import set_committed_value
 from privatim.orm import Base
 from sqlalchemy.orm import declarative_mixin, Mapper, Session
 
 
-from typing import TypeVar, TYPE_CHECKING
+from typing import Any, TypeVar, TYPE_CHECKING
 if TYPE_CHECKING:
-    from sqlalchemy.orm import DeclarativeBase
+    from collections.abc import Iterable
+    from sqlalchemy import Table
+    from sqlalchemy.orm import DeclarativeBase, RelationshipProperty
 
 
 T = TypeVar('T', bound='DeclarativeBase')
@@ -31,19 +36,7 @@ class SoftDeleteMixin:
         if session is None:
             return
 
-        self.deleted = is_delete
-
-        mapper: Mapper = self.__class__.__mapper__  # type: ignore
-
-        for rel in mapper.relationships:
-            if 'delete' in rel.cascade:
-                related_objects = getattr(self, rel.key)
-                if isinstance(related_objects, list):
-                    for related_obj in related_objects:
-                        if isinstance(related_obj, SoftDeleteMixin):
-                            related_obj.deleted = is_delete
-                elif isinstance(related_objects, SoftDeleteMixin):
-                    related_objects.deleted = is_delete
+        set_deleted(session, [self], is_delete)
 
     def cascade_soft_delete(self) -> None:
         self._toggle_soft_delete(True)
@@ -62,3 +55,114 @@ def all_soft_delete_models() -> tuple[type[SoftDeleteMixin], ...]:
             if issubclass(cls, SoftDeleteMixin):
                 model_classes.add(cls)
     return tuple(model_classes)
+
+
+@cache
+def soft_delete_cascades(
+    mapper: Mapper[Any]
+) -> tuple[RelationshipProperty[Any], ...]:
+    """ The relationships of the model, which cascade deletes to other
+    soft deletable models. """
+    return tuple(
+        rel for rel in mapper.relationships
+        if 'delete' in rel.cascade
+        and rel.secondary is None
+        and issubclass(rel.mapper.class_, SoftDeleteMixin)
+    )
+
+
+def _with_self_references(
+    session: Session,
+    mapper: Mapper[Any],
+    ids: set[str]
+) -> set[str]:
+    """ Adds the rows reachable through the self-referential cascades of
+    the model (e.g. the whole version chain of a consultation), using a
+    single recursive query. """
+
+    rels = [r for r in soft_delete_cascades(mapper) if r.mapper is mapper]
+    if not rels or not ids:
+        return ids
+
+    table: Table = mapper.local_table  # type:ignore[assignment]
+    pk = mapper.primary_key[0]
+    names = {pk.name} | {
+        column.name
+        for rel in rels
+        for pair in rel.local_remote_pairs or ()
+        for column in pair
+    }
+    columns = [table.c[name] for name in sorted(names)]
+
+    rows = select(*columns).where(pk.in_(ids)).cte(recursive=True)
+    related = table.alias()
+    rows = rows.union(
+        select(*(related.c[c.name] for c in columns))
+        .join(rows, or_(*(
+            and_(*(
+                related.c[remote.name] == rows.c[local.name]
+                for local, remote in rel.local_remote_pairs or ()
+            ))
+            for rel in rels
+        )))
+    )
+    return set(session.scalars(select(rows.c[pk.name])))
+
+
+def set_deleted(
+    session: Session,
+    instances: Iterable[SoftDeleteMixin],
+    deleted: bool
+) -> None:
+    """ Soft deletes (or restores) the instances and everything their
+    delete cascades reach.
+
+    The affected rows are determined from the mapper's relationships and
+    updated in bulk, one statement per table, without loading any related
+    collections. Instances already present in the session are updated in
+    place.
+
+    """
+    # the instances may not have been written yet
+    session.flush()
+
+    pending: list[tuple[Mapper[Any], set[str]]] = []
+    for instance in instances:
+        mapper = object_mapper(instance)
+        pk = mapper.primary_key_from_instance(instance)[0]
+        pending.append((mapper, {pk}))
+
+    affected: defaultdict[Mapper[Any], set[str]] = defaultdict(set)
+    while pending:
+        mapper, ids = pending.pop()
+        ids = _with_self_references(session, mapper, ids) - affected[mapper]
+        if not ids:
+            continue
+
+        affected[mapper] |= ids
+        for rel in soft_delete_cascades(mapper):
+            if rel.mapper is mapper:
+                continue
+
+            related_ids = session.scalars(
+                select(rel.mapper.primary_key[0])
+                .where(rel.primaryjoin)
+                .where(mapper.primary_key[0].in_(ids))
+            )
+            pending.append((rel.mapper, set(related_ids)))
+
+    for mapper, ids in affected.items():
+        # an ORM statement, so the transaction manager sees the change,
+        # the loaded objects are synchronized below
+        session.execute(
+            update(mapper.class_)
+            .where(mapper.primary_key[0].in_(ids))
+            .values(deleted=deleted)
+            .execution_options(synchronize_session=False)
+        )
+
+    # keep the loaded objects in line with the database
+    for state in session.identity_map.all_states():
+        ids = affected.get(state.mapper, set())
+        if state.identity is not None and state.identity[0] in ids:
+            set_committed_value(state.obj(), 'deleted', deleted)
@@ -4,6 +4,7 @@ from datetime import datetime
 from datetime import timedelta
 from sedate import utcnow
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Mapped
@@ -16,6 +17,10 @@ if TYPE_CHECKING:
     from .user import User
 
 
+# how long a TAN may be used after it has been requested
+TAN_LIFETIME = timedelta(hours=72)
+
+
 class TAN(Base):
 
     __tablename__ = 'tans'
@@ -23,15 +28,23 @@ class TAN(Base):
     id: Mapped[UUIDStrPK]
     user_id: Mapped[UUIDStr] = mapped_column(
         ForeignKey('users.id', ondelete='CASCADE'),
-        index=True
     )
     time_requested: Mapped[datetime]
     time_expired: Mapped[datetime | None]
-    tan: Mapped[str_64] = mapped_column(index=True)
+    # when the TAN expires or has expired, so the expired TANs can be
+    # found with an index, see `privatim.cli.purge_tokens`
+    expires: Mapped[datetime] = mapped_column(index=True)
+    tan: Mapped[str_64]
     ip_address: Mapped[str_32]
 
     user: Mapped[User] = relationship()
 
+    __table_args__ = (
+        # the lookup of `MTanTool.tan`, also used to delete the TANs
+        # of a user
+        Index('ix_tans_user_id_tan', 'user_id', 'tan'),
+    )
+
     def __init__(
             self,
             user: User,
@@ -46,20 +59,29 @@ class TAN(Base):
             requested = utcnow()
         self.time_requested = requested
         self.time_expired = None
+        self.expires = requested + TAN_LIFETIME
         self.tan = tan
 
-    def expired(self, hours: int | None = 72) -> bool:
+    def expired(
+        self,
+        hours: int | None = TAN_LIFETIME // timedelta(hours=1)
+    ) -> bool:
         now = utcnow()
         if self.time_expired and self.time_expired < now:
             return True
 
-        if hours is not None:
+        if hours is None:
+            return False
+
+        if timedelta(hours=hours) == TAN_LIFETIME:
+            # the stored expiry, which `expire` lowers and `purge_tokens` uses
+            expiring_time = self.expires
+        else:
             expiring_time = self.time_requested + timedelta(hours=hours)
-            if now > expiring_time:
-                return True
-        return False
+        return now > expiring_time
 
     def expire(self) -> None:
         if self.time_expired is not None:
             raise ValueError('TAN already expired')
         self.time_expired = utcnow()
+        self.expires = min(self.expires, self.time_expired)
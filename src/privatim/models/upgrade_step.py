@@ -0,0 +1,17 @@
+from __future__ import annotations
+from datetime import datetime
+
+from sedate import utcnow
+from sqlalchemy.orm import Mapped, mapped_column
+
+from privatim.orm import Base
+
+
+class UpgradeStep(Base):
+    """ An upgrade step that has been completed, see
+    `privatim.cli.upgrade.UpgradeContext.run_step`. """
+
+    __tablename__ = 'upgrade_steps'
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    applied: Mapped[datetime] = mapped_column(default=utcnow)
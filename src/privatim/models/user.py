@@ -1,12 +1,11 @@
 from __future__ import annotations
 import uuid
-from functools import cached_property
+from functools import cache, cached_property
 from random import choice
 
 from sedate import utcnow
 
 from privatim.models.comment import Comment
-from privatim.pyavatar import PyAvatar
 from pyramid.authorization import Allow
 from pyramid.authorization import Authenticated
 import bcrypt
@@ -17,34 +16,39 @@ from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm.session import object_session
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
-from sqlalchemy import ForeignKey, select
+from sqlalchemy import ForeignKey, Index, String, func, or_, select
 from sqlalchemy.orm import Mapped
 
 from privatim.forms.constants import AVATAR_COLORS
 from privatim.models import Group, WorkingGroup
-from privatim.models.profile_pic import get_or_create_default_profile_pic
+from privatim.models.profile_pic import profile_pic_cache
 from privatim.orm.meta import UUIDStr as UUIDStrType
 from privatim.models.group import user_group_association
 from privatim.orm import Base
 from privatim.orm.meta import UUIDStrPK, str_256, str_128, str_32
-from privatim.models.file import GeneralFile
-from privatim.models.association_tables import AgendaItemDisplayState
+from privatim.models.file import GeneralFile, image_url
 
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
-    from privatim.models.association_tables import (
-        MeetingUserAttendance,
-        AgendaItemStatePreference,
-    )
+    from privatim.pyavatar import AvatarRenderer
+    from privatim.models.association_tables import MeetingUserAttendance
     from privatim.types import ACL
     from sqlalchemy.orm import Session
     from pyramid.interfaces import IRequest
     from privatim.models import Meeting
-    from sqlalchemy import ScalarSelect
+    from sqlalchemy import ColumnElement, ScalarSelect
     from privatim.models import Consultation
 
 
+@cache
+def get_avatar_renderer() -> AvatarRenderer:
+    # loads Pillow and the font, which is only needed for new users
+    from privatim.pyavatar import AvatarRenderer
+
+    return AvatarRenderer(size=250, char_spacing=35)
+
+
 class User(Base):
     __tablename__ = 'users'
 
@@ -107,20 +111,23 @@ class User(Base):
         """
         # Choose a random color from the palette
         bg_color = choice(AVATAR_COLORS)  # nosec[B311]
-        avatar = PyAvatar(
-            self.abbrev, size=250, char_spacing=35, color=bg_color,
-        )
+        content = get_avatar_renderer().render(self.abbrev, bg_color)
         general_file = GeneralFile(
-            filename=f'{self.id}_avatar.png',
-            content=avatar.stream()
+            filename=f'{self.id}_avatar.png', content=content
         )
+        general_file.generate_variants(content)
         session.add(general_file)
         session.flush()  # Flush to get the ID assigned
         self.profile_pic = general_file
 
-    def profile_pic_download_link(self, request: IRequest) -> str:
+    def profile_pic_download_link(
+        self,
+        request: IRequest,
+        size: int | None = None
+    ) -> str:
+        """ See `image_url` for the available sizes. """
         return (
-            request.route_url('download_file', id=self.profile_pic_id)
+            image_url(request, self.profile_pic_id, size)
             if (self.profile_pic_id)
             else request.static_url('privatim:static/default_profile_icon.png')
         )
@@ -185,26 +192,6 @@ class User(Base):
         foreign_keys='Meeting.creator_id',
     )
 
-    agenda_item_state_preferences: Mapped[list[AgendaItemStatePreference]] \
-        = (relationship(
-            'AgendaItemStatePreference',
-            back_populates='user',
-            cascade='all, delete-orphan',
-        )
-    )
-
-    def get_agenda_item_state(
-            self,
-            agenda_item_id: str
-    ) -> AgendaItemDisplayState:
-        """Get the display state for a specific agenda item"""
-        pref = next(
-            (p for p in self.agenda_item_state_preferences
-             if p.agenda_item_id == agenda_item_id),
-            None
-        )
-        return pref.state if pref else AgendaItemDisplayState.COLLAPSED
-
     def set_password(self, password: str) -> None:
         password = password or ''
         pwhash = bcrypt.hashpw(password.encode('utf8'), bcrypt.gensalt())
@@ -232,7 +219,7 @@ class User(Base):
             return self.email
         return ' '.join(parts)
 
-    @cached_property
+    @hybrid_property
     def fullname(self) -> str:
         parts = []
         if self.first_name:
@@ -240,16 +227,33 @@ class User(Base):
         if self.last_name:
             parts.append(self.last_name)
         parts.append('(' + self.abbrev + ')')
-        if not parts:
-            return self.email
         return ' '.join(parts)
 
-    @property
+    @fullname.inplace.expression
+    @classmethod
+    def _fullname_expression(cls) -> ColumnElement[str]:
+        return func.concat_ws(
+            ' ',
+            func.nullif(cls.first_name, ''),
+            func.nullif(cls.last_name, ''),
+            '(' + cls.abbrev + ')',
+            type_=String,
+        )
+
+    @hybrid_property
     def is_admin(self) -> bool:
         """ This is only used for the badge in the user list (!) """
         return ('admin' in self.first_name.lower() or 'admin' in
                 self.last_name.lower())
 
+    @is_admin.inplace.expression
+    @classmethod
+    def _is_admin_expression(cls) -> ColumnElement[bool]:
+        return or_(
+            cls.first_name.icontains('admin'),
+            cls.last_name.icontains('admin'),
+        )
+
     @property
     def picture(self) -> GeneralFile:
         """ Returns the user's profile picture or the default picture. """
@@ -257,8 +261,22 @@ class User(Base):
         assert session is not None
         if self.profile_pic:
             return self.profile_pic
-        else:
-            return get_or_create_default_profile_pic(session)
+        default = session.get(
+            GeneralFile, profile_pic_cache.default_pic_id(session)
+        )
+        if default is None:
+            # the default picture has been removed behind our back
+            profile_pic_cache.clear()
+            default = session.get(
+                GeneralFile, profile_pic_cache.default_pic_id(session)
+            )
+            assert default is not None
+        return default
+
+    __table_args__ = (
+        # matches the ordering of the people list
+        Index('ix_users_last_name_first_name', 'last_name', 'first_name'),
+    )
 
     def __acl__(self) -> list[ACL]:
         """ Allow the profile to be viewed by logged-in users."""
@@ -1,8 +1,4 @@
 from __future__ import annotations
-from docx import Document
-from pdftotext import PDF  # type: ignore
-from docx.text.paragraph import Paragraph
-from docx.table import Table
 
 
 from typing import IO, TYPE_CHECKING, Any
@@ -43,6 +39,8 @@ def extract_pdf_info(
 
     Requires poppler.
     """
+    from pdftotext import PDF  # type: ignore
+
     try:
         content.seek(0)  # type:ignore[attr-defined]
     except Exception:  # nosec:B110
@@ -59,6 +57,8 @@ def extract_pdf_info(
 
 
 def get_docx_text(content: IO[bytes]) -> str:
+    from docx import Document
+
     doc = Document(content)
     try:
         text = recursively_iter_block_items(doc)  # type: ignore
@@ -77,6 +77,9 @@ def recursively_iter_block_items(
     -1793226714
 
     """
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
     for item in blockcontainer.iter_inner_content():
         if isinstance(item, Paragraph):
             yield item
@@ -1,7 +1,10 @@
 from __future__ import annotations
-from sqlalchemy import engine_from_config
+from pyramid.settings import asbool
+from sqlalchemy import engine_from_config, make_url
 import zope.sqlalchemy
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from .instrumentation import instrument_engine
 from .meta import Base
 from privatim.orm.session import FilteredSession
 
@@ -11,27 +14,62 @@ if TYPE_CHECKING:
     from sqlalchemy.engine import Engine
 
 
+# the options of the QueuePool, which the NullPool doesn't accept
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
 def get_engine(
         settings: dict[str, Any],
         prefix:   str = 'sqlalchemy.'
 ) -> Engine:
 
-    return engine_from_config(
-        settings,
-        prefix,
-        pool_pre_ping=True
-    )
-
-
-def get_session_factory(engine: Engine) -> sessionmaker[FilteredSession]:
+    options: dict[str, Any] = {'pool_pre_ping': True}
+    if asbool(settings.get('db.pgbouncer')):
+        # PgBouncer pools the connections, in transaction pooling mode
+        # consecutive transactions may use different server connections
+        # so prepared statements can't be used either
+        options['poolclass'] = NullPool
+        ignored = {f'{prefix}{option}' for option in QUEUE_POOL_OPTIONS}
+        settings = {
+            key: value
+            for key, value in settings.items()
+            if key not in ignored
+        }
+        url = make_url(settings[f'{prefix}url'])
+        if url.get_driver_name() == 'psycopg':
+            options['connect_args'] = {'prepare_threshold': None}
+
+    # the pool is configured with the usual options, e.g.
+    # sqlalchemy.pool_size, sqlalchemy.max_overflow,
+    # sqlalchemy.pool_timeout and sqlalchemy.pool_recycle, the first three
+    # are ignored with PgBouncer
+    engine = engine_from_config(settings, prefix, **options)
+    if asbool(settings.get('sql_stats.enabled')):
+        instrument_engine(engine)
+    return engine
+
+
+def get_replica_engine(settings: dict[str, Any]) -> Engine | None:
+    """ Returns the engine of the read replica configured with
+    ``sqlalchemy_replica.url``, if any. """
+    if not settings.get('sqlalchemy_replica.url'):
+        return None
+    return get_engine(settings, prefix='sqlalchemy_replica.')
+
+
+def get_session_factory(
+        engine: Engine,
+        replica: Engine | None = None
+) -> sessionmaker[FilteredSession]:
     factory = sessionmaker(class_=FilteredSession)
-    factory.configure(bind=engine)
+    factory.configure(bind=engine, info={'replica': replica})
     return factory
 
 
 def get_tm_session(
         session_factory: sessionmaker[FilteredSession],
-        transaction_manager: Any
+        transaction_manager: Any,
+        use_replica: bool = False
 ) -> FilteredSession:
     """
     Get a ``sqlalchemy.orm.Session`` instance backed by a transaction.
@@ -52,8 +90,12 @@ def get_tm_session(
           with transaction.manager:
               dbsession = get_tm_session(session_factory, transaction.manager)
 
+    With ``use_replica`` the reads of the session go to the replica of
+    the session factory, as long as the session doesn't write anything.
+
     """
     dbsession = session_factory()
+    dbsession.info['use_replica'] = use_replica
     zope.sqlalchemy.register(
         dbsession,
         transaction_manager=transaction_manager
@@ -64,6 +106,7 @@ def get_tm_session(
 __all__ = (
     'Base',
     'get_engine',
+    'get_replica_engine',
     'get_session_factory',
     'get_tm_session'
 )
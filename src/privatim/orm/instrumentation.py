@@ -0,0 +1,140 @@
+""" Collects statistics about the SQL statements issued while handling a
+request, see `privatim.tweens.sql_stats_tween_factory`.
+
+Enable it with ``sql_stats.enabled = true``.
+
+"""
+from __future__ import annotations
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from time import perf_counter
+
+
+from typing import Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from sqlalchemy.engine import Connection, Engine
+
+
+PARAMETER_LIST = re.compile(r'%\(\w+\)s(?:\s*,\s*%\(\w+\)s)*')
+WHITESPACE = re.compile(r'\s+')
+
+_current_stats: ContextVar[SQLStats | None] = ContextVar(
+    'sql_stats', default=None
+)
+
+
+def statement_shape(statement: str) -> str:
+    """ Normalizes the statement, so e.g. the same query with a different
+    number of parameters in an IN clause has the same shape. """
+    statement = PARAMETER_LIST.sub('?', statement)
+    return WHITESPACE.sub(' ', statement).strip()
+
+
+class SQLStats:
+    """ The statements issued within `collect_sql_stats`. """
+
+    def __init__(self) -> None:
+        self.statements = 0
+        self.duration = 0.0
+        self.rows = 0
+        self.shapes: Counter[str] = Counter()
+        # SQLAlchemy's compiled statement cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record(
+        self,
+        statement: str,
+        duration: float,
+        rows: int,
+        cache_hit: int | None = None
+    ) -> None:
+        self.statements += 1
+        self.duration += duration
+        self.rows += max(rows, 0)
+        self.shapes[statement_shape(statement)] += 1
+        if cache_hit == CACHE_HIT:
+            self.cache_hits += 1
+        elif cache_hit == CACHE_MISS:
+            self.cache_misses += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """ Returns the queries executed more than `threshold` times, these
+        are most likely lazy loads inside a loop (N+1 queries). """
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count > threshold and shape.startswith('SELECT')
+        ]
+
+    def summary(self, threshold: int) -> str:
+        return (
+            f'statements={self.statements}; '
+            f'time={self.duration * 1000:.1f}ms; '
+            f'rows={self.rows}; '
+            f'repeated={len(self.repeated(threshold))}; '
+            f'cache={self.cache_hits}/{self.cache_hits + self.cache_misses}'
+        )
+
+
+@contextmanager
+def collect_sql_stats() -> Iterator[SQLStats]:
+    stats = SQLStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def before_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool
+) -> None:
+    if _current_stats.get() is not None:
+        # kept on the execution context, so nothing is left behind on the
+        # connection if the statement fails
+        context._sql_stats_start = perf_counter()
+
+
+def after_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool
+) -> None:
+    stats = _current_stats.get()
+    start = getattr(context, '_sql_stats_start', None)
+    if stats is None or start is None:
+        return
+    duration = perf_counter() - start
+    stats.record(
+        statement,
+        duration,
+        cursor.rowcount,
+        getattr(context, 'cache_hit', None)
+    )
+
+
+def instrument_engine(engine: Engine) -> None:
+    """ Records the statements of the engine in the active `SQLStats`.
+
+    Outside of `collect_sql_stats` this only costs a context variable
+    lookup per statement.
+
+    """
+    if event.contains(engine, 'after_cursor_execute', after_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
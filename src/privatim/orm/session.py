@@ -1,12 +1,61 @@
 from __future__ import annotations
 from contextlib import contextmanager
-from sqlalchemy import event
-from sqlalchemy.orm import Session as BaseSession, with_loader_criteria
+from sqlalchemy import event, literal_column
+from sqlalchemy.orm import (
+    Mapper, Session as BaseSession, with_loader_criteria)
 
 
 from typing import Any, TYPE_CHECKING
 if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection, Engine
     from sqlalchemy.orm import ORMExecuteState
+    from sqlalchemy.sql import ClauseElement, ColumnElement
+    from sqlalchemy.sql.base import ExecutableOption
+
+
+def _is_latest_version(cls: Any) -> ColumnElement[bool]:
+    # rendered as a literal rather than a bound parameter, so the planner
+    # can match the partial indexes even for prepared statements
+    return cls.is_latest_version == literal_column('1')
+
+
+def _is_not_deleted(cls: Any) -> ColumnElement[bool]:
+    return cls.deleted.is_(False)
+
+
+_loader_criteria: dict[str, tuple[ExecutableOption, ...]] = {
+    'consultation': (),
+    'soft_delete': (),
+}
+
+
+@event.listens_for(Mapper, 'after_configured')
+def _create_loader_criteria() -> None:
+    """ Creates the global filter criteria, once all models are mapped. """
+    from privatim.models.consultation import Consultation
+    from privatim.models.soft_delete import all_soft_delete_models
+
+    # the criteria are functions, which are only evaluated when a
+    # statement is compiled for the first time, and the options keep a
+    # stable cache key
+    _loader_criteria['consultation'] = (
+        with_loader_criteria(
+            Consultation,
+            _is_latest_version,
+            track_closure_variables=False
+        ),
+    )
+    # more models might have been mapped since the last call
+    all_soft_delete_models.cache_clear()
+    _loader_criteria['soft_delete'] = tuple(
+        with_loader_criteria(
+            model,
+            _is_not_deleted,
+            track_closure_variables=False
+        )
+        # sorted, so the order of the options is always the same
+        for model in sorted(all_soft_delete_models(), key=lambda m: m.__name__)
+    )
 
 
 class FilteredSession(BaseSession):
@@ -56,8 +105,6 @@ class FilteredSession(BaseSession):
                 and not orm_execute_state.is_column_load
                 and not orm_execute_state.is_relationship_load
             ):
-                from privatim.models.consultation import Consultation
-
                 # Below, an option is added to all SELECT statements that
                 # will limit all queries against Consultation to filter on
                 # is_latest_version == True. The criteria will be applied to
@@ -65,32 +112,22 @@ class FilteredSession(BaseSession):
                 # query. The with_loader_criteria() option by default will
                 # automatically propagate to relationship loaders as well (
                 # lazy loads, selectinloads, etc.)
-
-                stmt = orm_execute_state.statement
-
-                if not self._disable_consultation_filter:
-                    stmt = stmt.options(
-                        with_loader_criteria(
-                            Consultation,
-                            Consultation.is_latest_version == 1
-                        )
-                    )
-
+                #
                 # Analogous to the above: soft delete.
-                # Accumulate soft delete criteria for all models.
-                from privatim.models.soft_delete import all_soft_delete_models
+                #
+                # The options are created once, so they produce the same
+                # cache key for every query and the compiled statements can
+                # be cached.
+                options: tuple[ExecutableOption, ...] = ()
+                if not self._disable_consultation_filter:
+                    options += _loader_criteria['consultation']
                 if not self._disable_soft_delete_filter:
-                    soft_delete_criteria = [
-                        with_loader_criteria(
-                            model,
-                            model.deleted.is_(False)
-                        )
-                        for model in all_soft_delete_models()
-                    ]
-                    # Apply all criteria at once
-                    stmt = stmt.options(*soft_delete_criteria)
-
-                orm_execute_state.statement = stmt
+                    options += _loader_criteria['soft_delete']
+
+                if options:
+                    orm_execute_state.statement = (
+                        orm_execute_state.statement.options(*options)
+                    )
 
     @contextmanager
     def no_consultation_filter(self):  # type:ignore
@@ -112,11 +149,38 @@ class FilteredSession(BaseSession):
         finally:
             self._disable_soft_delete_filter = original_value
 
+    def get_bind(
+        self,
+        mapper: Mapper[Any] | type[Any] | None = None,
+        *,
+        clause: ClauseElement | None = None,
+        **kw: Any
+    ) -> Engine | Connection:
+        """ Sends plain SELECT statements to the replica, if the session
+        has been created with ``use_replica`` (see `get_tm_session`).
+
+        Everything else goes to the primary. Once it has, the session
+        stays there, so the request reads its own writes.
+
+        """
+        replica = self.info.get('replica')
+        if replica is not None and self.info.get('use_replica'):
+            if (
+                not self._flushing
+                and getattr(clause, 'is_select', False)
+                and getattr(clause, '_for_update_arg', None) is None
+            ):
+                return replica
+            self.info['use_replica'] = False
+        return super().get_bind(mapper, clause=clause, **kw)
+
     def delete(self, instance: Any, soft: bool = False) -> None:
         if soft and hasattr(instance, 'deleted'):
-            instance.deleted = True
             self.add(instance)
             if hasattr(instance, 'cascade_soft_delete'):
+                # also soft deletes the related rows, in bulk
                 instance.cascade_soft_delete()
+            else:
+                instance.deleted = True
         else:
             super().delete(instance)
@@ -0,0 +1,137 @@
+""" Limits how long the statements of a request may run, so a runaway query
+can't tie up a connection indefinitely.
+
+The timeouts are set with ``SET LOCAL`` at the start of each transaction,
+which also works behind PgBouncer in transaction pooling mode. They are
+configured in milliseconds, 0 disables a timeout::
+
+    db.statement_timeout = 30000
+    db.idle_in_transaction_session_timeout = 60000
+
+    # routes with their own budget
+    db.statement_timeout.search = 10000
+    db.idle_in_transaction_session_timeout.export_meeting_as_pdf_view = 0
+
+"""
+from __future__ import annotations
+from sqlalchemy import event
+
+
+from typing import Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from pyramid.interfaces import IRequest
+    from sqlalchemy.engine import Connection
+    from sqlalchemy.orm import Session, SessionTransaction
+
+
+DEFAULT_STATEMENT_TIMEOUT = 30_000
+DEFAULT_IDLE_IN_TRANSACTION_TIMEOUT = 60_000
+
+# expensive routes, which get their own budget by default
+DEFAULT_ROUTE_STATEMENT_TIMEOUTS = {
+    'search': 10_000,
+    'activities': 15_000,
+    'export_meeting_as_pdf_view': 60_000,
+    'export_meeting_as_docx_view': 60_000,
+}
+
+# routes which keep their transaction open while doing other work, the
+# exports render the report (WeasyPrint for PDF) after loading the meeting
+DEFAULT_ROUTE_IDLE_IN_TRANSACTION_TIMEOUTS = {
+    'export_meeting_as_pdf_view': 600_000,
+    'export_meeting_as_docx_view': 600_000,
+}
+
+
+class StatementTimeouts:
+
+    def __init__(
+        self,
+        statement_timeout: int = DEFAULT_STATEMENT_TIMEOUT,
+        idle_in_transaction_timeout: int = DEFAULT_IDLE_IN_TRANSACTION_TIMEOUT,
+        routes: dict[str, int] | None = None,
+        idle_routes: dict[str, int] | None = None,
+    ) -> None:
+        self.statement_timeout = statement_timeout
+        self.idle_in_transaction_timeout = idle_in_transaction_timeout
+        self.routes = (
+            DEFAULT_ROUTE_STATEMENT_TIMEOUTS.copy()
+            if routes is None else routes
+        )
+        self.idle_routes = (
+            DEFAULT_ROUTE_IDLE_IN_TRANSACTION_TIMEOUTS.copy()
+            if idle_routes is None else idle_routes
+        )
+
+    @classmethod
+    def from_settings(cls, settings: dict[str, Any]) -> StatementTimeouts:
+        def route_timeouts(
+            prefix: str,
+            defaults: dict[str, int]
+        ) -> dict[str, int]:
+            routes = defaults.copy()
+            routes.update(
+                (key[len(prefix):], int(value))
+                for key, value in settings.items()
+                if key.startswith(prefix)
+            )
+            return routes
+
+        return cls(
+            statement_timeout=int(settings.get(
+                'db.statement_timeout',
+                DEFAULT_STATEMENT_TIMEOUT
+            )),
+            idle_in_transaction_timeout=int(settings.get(
+                'db.idle_in_transaction_session_timeout',
+                DEFAULT_IDLE_IN_TRANSACTION_TIMEOUT
+            )),
+            routes=route_timeouts(
+                'db.statement_timeout.',
+                DEFAULT_ROUTE_STATEMENT_TIMEOUTS
+            ),
+            idle_routes=route_timeouts(
+                'db.idle_in_transaction_session_timeout.',
+                DEFAULT_ROUTE_IDLE_IN_TRANSACTION_TIMEOUTS
+            ),
+        )
+
+    def for_route(self, route_name: str | None) -> tuple[int, int]:
+        """ Returns the statement and idle in transaction timeouts. """
+        statement_timeout = self.routes.get(
+            route_name or '',
+            self.statement_timeout
+        )
+        idle_in_transaction_timeout = self.idle_routes.get(
+            route_name or '',
+            self.idle_in_transaction_timeout
+        )
+        return statement_timeout, idle_in_transaction_timeout
+
+    def for_request(self, request: IRequest) -> tuple[int, int]:
+        route = request.matched_route
+        return self.for_route(route.name if route is not None else None)
+
+
+def apply_timeouts(
+    session: Session,
+    statement_timeout: int,
+    idle_in_transaction_timeout: int
+) -> None:
+    """ Sets the timeouts for each transaction the session begins. """
+
+    statements = (
+        # the values are integers, so they can't be used for injections
+        f'SET LOCAL statement_timeout = {int(statement_timeout)}',
+        'SET LOCAL idle_in_transaction_session_timeout = '
+        f'{int(idle_in_transaction_timeout)}',
+    )
+
+    @event.listens_for(session, 'after_begin')
+    def set_timeouts(
+        session: Session,
+        transaction: SessionTransaction,
+        connection: Connection
+    ) -> None:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
@@ -19,6 +19,7 @@ import os
 import random
 from base64 import b64encode
 from enum import Enum, IntEnum
+from functools import lru_cache
 from io import BytesIO
 from typing import TypeAlias
 
@@ -26,6 +27,7 @@ from PIL import Image, ImageDraw, ImageFont
 
 
 __all__ = (
+    "AvatarRenderer",
     "FontExtensionNotSupportedError",
     "FontpathError",
     "ImageExtensionNotSupportedError",
@@ -93,9 +95,94 @@ _DEFAULT_FONT_FILEPATH = os.path.join(
 
 _HexColor: TypeAlias = str
 _RGBColor: TypeAlias = tuple[int, int, int]
+_Layout: TypeAlias = tuple[
+    ImageFont.FreeTypeFont, list[tuple[float, str]], float
+]
+
+
+@lru_cache(maxsize=32)
+def load_font(fontpath: str, size: int) -> ImageFont.FreeTypeFont:
+    """Load a font only once per path and size, parsing it is expensive."""
+    return ImageFont.truetype(fontpath, size=size)
+
+
+def _layout_text(
+    text: str, size: int, fontpath: str, char_spacing: int
+) -> _Layout:
+    """Return the font, the x offset of each character and the y offset
+    of the text, centered on a square of the given size."""
+    # Slightly reduced to accommodate spacing
+    font = load_font(fontpath, int(0.9 * size / max(len(text), 1)))
+    widths = [font.getlength(char) for char in text]
+    total_width = sum(widths) + char_spacing * (len(text) - 1)
+    total_height = max(
+        (bottom - top for _, top, _, bottom in map(font.getbbox, text)),
+        default=0,
+    )
+
+    x = (size - total_width) / 2
+    y = (size - total_height) / 2 - size * 0.1
+    positions = []
+    for char, width in zip(text, widths):
+        positions.append((x, char))
+        x += width + char_spacing
+    return font, positions, y
+
+
+class _AvatarOptions:
+    """Validated options shared by :class:`PyAvatar` and
+    :class:`AvatarRenderer`."""
 
+    @property
+    def char_spacing(self) -> int:
+        return self._char_spacing
+
+    @char_spacing.setter
+    def char_spacing(self, value: int) -> None:
+        if not isinstance(value, int):
+            raise TypeError("Attribute `char_spacing` must be an integer.")
+        if value < 0:
+            raise ValueError("Character spacing must be non-negative.")
+        self._char_spacing = value
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @size.setter
+    def size(self, value: int) -> None:
+        if not isinstance(value, int):
+            raise TypeError("Attribute `size` must be an integer.")
+        if value < SupportedPixelRange.MIN or value > SupportedPixelRange.MAX:
+            raise RenderingSizeError(
+                str(value),
+                (
+                    "Size must fit within range "
+                    f"min={SupportedPixelRange.MIN} "
+                    f"max={SupportedPixelRange.MAX}."
+                ),
+            )
+        self._size = value
+
+    @property
+    def fontpath(self) -> str:
+        return self._fontpath
 
-class PyAvatar:
+    @fontpath.setter
+    def fontpath(self, value: str) -> None:
+        if not isinstance(value, str):
+            raise TypeError("Attribute `fontpath` must be a string.")
+        if not os.path.exists(value):
+            raise FontpathError(value)
+        if not value.lower().endswith(tuple(SupportedFontExt)):
+            raise FontExtensionNotSupportedError(
+                os.path.basename(value),
+                info=f"Supported extensions: {csv(SupportedFontExt)}.",
+            )
+        self._fontpath = value
+
+
+class PyAvatar(_AvatarOptions):
     """Generate a default avatar from a given string input.
 
     :param text: Input text to use in the avatar.
@@ -155,54 +242,6 @@ class PyAvatar:
             raise ValueError("Text must be 3 characters or less.")
         self._text = value[:3]  # Limit to the first three characters
 
-    @property
-    def char_spacing(self) -> int:
-        return self._char_spacing
-
-    @char_spacing.setter
-    def char_spacing(self, value: int) -> None:
-        if not isinstance(value, int):
-            raise TypeError("Attribute `char_spacing` must be an integer.")
-        if value < 0:
-            raise ValueError("Character spacing must be non-negative.")
-        self._char_spacing = value
-
-    @property
-    def size(self) -> int:
-        return self._size
-
-    @size.setter
-    def size(self, value: int) -> None:
-        if not isinstance(value, int):
-            raise TypeError("Attribute `size` must be an integer.")
-        if value < SupportedPixelRange.MIN or value > SupportedPixelRange.MAX:
-            raise RenderingSizeError(
-                str(value),
-                (
-                    "Size must fit within range "
-                    f"min={SupportedPixelRange.MIN} "
-                    f"max={SupportedPixelRange.MAX}."
-                ),
-            )
-        self._size = value
-
-    @property
-    def fontpath(self) -> str:
-        return self._fontpath
-
-    @fontpath.setter
-    def fontpath(self, value: str) -> None:
-        if not isinstance(value, str):
-            raise TypeError("Attribute `fontpath` must be a string.")
-        if not os.path.exists(value):
-            raise FontpathError(value)
-        if not value.lower().endswith(tuple(SupportedFontExt)):
-            raise FontExtensionNotSupportedError(
-                os.path.basename(value),
-                info=f"Supported extensions: {csv(SupportedFontExt)}.",
-            )
-        self._fontpath = value
-
     @staticmethod
     def _random_color() -> _RGBColor:
         return (
@@ -215,30 +254,12 @@ class PyAvatar:
         image = Image.new(
             mode="RGB", size=(self.size, self.size), color=self.color
         )
-        font_size = int(
-            0.9 * self.size / len(self.text)
-        )  # Slightly reduced to accommodate spacing
-        font = ImageFont.truetype(self.fontpath, size=font_size)
-        draw = ImageDraw.Draw(image)
-
-        # Calculate total width including spacing
-        total_width = sum(
-            draw.textlength(char, font) for char in self.text
-        ) + self.char_spacing * (len(self.text) - 1)
-        total_height = max(
-            font.getbbox(char)[3] - font.getbbox(char)[1] for char in self.text
+        font, positions, y = _layout_text(
+            self.text, self.size, self.fontpath, self.char_spacing
         )
-
-        # Calculate starting position
-        start_x = (self.size - total_width) / 2
-        start_y = (self.size - total_height) / 2 - self.size * 0.1
-
-        # Draw each character with spacing
-        for char in self.text:
-            char_width = draw.textlength(char, font)
-            draw.text((start_x, start_y), char, font=font, fill='white')
-            start_x += char_width + self.char_spacing
-
+        draw = ImageDraw.Draw(image)
+        for x, char in positions:
+            draw.text((x, y), char, font=font, fill="white")
         return image
 
     def change_color(self, color: _HexColor | _RGBColor | None = None) -> None:
@@ -292,3 +313,85 @@ class PyAvatar:
         """
         encoded_image = b64encode(self.stream(filetype)).decode("utf-8")
         return f"data:image/{filetype.value};base64,{encoded_image}"
+
+
+class AvatarRenderer(_AvatarOptions):
+    """Render avatars as PNG, reusing work between avatars.
+
+    Unlike :class:`PyAvatar`, a renderer keeps no per-avatar state. It is
+    meant to be created once and used for any number of avatars. Fonts
+    are loaded once, and both the layout of each text and the PNG of each
+    text and color pair are kept in a bounded cache.
+
+    :param size: (optional) Integer, size in pixel of the avatars.
+    :param fontpath: (optional) Filepath to the font file to use.
+    :param char_spacing: (optional) Pixels between the characters.
+    :param capitalize: (optional) Boolean, capitalize the text.
+
+    Usage::
+      >>> from privatim.pyavatar import AvatarRenderer
+      >>> renderer = AvatarRenderer(size=250)
+      >>> renderer.render("JD", "#1abc9c")
+      b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\xfa ...'
+    """
+
+    def __init__(
+        self,
+        size: int = _DEFAULT_IMAGE_SIZE,
+        fontpath: str = _DEFAULT_FONT_FILEPATH,
+        char_spacing: int = 0,
+        capitalize: bool = True,
+        cache_size: int = 1024,
+    ):
+        self.size = size
+        self.fontpath = fontpath
+        self.char_spacing = char_spacing
+        self.capitalize = capitalize
+        self.cache_size = cache_size
+        self._layout = lru_cache(maxsize=cache_size)(self._compute_layout)
+        self._rendered: dict[tuple[str, _HexColor | _RGBColor], bytes] = {}
+
+    def _compute_layout(self, text: str) -> _Layout:
+        return _layout_text(text, self.size, self.fontpath, self.char_spacing)
+
+    def _encode(self, text: str, color: _HexColor | _RGBColor) -> bytes:
+        image = Image.new(mode="RGB", size=(self.size, self.size), color=color)
+        font, positions, y = self._layout(text)
+        draw = ImageDraw.Draw(image)
+        for x, char in positions:
+            draw.text((x, y), char, font=font, fill="white")
+
+        # `optimize=True` makes the encoding several times slower, but
+        # only saves a few percent on images this simple
+        stream = BytesIO()
+        image.save(stream, format=SupportedImageFmt.PNG.value)
+        return stream.getvalue()
+
+    def _text(self, text: str) -> str:
+        if not isinstance(text, str):
+            raise TypeError("Attribute `text` must be a string.")
+        if len(text) > 3:
+            raise ValueError("Text must be 3 characters or less.")
+        return text.upper() if self.capitalize else text
+
+    def _cache(
+        self, key: tuple[str, _HexColor | _RGBColor], content: bytes
+    ) -> bytes:
+        if len(self._rendered) >= self.cache_size:
+            # evict the oldest entry
+            del self._rendered[next(iter(self._rendered))]
+        self._rendered[key] = content
+        return content
+
+    def render(self, text: str, color: _HexColor | _RGBColor) -> bytes:
+        """Render a single avatar as PNG.
+
+        :param text: Input text to use in the avatar, 3 characters or less.
+        :param color: hex or rgb color code for the background.
+        :rtype: bytes
+        """
+        key = (self._text(text), color)
+        content = self._rendered.get(key)
+        if content is None:
+            content = self._cache(key, self._encode(*key))
+        return content
@@ -6,6 +6,7 @@ from pathlib import Path
 from babel.dates import format_datetime
 from privatim.i18n import translate, _
 from privatim.layouts.layout import DEFAULT_TIMEZONE
+from privatim.metrics import REPORT_RENDER_DURATION
 from privatim.models.association_tables import AttendanceStatus
 from privatim.utils import datetime_format
 from pyramid.renderers import render
@@ -97,7 +98,11 @@ class MeetingReport:
     def build(self) -> PDFDocument:
         """Render report using the provided renderer."""
 
-        pdf = self.renderer.render(self.meeting, self.created_at, self.request)
+        extension = getattr(self.renderer, 'extension', 'pdf')
+        with REPORT_RENDER_DURATION.labels(format=extension).time():
+            pdf = self.renderer.render(
+                self.meeting, self.created_at, self.request
+            )
 
         return PDFDocument(pdf, self.filename)
 
@@ -6,7 +6,15 @@ from .uuid_factory import (
 )
 from privatim.models import AgendaItem, GeneralFile, Comment
 from privatim.models import WorkingGroup, Consultation, User, Meeting
-from privatim.models.file import SearchableFile
+from privatim.models.association_tables import MeetingUserAttendance
+from privatim.models.file import (
+    IMAGE_VARIANT_SIZES,
+    ImageVariant,
+    SearchableFile,
+)
+from pyramid.httpexceptions import HTTPNotFound
+from sqlalchemy.orm import joinedload, selectinload
+from uuid import UUID
 
 
 from typing import TYPE_CHECKING
@@ -20,6 +28,19 @@ _working_group_factory = create_uuid_factory(WorkingGroup)
 _consultation_factory = create_uuid_factory(Consultation)
 _person_factory = create_uuid_factory(User)
 _meeting_factory = create_uuid_factory(Meeting)
+# Loads everything rendered by `meeting_view` with a fixed number of
+# statements, regardless of the number of agenda items, attendees and files.
+_meeting_page_factory = create_uuid_factory(Meeting, options=(
+    selectinload(Meeting.agenda_items),
+    selectinload(Meeting.attendance_records).joinedload(
+        MeetingUserAttendance.user
+    ),
+    selectinload(Meeting.files).load_only(
+        SearchableFile.id,
+        SearchableFile.filename,
+        SearchableFile.file,
+    ),
+))
 _agenda_item_factory = create_uuid_factory(AgendaItem)
 _comment_factory = create_uuid_factory(Comment)
 _all_consultations_factory = create_consultation_all_versions_factory()
@@ -49,8 +70,7 @@ def agenda_item_factory(request: IRequest) -> AgendaItem:
 
 
 def default_meeting_factory(request: IRequest) -> Meeting:
-    factory = create_uuid_factory(Meeting)
-    return factory(request)
+    return _meeting_page_factory(request)
 
 
 def person_factory(request: IRequest) -> User | Root:
@@ -79,6 +99,28 @@ def file_factory(request: IRequest) -> AbstractFile | None:
     return searchable_file
 
 
+def image_variant_factory(request: IRequest) -> ImageVariant | AbstractFile:
+    """ Returns the scaled down variant of an image, or the original file
+    if there is none (it isn't an image or predates the variants). """
+    file_id = request.matchdict['id']
+    size = int(request.matchdict['size'])
+    if size not in IMAGE_VARIANT_SIZES:
+        raise HTTPNotFound()
+    try:
+        UUID(file_id)
+    except ValueError:
+        raise HTTPNotFound() from None
+
+    variant = request.dbsession.get(ImageVariant, (file_id, size))
+    if variant is not None:
+        return variant
+
+    original = file_factory(request)
+    if original is None:
+        raise HTTPNotFound()
+    return original
+
+
 def general_file_factory(request: IRequest) -> GeneralFile:
     factory = create_uuid_factory(GeneralFile)
     return factory(request)
@@ -9,8 +9,9 @@ from typing import TYPE_CHECKING
 
 from privatim.orm.session import FilteredSession
 if TYPE_CHECKING:
-    from collections.abc import Callable
+    from collections.abc import Callable, Sequence
     from pyramid.interfaces import IRequest
+    from sqlalchemy.orm.interfaces import ORMOption
 
     from privatim.orm import Base
 
@@ -19,8 +20,13 @@ _M = TypeVar('_M', bound='Base')
 
 def create_uuid_factory(
         cls: type[_M],
-        key: str = 'id'
+        key: str = 'id',
+        options: Sequence[ORMOption] = ()
 ) -> Callable[[IRequest], _M]:
+    """ Creates a route factory which loads an instance of ``cls`` by the
+    uuid in the matchdict. ``options`` are passed on to ``session.get``, so
+    a page can eagerly load everything it renders with the same query. """
+
     def route_factory(request: IRequest) -> _M:
 
         session = request.dbsession
@@ -35,7 +41,7 @@ def create_uuid_factory(
         except ValueError:
             raise HTTPNotFound() from None
 
-        result = session.get(cls, uuid)
+        result = session.get(cls, uuid, options=options)
         if not result:
             raise HTTPNotFound()
         return result
@@ -1,12 +1,17 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import NamedTuple, TYPE_CHECKING
 
+from sqlalchemy import select
 from sqlalchemy.orm import object_session
 
+from privatim.cache import ProcessCache
 from privatim.models import User
 
 if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from datetime import datetime
     from pyramid.interfaces import IRequest
+    from sqlalchemy.orm import Session
 
 
 def query_user(user_id: str, request: IRequest) -> User | None:
@@ -27,3 +32,90 @@ def query_user(user_id: str, request: IRequest) -> User | None:
 def authenticated_user(request: IRequest) -> User | None:
     user_id = request.authenticated_userid
     return query_user(user_id, request)
+
+
+class Identity(NamedTuple):
+    """ The parts of a user needed on most requests, without the need to
+    load the whole row. """
+
+    id: str
+    fullname: str
+    abbrev: str
+    profile_pic_id: str | None
+    locale: str | None
+
+
+def password_epoch(last_password_change: datetime | None) -> float | None:
+    """ The time of the last password change (unix timestamp), sessions
+    remember it on login and become invalid once it changes. """
+    if last_password_change is None:
+        return None
+    return last_password_change.timestamp()
+
+
+def load_password_epoch(
+    session: Session,
+    user_id: str
+) -> tuple[bool, float | None]:
+    """ Returns whether the user exists and their `password_epoch`.
+
+    This is read from the database on every request, so a deleted user or
+    a password change logs out the sessions in all processes at once.
+
+    """
+    row = session.execute(
+        select(User.last_password_change).where(User.id == user_id)
+    ).one_or_none()
+    if row is None:
+        return False, None
+    return True, password_epoch(row.last_password_change)
+
+
+def load_identity(session: Session, user_id: str) -> Identity | None:
+    row = session.execute(
+        select(
+            User.id,
+            User.email,
+            User.first_name,
+            User.last_name,
+            User.abbrev,
+            User.profile_pic_id,
+            User.locale,
+        ).where(User.id == user_id)
+    ).one_or_none()
+    if row is None:
+        return None
+
+    name = ' '.join(p for p in (row.first_name, row.last_name) if p)
+    pic_id = row.profile_pic_id
+    return Identity(
+        id=str(row.id),
+        fullname=f'{name} ({row.abbrev})' if name else row.email,
+        abbrev=row.abbrev,
+        profile_pic_id=str(pic_id) if pic_id else None,
+        locale=row.locale,
+    )
+
+
+# the snapshots may be stale, so they are not used to authenticate users,
+# see `SessionSecurityPolicy.authenticated_userid`
+identity_cache: ProcessCache[str, Identity | None] = ProcessCache()
+
+
+def get_identity(session: Session, user_id: str) -> Identity | None:
+    identity = identity_cache.get(
+        user_id, lambda: load_identity(session, user_id)
+    )
+    if identity is None:
+        identity_cache.invalidate(user_id)
+    return identity
+
+
+@identity_cache.invalidated_by
+def changed_users(session: Session) -> Iterator[str]:
+    for obj in session.dirty:
+        if isinstance(obj, User) and session.is_modified(obj):
+            yield str(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            yield str(obj.id)
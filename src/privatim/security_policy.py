@@ -12,14 +12,15 @@ from pyramid.util import is_nonstr_iter
 from zope.interface import implementer
 
 from privatim.cache import request_cache
-from privatim.security import query_user
+from privatim.security import get_identity
+from privatim.security import load_password_epoch
 
 if TYPE_CHECKING:
     from pyramid.interfaces import IRequest
     from pyramid.security import ACLPermitsResult
     from typing import TypeAlias
 
-    from privatim.models import User
+    from privatim.security import Identity
 
     from privatim.types import ACL
 
@@ -36,6 +37,7 @@ class SessionSecurityPolicy:
     timeout:     int | None
     userid_key:  str
     timeout_key: str
+    epoch_key:   str
 
     def __init__(
         self,
@@ -45,6 +47,7 @@ class SessionSecurityPolicy:
 
         self.userid_key = f'{prefix}userid'
         self.timeout_key = f'{prefix}timeout'
+        self.epoch_key = f'{prefix}epoch'
         if timeout:
             timeout = int(timeout)
         self.timeout = timeout
@@ -77,7 +80,30 @@ class SessionSecurityPolicy:
             if (datetime.now() - last_accessed).total_seconds() > timeout:
                 self.forget(request)
                 return None
-        return request.session.get(self.userid_key)
+
+        userid = request.session.get(self.userid_key)
+        if userid and not self.verified(request, userid):
+            self.forget(request)
+            return None
+        return userid
+
+    def verified(self, request: IRequest, userid: str) -> bool:
+        """ Whether the user still exists and hasn't changed the password
+        since the login. This is checked against the database once per
+        request, unlike the cached `identity`. """
+        if getattr(request, '_verified_userid', None) == userid:
+            return True
+
+        exists, epoch = load_password_epoch(request.dbsession, userid)
+        if not exists:
+            return False
+        if (
+            self.epoch_key in request.session
+            and epoch != request.session[self.epoch_key]
+        ):
+            return False
+        request._verified_userid = userid
+        return True
 
     def remember(
         self,
@@ -91,21 +117,30 @@ class SessionSecurityPolicy:
         if timeout:
             request.session[self.timeout_key] = int(timeout)
         request.session[self.userid_key] = userid
+        exists, epoch = load_password_epoch(request.dbsession, userid)
+        if exists:
+            request.session[self.epoch_key] = epoch
+            request._verified_userid = userid
         return []
 
     def forget(self, request: IRequest, **kwargs: Any) -> list[HTTPHeader]:
         self.reissue(request)
+        request._verified_userid = None
         if self.timeout_key in request.session:
             del request.session[self.timeout_key]
         if self.userid_key in request.session:
             del request.session[self.userid_key]
+        if self.epoch_key in request.session:
+            del request.session[self.epoch_key]
         return []
 
-    def identity(self, request: IRequest) -> User | None:
+    def identity(self, request: IRequest) -> Identity | None:
+        """ Returns a cached snapshot of the user, use `request.user` to
+        get the actual `User`. """
         user_id = self.authenticated_userid(request)
         if user_id is None:
             return None
-        return query_user(user_id, request)
+        return get_identity(request.dbsession, user_id)
 
     def permits(
         self,
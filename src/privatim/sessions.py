@@ -0,0 +1,333 @@
+""" A server-side session backend, which keeps the session data in the
+`http_sessions` table.
+
+Enable it with ``session.type = postgresql``, all other session types are
+handled by beaker. Unlike beaker's file sessions, a session is only
+written when its data changed. Requests which merely access the session
+update its access time at most once every ``session.touch_interval``
+seconds (60 by default).
+
+Values stored in the session need to be JSON serializable.
+
+"""
+from __future__ import annotations
+import binascii
+import hashlib
+import os
+import secrets
+import time
+from pyramid.interfaces import ISession
+from pyramid.settings import asbool
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from zope.interface import implementer
+
+from privatim.models.http_session import HTTPSession
+
+
+from typing import Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pyramid.interfaces import IRequest
+    from pyramid.response import Response
+    from sqlalchemy import Engine
+
+
+def hash_session_id(session_id: str) -> str:
+    return hashlib.sha256(session_id.encode('ascii')).hexdigest()
+
+
+class PostgresSessionStore:
+    """ Loads and stores sessions, each call runs in its own short
+    transaction, independent of the transaction of the request. """
+
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+
+    def load(self, session_id: str) -> HTTPSession | None:
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(
+                    HTTPSession.data,
+                    HTTPSession.created,
+                    HTTPSession.accessed,
+                ).where(HTTPSession.id == hash_session_id(session_id))
+            ).one_or_none()
+        if row is None:
+            return None
+        return HTTPSession(
+            data=row.data,
+            created=row.created,
+            accessed=row.accessed
+        )
+
+    def save(
+        self,
+        session_id: str,
+        data: dict[str, Any],
+        created: float,
+        accessed: float,
+    ) -> None:
+        stmt = insert(HTTPSession).values(
+            id=hash_session_id(session_id),
+            data=data,
+            created=created,
+            accessed=accessed,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[HTTPSession.id],
+            set_={
+                'data': stmt.excluded.data,
+                'accessed': stmt.excluded.accessed,
+            }
+        )
+        with self.engine.begin() as connection:
+            connection.execute(stmt)
+
+    def touch(self, session_id: str, accessed: float) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(HTTPSession)
+                .where(HTTPSession.id == hash_session_id(session_id))
+                .values(accessed=accessed)
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(
+                delete(HTTPSession)
+                .where(HTTPSession.id == hash_session_id(session_id))
+            )
+
+    def purge(self, accessed_before: float, batch_size: int = 5000) -> int:
+        """ Deletes the sessions not accessed since the given time, in
+        batches so no single transaction holds on to too many locks. """
+        total = 0
+        while True:
+            batch = (
+                select(HTTPSession.id)
+                .where(HTTPSession.accessed < accessed_before)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            with self.engine.begin() as connection:
+                deleted = len(connection.execute(
+                    delete(HTTPSession)
+                    .where(HTTPSession.id.in_(batch))
+                    .returning(HTTPSession.id)
+                ).all())
+            total += deleted
+            if deleted < batch_size:
+                return total
+
+
+def manage_changed(
+    method: Callable[..., Any]
+) -> Callable[..., Any]:
+
+    def changed(session: ServerSideSession, *args: Any, **kw: Any) -> Any:
+        session.changed()
+        return method(session, *args, **kw)
+    return changed
+
+
+@implementer(ISession)
+class ServerSideSession(dict[str, Any]):
+    """ A session whose data is kept in a `PostgresSessionStore`.
+
+    Only the session id is sent to the browser. The session is written
+    at the end of the request, if it has been changed. Otherwise only its
+    access time is updated, once `touch_interval` seconds have passed.
+
+    """
+
+    store: PostgresSessionStore
+    cookie_name: str = 'privatim'
+    cookie_max_age: int | None = None
+    cookie_secure: bool = False
+    cookie_httponly: bool = True
+    cookie_on_exception: bool = True
+    timeout: int | None = None
+    touch_interval: int = 60
+
+    def __init__(self, request: IRequest) -> None:  # type:ignore[override]
+        self.request = request
+        self.load(request.cookies.get(self.cookie_name))
+        request.add_response_callback(self.persist)
+
+    def load(self, session_id: str | None) -> None:
+        self.dirty = False
+        self.saved = False
+        self.invalidated = False
+        self.now = time.time()
+
+        stored = self.store.load(session_id) if session_id else None
+        if stored is not None and self.timeout is not None:
+            if self.now - stored.accessed > self.timeout:
+                stored = None
+
+        if stored is None:
+            self.id = secrets.token_urlsafe(32)
+            self.new = True
+            self.created = self.accessed = self.now
+            data = {}
+        else:
+            assert session_id is not None
+            self.id = session_id
+            self.new = False
+            self.created = stored.created
+            self.accessed = stored.accessed
+            data = stored.data
+
+        super().clear()
+        super().update(data)
+
+    @property
+    def last_accessed(self) -> float | None:
+        """ The time of the previous access (beaker compatible). """
+        return None if self.new else self.accessed
+
+    def changed(self) -> None:
+        self.dirty = True
+
+    def invalidate(self) -> None:
+        if not self.new:
+            self.store.delete(self.id)
+            self.invalidated = True
+        super().clear()
+        self.id = secrets.token_urlsafe(32)
+        self.new = True
+        self.dirty = False
+        self.saved = False
+
+    def regenerate_id(self) -> None:
+        """ Moves the data to a new id, e.g. to prevent session fixation
+        on login. """
+        if not self.new:
+            self.store.delete(self.id)
+        self.id = secrets.token_urlsafe(32)
+        self.new = True
+        self.dirty = True
+
+    def get_by_id(self, id: str | None) -> ServerSideSession | None:
+        """ Loads another session, which is not persisted automatically,
+        call `save` to store changes to it. """
+        session = type(self).__new__(type(self))
+        session.request = self.request
+        session.load(id)
+        return None if session.new else session
+
+    def save(self) -> None:
+        """ Stores the session right away, instead of at the end of the
+        request. """
+        self.store.save(self.id, dict(self), self.created, self.now)
+        self.accessed = self.now
+        self.dirty = False
+        self.saved = True
+
+    # modifying dictionary methods
+    clear = manage_changed(dict.clear)
+    update = manage_changed(dict.update)
+    setdefault = manage_changed(dict.setdefault)
+    popitem = manage_changed(dict.popitem)
+    __setitem__ = manage_changed(dict.__setitem__)
+    __delitem__ = manage_changed(dict.__delitem__)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        # popping a missing key doesn't change anything
+        if key in self:
+            self.changed()
+        return dict.pop(self, key, *default)
+
+    # flash API methods
+    def flash(
+        self,
+        msg: Any,
+        queue: str = '',
+        allow_duplicate: bool = True
+    ) -> None:
+        storage = self.setdefault('_f_' + queue, [])
+        if allow_duplicate or (msg not in storage):
+            storage.append(msg)
+
+    def pop_flash(self, queue: str = '') -> list[Any]:
+        return self.pop('_f_' + queue, [])
+
+    def peek_flash(self, queue: str = '') -> list[Any]:
+        return self.get('_f_' + queue, [])
+
+    # CSRF API methods
+    def new_csrf_token(self) -> str:
+        token = binascii.hexlify(os.urandom(20)).decode('ascii')
+        self['_csrft_'] = token
+        return token
+
+    def get_csrf_token(self) -> str:
+        token = self.get('_csrft_', None)
+        if token is None:
+            token = self.new_csrf_token()
+        return token
+
+    def persist(self, request: IRequest, response: Response) -> None:
+        exception = getattr(request, 'exception', None)
+        if exception is not None and not self.cookie_on_exception:
+            return
+
+        if self.dirty:
+            # a new session without data isn't worth storing
+            if self or not self.new:
+                self.save()
+        elif (
+            not self.new
+            and not self.saved
+            and self.now - self.accessed >= self.touch_interval
+        ):
+            self.store.touch(self.id, self.now)
+            self.saved = True
+
+        if not self.saved:
+            if self.invalidated:
+                response.delete_cookie(self.cookie_name)
+            return
+
+        response.set_cookie(
+            self.cookie_name,
+            value=self.id,
+            max_age=self.cookie_max_age,
+            path='/',
+            secure=self.cookie_secure,
+            httponly=self.cookie_httponly,
+            samesite='Lax',
+        )
+
+
+def session_factory_from_settings(
+    settings: dict[str, Any],
+    engine: Engine,
+) -> type[ServerSideSession]:
+    """ Creates a session factory using the beaker style settings with the
+    ``session.`` prefix. """
+
+    def get(name: str, default: Any = None) -> Any:
+        value = settings.get(f'session.{name}')
+        return default if value in (None, '') else value
+
+    # beaker also allows 'true' and 'false' here
+    cookie_expires = get('cookie_expires', '')
+    store = PostgresSessionStore(engine)
+
+    class Session(ServerSideSession):
+        pass
+
+    Session.store = store
+    Session.cookie_name = get('key', ServerSideSession.cookie_name)
+    Session.cookie_max_age = (
+        int(cookie_expires) if str(cookie_expires).isdigit() else None
+    )
+    Session.cookie_secure = asbool(get('secure', False))
+    Session.cookie_httponly = asbool(get('httponly', True))
+    Session.cookie_on_exception = asbool(get('cookie_on_exception', True))
+    timeout = get('timeout')
+    Session.timeout = None if timeout is None else int(timeout)
+    Session.touch_interval = int(get('touch_interval', 60))
+    return Session
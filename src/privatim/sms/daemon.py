@@ -0,0 +1,222 @@
+""" A long running process, which sends the messages of the SMS queue as
+soon as they are queued::
+
+    sms_delivery_daemon --config development.ini --port 8081
+
+The queue directory is watched with inotify (or the equivalent of the
+platform). Messages queued at the same time are sent together, after a
+short delay. The queue is also checked periodically, so messages which
+failed because of a connection error or a 429/5xx response are retried.
+Messages the API rejected are kept as ``.rejected-*`` files and are not
+retried. After any other error, like a timed out API call, the messages
+might have been sent, they are only retried once their lock has expired.
+
+With ``--port``, ``/health`` and ``/metrics`` are served on localhost.
+
+"""
+from __future__ import annotations
+import argparse
+import os
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pyramid.paster import get_appsettings
+from pyramid.paster import setup_logging
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from privatim.metrics import SMS_QUEUE_DEPTH
+from privatim.metrics import generate_metrics
+from .delivery import add_delivery_arguments
+from .delivery import delivery_from_arguments
+from .logger import logger
+
+
+from typing import Any, TYPE_CHECKING
+if TYPE_CHECKING:
+    from watchdog.events import FileSystemEvent
+    from .delivery import QueuedSMSDelivery
+
+
+class SMSDeliveryDaemon(FileSystemEventHandler):
+
+    delivery: QueuedSMSDelivery
+    coalesce: float
+    poll_interval: float
+    # monotonic time of the last completed delivery
+    last_delivery: float | None
+
+    def __init__(
+            self,
+            delivery: QueuedSMSDelivery,
+            coalesce: float = 0.1,
+            poll_interval: float = 60.0
+    ):
+        self.delivery = delivery
+        self.coalesce = coalesce
+        self.poll_interval = poll_interval
+        self.last_delivery = None
+        self.delivering = False
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.observer = Observer()
+
+    def notify(self, path: str | bytes) -> None:
+        name = os.path.basename(os.fsdecode(path))
+        # the locks and rejected messages are hidden
+        if name.endswith('.json') and not name.startswith('.'):
+            self.wakeup.set()
+
+    def on_created(self, event: FileSystemEvent) -> None:
+        self.notify(event.src_path)
+
+    def on_moved(self, event: FileSystemEvent) -> None:
+        # SMSDataManager moves the finished messages into the queue
+        self.notify(event.dest_path)
+
+    def deliver(self) -> None:
+        # messages queued from now on need another delivery
+        self.wakeup.clear()
+        self.delivering = True
+        try:
+            self.delivery.send_messages()
+            SMS_QUEUE_DEPTH.set(len(self.delivery.queued_messages()))
+        except Exception:
+            logger.error('Error while delivering the SMS queue', exc_info=True)
+        finally:
+            self.delivering = False
+            self.last_delivery = time.monotonic()
+
+    def run(self) -> None:
+        """ Delivers the queue until `stop` is called. """
+        self.observer.schedule(self, self.delivery.path, recursive=False)
+        self.observer.start()
+        try:
+            while not self.stopping.is_set():
+                self.deliver()
+                self.wakeup.wait(self.poll_interval)
+                # let a burst of messages accumulate
+                self.stopping.wait(self.coalesce)
+        finally:
+            self.observer.stop()
+            self.observer.join()
+
+    def stop(self) -> None:
+        """ Stops after the current delivery has been completed. """
+        self.stopping.set()
+        self.wakeup.set()
+
+    def healthy(self) -> bool:
+        if not self.observer.is_alive() or self.last_delivery is None:
+            return False
+        if self.delivering:
+            return True
+        # the queue is delivered at least every poll interval
+        age = time.monotonic() - self.last_delivery
+        return age < self.poll_interval * 2 + self.coalesce
+
+
+def serve_status(
+        daemon: SMSDeliveryDaemon,
+        host: str,
+        port: int
+) -> ThreadingHTTPServer:
+    """ Serves ``/health`` and ``/metrics`` of the daemon in a thread. """
+
+    class StatusHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self) -> None:
+            if self.path == '/health':
+                healthy = daemon.healthy()
+                status = 200 if healthy else 503
+                body = b'OK' if healthy else b'UNHEALTHY'
+                content_type = 'text/plain'
+            elif self.path == '/metrics':
+                status = 200
+                body, content_type = generate_metrics()
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(
+        description='Delivers the queued sms as soon as they are queued'
+    )
+    add_delivery_arguments(parser)
+    parser.add_argument(
+        '--coalesce',
+        type=float,
+        default=0.1,
+        help='Seconds to wait for more messages, before sending them'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=60,
+        help='Seconds between checks of the queue without new messages'
+    )
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=None,
+        help='Serves /health and /metrics on this port'
+    )
+    parser.add_argument(
+        'smsdir',
+        nargs='?',
+        help='smsdir, defaults to sms.queue_path of the config'
+    )
+    args = parser.parse_args()
+
+    setup_logging(args.config)
+
+    smsdir = args.smsdir
+    if smsdir is None:
+        smsdir = get_appsettings(args.config).get('sms.queue_path')
+    if not smsdir:
+        parser.error('No smsdir given and sms.queue_path is not set')
+    os.makedirs(smsdir, exist_ok=True)
+
+    daemon = SMSDeliveryDaemon(
+        delivery_from_arguments(args, smsdir),
+        coalesce=args.coalesce,
+        poll_interval=args.poll_interval
+    )
+
+    def stop(signum: int, frame: Any) -> None:
+        logger.info('Stopping the SMS delivery')
+        daemon.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    server = None
+    if args.port is not None:
+        server = serve_status(daemon, args.host, args.port)
+
+    logger.info(f'Delivering the SMS queued in {smsdir}')
+    try:
+        daemon.run()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
@@ -6,20 +6,102 @@ import json
 import os
 import requests
 import stat
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from operator import itemgetter
 from pyramid.paster import setup_logging
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from privatim.metrics import SMS_MESSAGES
+from privatim.metrics import SMS_QUEUE_DEPTH
+from privatim.metrics import SMS_SEND_DURATION
 from .logger import logger
 
 
 from typing import cast
+from typing import NamedTuple
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
+    from collections.abc import Callable
     from privatim.types import JSONObject
 
 
 MAX_SEND_TIME = 60 * 60 * 3
+# the maximum number of recipients of a single API call
+MAX_RECIPIENTS = 100
+# connect and read timeout of the API calls
+TIMEOUT = (5, 30)
+# the responses after which the message may be sent again
+TRANSIENT_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+
+class SMSRejected(Exception):
+    """ The API did not accept the message, sending it again won't help.
+    """
+
+
+def is_transient(exception: Exception) -> bool:
+    """ Returns True if the message was not sent, because of an error
+    which might go away, so it may be sent again. """
+    if isinstance(exception, requests.HTTPError):
+        response = exception.response
+        return (
+            response is not None
+            and response.status_code in TRANSIENT_STATUS_CODES
+        )
+    # includes the timeouts while connecting, but not while reading
+    return isinstance(exception, requests.ConnectionError)
+
+
+class QueuedMessage(NamedTuple):
+    filename: str
+    recipients: list[str]
+    content: str
+    sender: str
+
+
+class TokenBucket:
+    """ Limits the rate of an operation to `rate` per second on average,
+    allowing bursts of up to `burst` operations.
+
+    Thread-safe, the callers of `acquire` wait until it's their turn.
+
+    """
+
+    def __init__(
+            self,
+            rate: float,
+            burst: int = 1,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep
+    ):
+        assert rate > 0
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # NOTE: The tokens may become negative, which reserves the
+            #       next tokens for this caller, so the callers don't
+            #       have to wait for each other within the lock.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+
+        if wait > 0:
+            self.sleep(wait)
 
 
 class QueuedSMSDelivery:
@@ -27,11 +109,37 @@ class QueuedSMSDelivery:
     path: str
     username: str
     password: str
+    workers: int
+    rate_limit: TokenBucket | None
+    group_window: float
+    session: requests.Session
 
-    def __init__(self, path: str, username: str, password: str):
+    def __init__(
+            self,
+            path: str,
+            username: str,
+            password: str,
+            workers: int = 4,
+            rate: float | None = None,
+            burst: int = 1,
+            group_window: float = 5.0
+    ):
         self.path = path
         self.username = username
         self.password = password
+        self.workers = workers
+        self.rate_limit = TokenBucket(rate, burst) if rate else None
+        self.group_window = group_window
+
+        # keep the connections to the API alive, connections which could
+        # not be established are retried, the messages are not resent
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=workers,
+            max_retries=Retry(total=2, read=0, status=0, other=0)
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
 
     def _send(
             self,
@@ -40,7 +148,10 @@ class QueuedSMSDelivery:
             sender: str = 'Privatim'
     ) -> None:
 
-        response = requests.post(  # nosec:B113
+        if self.rate_limit is not None:
+            self.rate_limit.acquire()
+
+        response = self.session.post(
             'https://json.aspsms.com/SendSimpleTextSMS',
             json={
                 'UserName': self.username,
@@ -48,13 +159,22 @@ class QueuedSMSDelivery:
                 'Originator': sender,
                 'Recipients': recipients,
                 'MessageText': content
-            }
+            },
+            timeout=TIMEOUT
         )
 
-        response.raise_for_status()
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as exception:
+            if is_transient(exception):
+                raise
+            raise SMSRejected(
+                f'Sending SMS failed, got: {response.status_code}'
+            ) from exception
+
         result = response.json()
         if result.get('StatusInfo') != 'OK' or result.get('StatusCode') != '1':
-            raise Exception(f'Sending SMS failed, got: "{result!s}"')
+            raise SMSRejected(f'Sending SMS failed, got: "{result!s}"')
 
     def _parseMessage(self, filename: str) -> JSONObject:
         with open(filename) as fd:
@@ -63,164 +183,403 @@ class QueuedSMSDelivery:
         assert isinstance(data, dict)
         return data
 
-    def send_messages(self) -> None:
-        # We expect to messages to in E.164 format, eg. '+41780000000'
-        messages = [
-            (m := os.path.join(self.path, x), os.path.getmtime(m))
-            for x in os.listdir(self.path)
-            if x.endswith('.json')
-        ]
+    def _queued_messages(self) -> list[tuple[str, float]]:
+        messages = []
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                # the locks and rejected messages are hidden
+                if entry.name.startswith('.'):
+                    continue
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    messages.append((entry.path, entry.stat().st_mtime))
+                except FileNotFoundError:
+                    # another worker has sent it in the meantime
+                    continue
 
         # Sort by modification time so earlier messages are sent before
         # later messages during queue processing.
         messages.sort(key=itemgetter(1))
-        for filename, _timestamp in messages:
-            self._send_message(filename)
+        return messages
+
+    def queued_messages(self) -> list[str]:
+        """ Returns the paths of the queued messages, oldest first. """
+        return [filename for filename, _timestamp in self._queued_messages()]
+
+    def send_messages(self) -> None:
+        # We expect to messages to in E.164 format, eg. '+41780000000'
+        messages = self._queued_messages()
+        SMS_QUEUE_DEPTH.set(len(messages))
+        batches = self._group_messages(messages)
+        if self.workers <= 1 or len(batches) <= 1:
+            for batch in batches:
+                self._send_batch(batch)
+            return
+
+        # each batch is locked before it is sent, so they can be sent by
+        # multiple threads at once
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # errors are logged by _send_batch
+            list(executor.map(self._send_batch, batches))
+
+    def _group_messages(
+            self,
+            messages: list[tuple[str, float]]
+    ) -> list[list[str]]:
+        """ Groups the given messages into batches.
+
+        Messages with the same sender and content, which have been queued
+        within `group_window` seconds of each other, are put in the same
+        batch, so they are sent with a single API call.
+
+        The messages are not locked yet, each batch is locked just before
+        it is sent, see `_send_batch`.
+
+        """
+        batches: list[list[str]] = []
+        # the time the open batch was started, its recipients and the batch
+        open_batches: dict[
+            tuple[str, str],
+            tuple[float, int, list[str]]
+        ] = {}
+        for filename, mtime in messages:
+            try:
+                data = self._parseMessage(filename)
+            except FileNotFoundError:
+                # another worker has sent it in the meantime
+                continue
+            except Exception:
+                # rejected once it is locked
+                data = {}
+
+            recipients = data.get('Recipients')
+            sender = data.get('Originator')
+            content = data.get('MessageText')
+            if not (
+                isinstance(recipients, list)
+                and isinstance(sender, str)
+                and isinstance(content, str)
+            ):
+                batches.append([filename])
+                continue
+
+            key = (sender, content)
+            started, count, batch = open_batches.get(key, (mtime, 0, []))
+            if (
+                not batch
+                or mtime - started > self.group_window
+                or count + len(recipients) > MAX_RECIPIENTS
+            ):
+                started, count, batch = mtime, 0, []
+                batches.append(batch)
+            batch.append(filename)
+            open_batches[key] = (
+                started, count + len(recipients), batch
+            )
+        return batches
 
     def _send_message(self, filename: str) -> None:
-        head, tail = os.path.split(filename)
-        tmp_filename = os.path.join(head, '.sending-' + tail)
-        rejected_filename = os.path.join(head, '.rejected-' + tail)
-        try:
-            # perform a series of operations in an attempt to ensure
-            # that no two threads/processes send this message
-            # simultaneously as well as attempting to not generate
-            # spurious failure messages in the log; a diagram that
-            # represents these operations is included in a
-            # comment above this class
+        self._send_batch([filename])
+
+    def _send_batch(self, filenames: list[str]) -> None:
+        """ Locks the messages, which share the sender and content, and
+        sends them to all their recipients at once. """
+
+        messages = []
+        for filename in filenames:
             try:
-                # find the age of the tmp file (if it exists)
-                mtime = os.stat(tmp_filename)[stat.ST_MTIME]
-            except OSError as e:
-                if e.errno == errno.ENOENT:
-                    # file does not exist
-                    # the tmp file could not be stated because it
-                    # doesn't exist, that's fine, keep going
-                    age = None
-                else:
-                    # the tmp file could not be stated for some reason
-                    # other than not existing; we'll report the error
-                    raise
-            else:
-                age = time.time() - mtime
+                if not self._lock_message(filename):
+                    continue
+                message = self._read_message(filename)
+            # Catch errors and log them here
+            except Exception:
+                SMS_MESSAGES.labels('failed').inc()
+                logger.error(
+                    f'Error while sending SMS {filename}', exc_info=True
+                )
+                continue
 
-            # if the tmp file exists, check it's age
-            if age is not None:
-                try:
-                    if age > MAX_SEND_TIME:
-                        # the tmp file is "too old"; this suggests
-                        # that during an attemt to send it, the
-                        # process died; remove the tmp file so we
-                        # can try again
-                        os.remove(tmp_filename)
-                    else:
-                        # the tmp file is "new", so someone else may
-                        # be sending this message, try again later
-                        return
-                    # if we get here, the file existed, but was too
-                    # old, so it was unlinked
-                except OSError as e:
-                    if e.errno == errno.ENOENT:
-                        # file does not exist
-                        # it looks like someone else removed the tmp
-                        # file, that's fine, we'll try to deliver the
-                        # message again later
-                        return
-
-            # now we know that the tmp file doesn't exist, we need to
-            # "touch" the message before we create the tmp file so the
-            # mtime will reflect the fact that the file is being
-            # processed (there is a race here, but it's OK for two or
-            # more processes to touch the file "simultaneously")
+            if message is not None:
+                messages.append(message)
+
+        if messages:
+            self._deliver(messages)
+
+    def _deliver(self, messages: list[QueuedMessage]) -> None:
+        """ Sends the locked messages with a single API call and removes
+        them once they have been sent. """
+
+        recipients = list(dict.fromkeys(
+            recipient
+            for message in messages
+            for recipient in message.recipients
+        ))
+        filenames = [message.filename for message in messages]
+        try:
+            with SMS_SEND_DURATION.time():
+                self._send(recipients, messages[0].content, messages[0].sender)
+
+        except SMSRejected:
+            if len(messages) > 1:
+                # a single invalid recipient fails the whole call, so the
+                # messages are sent on their own, which only fails the
+                # messages of the invalid recipients
+                logger.warning(
+                    f'Sending SMS {", ".join(filenames)} together failed, '
+                    'sending them one by one'
+                )
+                for message in messages:
+                    self._deliver([message])
+                return
+
+            message, = messages
+            SMS_MESSAGES.labels('rejected').inc()
+            logger.error(f'SMS {message.filename} was rejected', exc_info=True)
             try:
-                os.utime(filename, None)
-            except OSError as e:
-                if e.errno == errno.ENOENT:
-                    # file does not exist
-                    # someone removed the message before we could
-                    # touch it, no need to complain, we'll just keep
-                    # going
-                    return
-                else:
-                    # Some other error, propogate it
-                    raise
+                self._reject_message(message.filename)
+            except OSError:
+                logger.error(
+                    f'Error while rejecting SMS {message.filename}',
+                    exc_info=True
+                )
+            return
+
+        # Catch errors and log them here
+        except Exception as exception:
+            # after other errors, like a read timeout, the messages might
+            # have been sent, so they stay locked until MAX_SEND_TIME
+            self._failed(messages, unlock=is_transient(exception))
+            return
 
-            # creating this hard link will fail if another process is
-            # also sending this message
+        SMS_MESSAGES.labels('sent').inc(len(messages))
+        logger.info(f'SMS to {", ".join(recipients)} sent.')
+
+        # each message is acknowledged by itself, a message which could
+        # not be removed stays locked, so it isn't sent twice
+        for message in messages:
             try:
-                os.link(filename, tmp_filename)
-            except OSError as e:
-                if e.errno == errno.EEXIST:
-                    # file exists, *nix
-                    # it looks like someone else is sending this
-                    # message too; we'll try again later
-                    return
-                else:
-                    # Some other error, propogate it
-                    raise
-
-            # read message file and send contents
-            data = self._parseMessage(filename)
-            recipients = data.get('Recipients', [])
-            content = data.get('MessageText', '')
-            sender = data.get('Originator', '')
-            if (
-                recipients and content and sender and
-                # validate the types of payload, so an attacker
-                # can't insert arbitrary JSON data within these
-                # three keys
-                isinstance(recipients, list) and
-                all(isinstance(r, str) for r in recipients) and
-                isinstance(content, str) and isinstance(sender, str)
-            ):
-                sanitized_recipients = cast('list[str]', recipients)
-                self._send(sanitized_recipients, content, sender)
-            else:
-                sanitized_recipients = []
+                self._remove_message(message.filename)
+            except Exception:
                 logger.error(
-                    'Discarding SMS {} due to invalid content/number'.format(
-                        filename
-                    )
+                    f'Error while removing the sent SMS {message.filename}',
+                    exc_info=True
                 )
-                os.link(filename, rejected_filename)
 
+    def _failed(self, messages: list[QueuedMessage], unlock: bool) -> None:
+        """ Logs the messages which could not be sent. Unlocked messages
+        are retried by the next delivery. """
+
+        SMS_MESSAGES.labels('failed').inc(len(messages))
+        filenames = [message.filename for message in messages]
+        logger.error(
+            f'Error while sending SMS {", ".join(filenames)}',
+            exc_info=True
+        )
+        if not unlock:
+            return
+
+        for filename in filenames:
             try:
-                os.remove(filename)
-            except OSError as e:
-                if e.errno == errno.ENOENT:
-                    # file does not exist
-                    # someone else unlinked the file; oh well
-                    pass
-                else:
-                    # something bad happend, log it
-                    raise
+                self._unlock_message(filename)
+            except OSError:
+                logger.error(
+                    f'Error while unlocking SMS {filename}',
+                    exc_info=True
+                )
+
+    def _lock_message(self, filename: str) -> bool:
+        """ Returns True if we got the lock to send the message. """
+        head, tail = os.path.split(filename)
+        tmp_filename = os.path.join(head, '.sending-' + tail)
 
+        # perform a series of operations in an attempt to ensure
+        # that no two threads/processes send this message
+        # simultaneously as well as attempting to not generate
+        # spurious failure messages in the log; a diagram that
+        # represents these operations is included in a
+        # comment above this class
+        try:
+            # find the age of the tmp file (if it exists)
+            mtime = os.stat(tmp_filename)[stat.ST_MTIME]
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                # file does not exist
+                # the tmp file could not be stated because it
+                # doesn't exist, that's fine, keep going
+                age = None
+            else:
+                # the tmp file could not be stated for some reason
+                # other than not existing; we'll report the error
+                raise
+        else:
+            age = time.time() - mtime
+
+        # if the tmp file exists, check it's age
+        if age is not None:
             try:
-                os.remove(tmp_filename)
+                if age > MAX_SEND_TIME:
+                    # the tmp file is "too old"; this suggests
+                    # that during an attemt to send it, the
+                    # process died; remove the tmp file so we
+                    # can try again
+                    os.remove(tmp_filename)
+                else:
+                    # the tmp file is "new", so someone else may
+                    # be sending this message, try again later
+                    return False
+                # if we get here, the file existed, but was too
+                # old, so it was unlinked
             except OSError as e:
                 if e.errno == errno.ENOENT:
                     # file does not exist
-                    # someone else unlinked the file; oh well
-                    pass
-                else:
-                    # something bad happened, log it
-                    raise
+                    # it looks like someone else removed the tmp
+                    # file, that's fine, we'll try to deliver the
+                    # message again later
+                    return False
 
-            logger.info(f'SMS to {", ".join(sanitized_recipients)} sent.')
+        # now we know that the tmp file doesn't exist, we need to
+        # "touch" the message before we create the tmp file so the
+        # mtime will reflect the fact that the file is being
+        # processed (there is a race here, but it's OK for two or
+        # more processes to touch the file "simultaneously")
+        try:
+            os.utime(filename, None)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                # file does not exist
+                # someone removed the message before we could
+                # touch it, no need to complain, we'll just keep
+                # going
+                return False
+            else:
+                # Some other error, propogate it
+                raise
 
-        # Catch errors and log them here
-        except Exception:
-            logger.error(f'Error while sending SMS {filename}', exc_info=True)
+        # creating this hard link will fail if another process is
+        # also sending this message
+        try:
+            os.link(filename, tmp_filename)
+        except OSError as e:
+            if e.errno == errno.EEXIST:
+                # file exists, *nix
+                # it looks like someone else is sending this
+                # message too; we'll try again later
+                return False
+            else:
+                # Some other error, propogate it
+                raise
+        return True
 
+    def _read_message(self, filename: str) -> QueuedMessage | None:
+        """ Reads the locked message, invalid messages are rejected. """
 
-def main() -> None:
+        data = self._parseMessage(filename)
+        recipients = data.get('Recipients', [])
+        content = data.get('MessageText', '')
+        sender = data.get('Originator', '')
+        if (
+            recipients and content and sender and
+            # validate the types of payload, so an attacker
+            # can't insert arbitrary JSON data within these
+            # three keys
+            isinstance(recipients, list) and
+            all(isinstance(r, str) for r in recipients) and
+            isinstance(content, str) and isinstance(sender, str)
+        ):
+            return QueuedMessage(
+                filename,
+                cast('list[str]', recipients),
+                content,
+                sender
+            )
 
-    parser = argparse.ArgumentParser(description='Delivers queued sms')
-    parser.add_argument('--config', help='Config file')
-    parser.add_argument('smsdir', help='smsdir')
-    args = parser.parse_args()
+        SMS_MESSAGES.labels('rejected').inc()
+        logger.error(
+            'Discarding SMS {} due to invalid content/number'.format(
+                filename
+            )
+        )
+        self._reject_message(filename)
+        return None
+
+    def _reject_message(self, filename: str) -> None:
+        """ Keeps the message as rejected, so it isn't sent again. """
+        head, tail = os.path.split(filename)
+        os.link(filename, os.path.join(head, '.rejected-' + tail))
+        self._remove_message(filename)
+
+    def _remove_message(self, filename: str) -> None:
+        """ Removes the message and its lock. """
+        try:
+            os.remove(filename)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                # file does not exist
+                # someone else unlinked the file; oh well
+                pass
+            else:
+                # something bad happend, log it
+                raise
+
+        self._unlock_message(filename)
+
+    def _unlock_message(self, filename: str) -> None:
+        """ Removes the lock of the message. """
+        head, tail = os.path.split(filename)
+        tmp_filename = os.path.join(head, '.sending-' + tail)
+
+        try:
+            os.remove(tmp_filename)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                # file does not exist
+                # someone else unlinked the file; oh well
+                pass
+            else:
+                # something bad happened, log it
+                raise
 
-    setup_logging(args.config)
+
+def add_delivery_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--config', required=True, help='Config file')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Number of messages sent in parallel'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=None,
+        help='Maximum number of messages sent per second'
+    )
+    parser.add_argument(
+        '--burst',
+        type=int,
+        default=1,
+        help='Number of messages which may exceed the rate at once'
+    )
+    parser.add_argument(
+        '--group-window',
+        type=float,
+        default=5.0,
+        help='Messages with the same text queued within this many seconds '
+             'are sent with a single API call'
+    )
+
+
+def delivery_from_arguments(
+        args: argparse.Namespace,
+        smsdir: str
+) -> QueuedSMSDelivery:
+    """ Returns the delivery configured by `add_delivery_arguments`.
+
+    The credentials are read from the section of the config file, which
+    has a username.
+
+    """
 
     settings = {'username': '', 'password': ''}
     config = configparser.ConfigParser()
@@ -229,10 +588,26 @@ def main() -> None:
         if config.has_option(section_name, 'username'):
             settings.update(dict(config.items(section_name)))
 
+    return QueuedSMSDelivery(
+        smsdir,
+        settings['username'],
+        settings['password'],
+        workers=args.workers,
+        rate=args.rate,
+        burst=args.burst,
+        group_window=args.group_window,
+    )
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description='Delivers queued sms')
+    add_delivery_arguments(parser)
+    parser.add_argument('smsdir', help='smsdir')
+    args = parser.parse_args()
+
+    setup_logging(args.config)
+
     if os.path.exists(args.smsdir):
-        delivery = QueuedSMSDelivery(
-            args.smsdir,
-            settings['username'],
-            settings['password'],
-        )
+        delivery = delivery_from_arguments(args, args.smsdir)
         delivery.send_messages()
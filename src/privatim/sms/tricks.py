@@ -19,7 +19,11 @@ class SMSDeliveryTrick(Trick):
             self,
             smsdir: str,
             username: str = '',
-            password: str = ''  # nosec:B107
+            password: str = '',  # nosec:B107
+            workers: int = 4,
+            rate: float | None = None,
+            burst: int = 1,
+            group_window: float = 5.0
     ):
         self.smsdir = None
         self.delivery = None
@@ -29,6 +33,10 @@ class SMSDeliveryTrick(Trick):
                 self.smsdir,
                 username,
                 password,
+                workers=workers,
+                rate=rate,
+                burst=burst,
+                group_window=group_window,
             )
 
         super().__init__(
@@ -1,3 +1,10 @@
+""" Runs watchmedo as a daemon.
+
+Prefer ``sms_delivery_daemon`` (see `privatim.sms.daemon`) for the SMS
+queue, it sends the messages in-process instead of starting a new
+process for each of them.
+
+"""
 from __future__ import annotations
 from daemons import daemonizer  # type:ignore[import-untyped]
 from watchdog.watchmedo import cli
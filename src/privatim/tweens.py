@@ -1,5 +1,10 @@
 from __future__ import annotations
+import logging
+from pyramid.settings import asbool
+from time import perf_counter
 from .git_info import get_git_revision_hash
+from .metrics import REQUEST_DURATION, RESPONSE_SIZE
+from .orm.instrumentation import collect_sql_stats
 
 
 from typing import TYPE_CHECKING, Any
@@ -9,6 +14,9 @@ if TYPE_CHECKING:
     from pyramid.response import Response
 
 
+sql_logger = logging.getLogger('privatim.sql_stats')
+
+
 def git_info_tween_factory(
     handler: Callable[[Request], Response], registry: Any
 ) -> Callable[[Request], Response]:
@@ -17,3 +25,59 @@ def git_info_tween_factory(
         return handler(request)
 
     return git_info_tween
+
+
+def sql_stats_tween_factory(
+    handler: Callable[[Request], Response], registry: Any
+) -> Callable[[Request], Response]:
+    """ Logs the number of statements, the time spent in the database and
+    the rows fetched for each request. Queries executed more often than
+    ``sql_stats.repeat_threshold`` times are logged as likely N+1 queries.
+
+    With ``sql_stats.header = true`` the summary is also sent in the
+    ``X-SQL-Stats`` response header (meant for development).
+
+    """
+    settings = registry.settings
+    threshold = int(settings.get('sql_stats.repeat_threshold', 5))
+    add_header = asbool(settings.get('sql_stats.header', False))
+
+    def sql_stats_tween(request: Request) -> Response:
+        with collect_sql_stats() as stats:
+            response = handler(request)
+
+        summary = stats.summary(threshold)
+        sql_logger.info('%s %s: %s', request.method, request.path, summary)
+        for shape, count in stats.repeated(threshold):
+            sql_logger.warning(
+                'Possible N+1 query on %s %s, executed %d times: %s',
+                request.method, request.path, count, shape[:500]
+            )
+        if add_header:
+            response.headers['X-SQL-Stats'] = summary
+        return response
+
+    return sql_stats_tween
+
+
+def metrics_tween_factory(
+    handler: Callable[[Request], Response], registry: Any
+) -> Callable[[Request], Response]:
+    """ Records the latency and response size per route, see
+    `privatim.metrics`. """
+
+    def metrics_tween(request: Request) -> Response:
+        start = perf_counter()
+        response = handler(request)
+        route = request.matched_route
+        route_name = route.name if route is not None else ''
+        REQUEST_DURATION.labels(
+            route=route_name, method=request.method
+        ).observe(perf_counter() - start)
+        if response.content_length is not None:
+            RESPONSE_SIZE.labels(route=route_name).observe(
+                response.content_length
+            )
+        return response
+
+    return metrics_tween
@@ -1,7 +1,6 @@
 from __future__ import annotations
 import base64
 import gzip
-import magic
 from io import BytesIO
 
 from pytz import timezone, BaseTzInfo
@@ -60,6 +59,7 @@ def binary_to_dictionary(
 
     assert isinstance(binary, bytes)
 
+    import magic
     mimetype = magic.from_buffer(binary, mime=True)
 
     # according to https://tools.ietf.org/html/rfc7111, text/csv should be used
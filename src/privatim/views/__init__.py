@@ -8,6 +8,7 @@ from privatim.route_factories import (agenda_item_factory,
                                       consultation_all_versions_factory)
 from privatim.route_factories import consultation_factory
 from privatim.route_factories import default_meeting_factory
+from privatim.route_factories import image_variant_factory
 from privatim.route_factories import meeting_factory
 from privatim.route_factories import person_factory
 from privatim.route_factories import working_group_factory
@@ -27,6 +28,7 @@ from privatim.views.consultations import consultation_view
 from privatim.views.consultations import consultations_view
 from privatim.views.general_file import (
     download_general_file_view,
+    download_image_variant_view,
     delete_general_file_view,
 )
 from privatim.views.forbidden import forbidden_view
@@ -44,6 +46,7 @@ from privatim.views.meetings import delete_meeting_view
 from privatim.views.meetings import edit_meeting_view
 from privatim.views.meetings import meeting_view
 from privatim.views.meetings import working_group_view
+from privatim.views.metrics import metrics_view
 from privatim.views.password_change import password_change_view
 from privatim.views.password_retrieval import password_retrieval_view
 
@@ -102,6 +105,15 @@ def includeme(config: Configurator) -> None:
         permission=NO_PERMISSION_REQUIRED,
     )
 
+    if config.get_settings().get('metrics.token'):
+        config.add_route('metrics', '/metrics')
+        config.add_view(
+            metrics_view,
+            route_name='metrics',
+            request_method='GET',
+            permission=NO_PERMISSION_REQUIRED,
+        )
+
     config.add_route('logout', '/logout')
     config.add_view(logout_view, route_name='logout')
 
@@ -614,6 +626,17 @@ def includeme(config: Configurator) -> None:
         request_method='GET',
     )
 
+    config.add_route(
+        'download_file_variant',
+        r'/download/file/{id}/{size:\d+}',
+        image_variant_factory,
+    )
+    config.add_view(
+        download_image_variant_view,
+        route_name='download_file_variant',
+        request_method='GET',
+    )
+
     config.add_route(
         'delete_general_file',
         '/delete/file/{id}',
@@ -1,7 +1,6 @@
 from __future__ import annotations
-from pyramid.httpexceptions import HTTPFound
+from pyramid.httpexceptions import HTTPFound, HTTPNotFound
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
 from privatim.forms.agenda_item_form import AgendaItemForm, AgendaItemCopyForm
 from privatim.i18n import _
@@ -111,6 +110,9 @@ def delete_agenda_item_view(
     title = context.title
 
     session = request.dbsession
+    AgendaItemStatePreference.remove_states(
+        session, str(context.meeting_id), [context.id]
+    )
     session.delete(context)
     session.flush()
 
@@ -145,32 +147,18 @@ def copy_agenda_item_view(
     target_url = request.route_url('meeting', id=context.id)
     if request.method == 'POST' and form.validate():
         source_meeting_id = form.copy_from.data
-        stmt = (
-            select(Meeting)
-            .where(Meeting.id == source_meeting_id)
-            .options(selectinload(Meeting.agenda_items))
+        source_meeting_name = session.execute(
+            select(Meeting.name).where(Meeting.id == source_meeting_id)
+        ).scalar_one()
+        AgendaItem.copy_from_meeting(
+            session,
+            source_meeting_id,
+            context,
+            copy_description=bool(form.copy_description.data),
         )
-        source_meeting = session.execute(stmt).scalar_one()
-        # Create deep copies of agenda items from the source meeting to the
-        # context meeting
-        # Put them in a list, else this will loop forever
-        for agenda_item in list(source_meeting.agenda_items):
-            new_item = AgendaItem.create(
-                session,
-                title=agenda_item.title,
-                description=(
-                    agenda_item.description
-                    if form.copy_description.data
-                    else ''
-                ),
-                meeting=context,
-            )
-            session.add(new_item)
-
-        session.flush()
         message = _(
             'Successfully copied agenda items from "${name}"',
-            mapping={'name': source_meeting.name},
+            mapping={'name': source_meeting_name},
         )
         if request.is_xhr:
             return {'success': translate(message, request.locale_name)}
@@ -184,41 +172,27 @@ def copy_agenda_item_view(
     }
 
 
-def update_single_agenda_item_state(request: IRequest) -> dict[str, str]:
+def update_single_agenda_item_state(
+    request: IRequest
+) -> dict[str, str] | HTTPNotFound:
     """Update the expanded/collapsed state of a single agenda item for the
     current user"""
     session = request.dbsession
     new_state = AgendaItemDisplayState(int(request.json_body['state']))
     agenda_item_id = request.matchdict['id']
-    user_id = request.user.id
-
-    try:
-        preference = session.execute(
-            select(AgendaItemStatePreference).where(
-                AgendaItemStatePreference.agenda_item_id == agenda_item_id,
-                AgendaItemStatePreference.user_id == user_id,
-            )
-        ).scalar_one_or_none()
-
-        if not preference:
-            preference = AgendaItemStatePreference(
-                user_id=user_id,
-                agenda_item_id=agenda_item_id,
-                state=new_state,
-            )
-            session.add(preference)
-        else:
-            preference.state = new_state
-
-        session.flush()
-
-    except Exception:
-        # This handles the race condition where two requests try to create the
-        # same preference at the same time. One will succeed, the other will
-        # fail. The failed one will roll back and the existing preference
-        # will be used.
-        session.rollback()
 
+    meeting_id = session.execute(
+        select(AgendaItem.meeting_id).where(AgendaItem.id == agenda_item_id)
+    ).scalar_one_or_none()
+    if meeting_id is None:
+        return HTTPNotFound()
+
+    AgendaItemStatePreference.set_states(
+        session,
+        request.user.id,
+        str(meeting_id),
+        {agenda_item_id: new_state},
+    )
     return {'status': 'success'}
 
 
@@ -231,43 +205,19 @@ def update_bulk_agenda_items_state(
 
     session = request.dbsession
     new_state = AgendaItemDisplayState(int(request.json_body['state']))
-    user_id = request.user.id
 
-    # Get all agenda items for the meeting
-    agenda_items = context.agenda_items
-    if not agenda_items:
+    agenda_item_ids = session.execute(
+        select(AgendaItem.id).where(AgendaItem.meeting_id == context.id)
+    ).scalars().all()
+    if not agenda_item_ids:
         return {'status': 'success', 'updated': 0}
 
-    # Get existing preferences for this user and meeting
-    existing_preferences = {
-        p.agenda_item_id: p for p in session.execute(
-            select(AgendaItemStatePreference).where(
-                AgendaItemStatePreference.user_id == user_id,
-                AgendaItemStatePreference.agenda_item_id.in_(
-                    [item.id for item in agenda_items]
-                )
-            )
-        ).scalars().all()
-    }
-
-    for item in agenda_items:
-        preference = existing_preferences.get(
-            item.id, None
-        )  # type: ignore[call-overload]
-        if not preference:
-            preference = AgendaItemStatePreference(
-                user_id=user_id,
-                agenda_item_id=item.id,
-                state=new_state,
-            )
-            session.add(preference)
-        else:
-            preference.state = new_state
-
-    try:
-        session.flush()
-    except Exception:
-        # Handle potential race conditions in bulk updates as well
-        session.rollback()
-
-    return {'status': 'success', 'updated': len(agenda_items)}
+    # this covers every agenda item, so stale entries can be dropped
+    AgendaItemStatePreference.set_states(
+        session,
+        request.user.id,
+        context.id,
+        dict.fromkeys(agenda_item_ids, new_state),
+        replace=True,
+    )
+    return {'status': 'success', 'updated': len(agenda_item_ids)}
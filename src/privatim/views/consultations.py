@@ -9,7 +9,6 @@ from privatim.i18n import translate
 from pyramid.httpexceptions import HTTPFound
 import logging
 from privatim.models.file import SearchableFile
-from privatim.models import User
 from sqlalchemy.orm import selectinload
 from privatim.utils import (
     dictionary_to_binary,
@@ -104,8 +103,8 @@ def consultations_view(request: IRequest) -> RenderData:
         select(Consultation)
         .where(Consultation.is_latest_version == 1)
         .options(
-            # Eager load editor and their picture to avoid N+1 queries later
-            selectinload(Consultation.editor).selectinload(User.profile_pic),
+            # Eager load editor to avoid N+1 queries later
+            selectinload(Consultation.editor),
             # Eager load previous_version recursively might be complex.
             # We accept potential lazy loads in get_original_creation_date
             # for now. Optimize if needed.
@@ -133,10 +132,8 @@ def consultations_view(request: IRequest) -> RenderData:
     consultations_data = tuple(
         {
             '_id': _cons.id,
-            # Check if editor and picture exist before accessing id
             'editor_pic_id': (
-                _cons.editor.picture.id
-                if _cons.editor and _cons.editor.picture else None
+                _cons.editor.profile_pic_id if _cons.editor else None
             ),
             'title': _cons.title,
             'editor_name': _cons.editor.fullname if _cons.editor
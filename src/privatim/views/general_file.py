@@ -1,6 +1,6 @@
 from __future__ import annotations
 from pyramid.httpexceptions import HTTPFound
-from privatim.models.file import GeneralFile
+from privatim.models.file import GeneralFile, ImageVariant
 from pyramid.response import Response
 from privatim.i18n import _
 from privatim.i18n import translate
@@ -29,6 +29,27 @@ def download_general_file_view(
     return response
 
 
+def download_image_variant_view(
+    context: ImageVariant | AbstractFile, request: IRequest
+) -> Response:
+    """ Downloads the scaled down variant of an image, falls back to the
+    original file if there is no variant. """
+
+    if isinstance(context, AbstractFile):
+        return download_general_file_view(context, request)
+
+    assert isinstance(context, ImageVariant)
+    response = Response(
+        body=context.content,
+        content_type=context.content_type,
+        request=request,
+    )
+    # a variant never changes, a new upload gets a new file id
+    response.cache_control.private = True
+    response.cache_control.max_age = 31536000
+    return response
+
+
 def delete_general_file_view(
     context: GeneralFile, request: IRequest
 ) -> XHRDataOrRedirect:
@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import logging
-import bleach
 from markupsafe import Markup
 from pyramid.response import Response
 from sqlalchemy import func, select
@@ -11,12 +10,6 @@ from privatim.models.association_tables import (
     AgendaItemStatePreference,
 )
 from privatim.models.file import SearchableFile
-from privatim.reporting.report import (
-    MeetingReport,
-    ReportOptions,
-    HTMLReportRenderer,
-    WordReportRenderer,
-)
 from privatim.utils import datetime_format, dictionary_to_binary
 from privatim.controls.controls import Button
 from pyramid.httpexceptions import (
@@ -51,29 +44,20 @@ def meeting_view(
         request: IRequest
 ) -> RenderData:
     """ Displays a single meeting. """
+    import bleach
+
     assert isinstance(context, Meeting)
     session = request.dbsession
 
     stmt = select(func.count(Meeting.id)).where(
-        Meeting.working_group_id == context.working_group.id
+        Meeting.working_group_id == context.working_group_id
     )
     meeting_count = session.execute(stmt).scalar_one()
     disable_copy_button = meeting_count <= 1
 
-    # Get all preferences for this user and these agenda items in one query
-    preferences_stmt = (
-        select(AgendaItemStatePreference)
-        .where(
-            AgendaItemStatePreference.user_id == request.user.id,
-            AgendaItemStatePreference.agenda_item_id.in_(
-                item.id for item in context.agenda_items
-            )
-        )
+    preferences = AgendaItemStatePreference.get_states(
+        session, request.user.id, context.id
     )
-    preferences = {
-        str(pref.agenda_item_id): pref.state
-        for pref in session.execute(preferences_stmt).scalars()
-    }
 
     formatted_time = datetime_format(context.time)
     request.add_action_menu_entries(
@@ -131,7 +115,7 @@ def meeting_view(
     all_items_expanded = True
     for indx, item in enumerate(context.agenda_items, start=1):
         is_expanded = preferences.get(
-            str(item.id),
+            item.id,
             AgendaItemDisplayState.COLLAPSED
         ) == AgendaItemDisplayState.EXPANDED
 
@@ -179,7 +163,7 @@ def meeting_view(
         'agenda_items': agenda_items,
         'sortable_url': data_sortable_url,
         'navigate_back_up': request.route_url(
-            'meetings', id=context.working_group.id
+            'meetings', id=context.working_group_id
         ),
         'expand_all_text': _('Expand All'),
         'collapse_all_text': _('Collapse All'),
@@ -227,7 +211,7 @@ def user_list(
             '</li>'
         ).format(
             user.user.profile_pic_download_link(
-                request
+                request, 80
             ),
             user.user.fullname,
             request.route_url("person", id=user.user_id),
@@ -264,6 +248,10 @@ def export_meeting_as_pdf_view(
     if meeting is None:
         return HTTPNotFound()
 
+    # the renderers load WeasyPrint and python-docx
+    from privatim.reporting.report import (
+        HTMLReportRenderer, MeetingReport, ReportOptions)
+
     renderer = HTMLReportRenderer()
     options = ReportOptions(language=request.locale_name)
     report = MeetingReport(request, meeting, options, renderer).build()
@@ -288,6 +276,9 @@ def export_meeting_as_docx_view(
     if meeting is None:
         return HTTPNotFound()
 
+    from privatim.reporting.report import (
+        MeetingReport, ReportOptions, WordReportRenderer)
+
     renderer = WordReportRenderer()
     options = ReportOptions(language=request.locale_name)
     # Pass the specific renderer instance
@@ -335,7 +326,7 @@ def working_group_view(
         'title': context.name,
         'users': [
             {
-                'profile_pic': user.profile_pic_download_link(request),
+                'profile_pic': user.profile_pic_download_link(request, 80),
                 'fullname': user.fullname,
                 'url': request.route_url("person", id=user.id),
             } for user in sorted(context.users, key=lambda user: user.fullname)
@@ -354,7 +345,9 @@ def working_group_view(
     chairman_dict = {}
     if chairman is not None:
         chairman_dict = {
-            'chairman_profile': chairman.profile_pic_download_link(request),
+            'chairman_profile': chairman.profile_pic_download_link(
+                request, 80
+            ),
             'chairman_fullname': chairman.fullname,
             'chairman_link': request.route_url('person', id=chairman.id),
         }
@@ -0,0 +1,36 @@
+from __future__ import annotations
+import hmac
+from pyramid.httpexceptions import HTTPForbidden
+from pyramid.response import Response
+
+from privatim.mail.outbox import outbox_depth
+from privatim.metrics import MAIL_OUTBOX, generate_metrics
+
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from pyramid.interfaces import IRequest
+
+
+def metrics_view(request: IRequest) -> Response:
+    """ Serves the metrics to clients sending the configured token as
+    bearer token. """
+
+    token = request.registry.settings['metrics.token']
+    authorization = request.authorization
+    if (
+        authorization is None
+        or authorization.authtype.lower() != 'bearer'
+        or not hmac.compare_digest(str(authorization.params), token)
+    ):
+        raise HTTPForbidden()
+
+    # the outbox is shared by all processes, so it is counted on demand
+    for state, count in outbox_depth(request.dbsession).items():
+        MAIL_OUTBOX.labels(state.name).set(count)
+
+    body, content_type = generate_metrics()
+    response = Response(body=body)
+    response.headers['Content-Type'] = content_type
+    response.cache_control.no_store = True
+    return response
@@ -10,7 +10,7 @@ from wtforms.validators import InputRequired
 from privatim.i18n import _
 from privatim.forms.core import Form as BaseForm
 
-from ..mail import IMailer
+from ..mail.outbox import queue_template_mail
 from ..models import PasswordChangeToken
 from ..models import User
 from ..security_policy import PasswordException
@@ -64,8 +64,8 @@ def mail_retrieval(email: str, request: IRequest) -> None:
     session.add(token_obj)
     session.flush()
 
-    mailer = request.registry.getUtility(IMailer)
-    mailer.send_template(
+    queue_template_mail(
+        session,
         sender=None,  # This mail doesn't need a reply-to
         receivers=Address(user.fullname_without_abbrev, addr_spec=user.email),
         template='password-reset',
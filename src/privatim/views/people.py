@@ -1,9 +1,9 @@
 from __future__ import annotations
 from pyramid.httpexceptions import HTTPFound
-from sqlalchemy import nullslast
-from sqlalchemy.orm import selectinload
+from sqlalchemy import nullslast, or_
 from sqlalchemy.future import select
 from markupsafe import Markup
+from textwrap import shorten
 import logging
 
 from privatim.controls.controls import Button
@@ -11,11 +11,20 @@ from privatim.forms.user_form import UserForm
 from privatim.i18n import _, translate
 from privatim.security_policy import PasswordException
 from privatim.utils import strip_p_tags
-from privatim.models import User, WorkingGroup
+from privatim.models import (
+    Comment,
+    Consultation,
+    Meeting,
+    MeetingUserAttendance,
+    User,
+    WorkingGroup,
+)
 
 from typing import TYPE_CHECKING
 
 from privatim.views.password_retrieval import mail_retrieval
+from privatim.models.file import image_url
+from privatim.views.utils import Page
 
 if TYPE_CHECKING:
     from pyramid.interfaces import IRequest
@@ -25,80 +34,149 @@ if TYPE_CHECKING:
 logger = logging.getLogger('privatim.people')
 
 
+PEOPLE_PER_PAGE = 50
+PERSON_SECTION_PER_PAGE = 10
+
+
+def profile_pic_url(
+    request: IRequest,
+    profile_pic_id: str | None,
+    size: int | None = None
+) -> str:
+    """ Same as `User.profile_pic_download_link` for a projected row. """
+    return (
+        image_url(request, profile_pic_id, size)
+        if profile_pic_id
+        else request.static_url('privatim:static/default_profile_icon.png')
+    )
+
+
 def people_view(request: IRequest) -> RenderData:
-    session = request.dbsession
-    stmt = select(User).order_by(
+    term = request.GET.get('q', '').strip()
+    stmt = select(
+        User.id,
+        User.first_name,
+        User.last_name,
+        User.fullname,
+        User.is_admin,
+        User.profile_pic_id,
+    ).order_by(
         nullslast(User.last_name),
-        nullslast(User.first_name)
+        nullslast(User.first_name),
+        User.id
     )
+    if term:
+        stmt = stmt.where(or_(
+            User.first_name.icontains(term, autoescape=True),
+            User.last_name.icontains(term, autoescape=True),
+            User.email.icontains(term, autoescape=True),
+            User.abbrev.icontains(term, autoescape=True),
+        ))
+
+    page = Page(request, stmt, PEOPLE_PER_PAGE)
     people_data = []
-    for user in session.execute(stmt).scalars():
+    for (
+        user_id, first_name, last_name, fullname, is_admin, profile_pic_id
+    ) in page:
         buttons = [
             Button(
-                url=request.route_url('edit_user', id=user.id),
+                url=request.route_url('edit_user', id=user_id),
                 icon='edit',
                 description=_('Edit user'),
                 css_class='btn-sm btn-secondary',
             ),
             Button(
-                url=request.route_url('delete_user', id=user.id),
+                url=request.route_url('delete_user', id=user_id),
                 icon='trash',
                 description=_('Delete'),
                 css_class='btn-sm btn-outline-danger',
                 modal='#delete-xhr',
                 data_item_title=_(
-                    'User ${name}', mapping={'name': user.fullname},
+                    'User ${name}', mapping={'name': fullname},
                 ),
             ),
         ]
         button_html = Markup('').join(Markup(button()) for button in buttons)
         people_data.append({
-            'id': user.id,
-            'name': f'{user.last_name} {user.first_name}',
-            'download_link': user.profile_pic_download_link(request),
-            'url': request.route_url('person', id=user.id),
+            'id': user_id,
+            'name': f'{last_name} {first_name}',
+            'download_link': profile_pic_url(request, profile_pic_id, 80),
+            'url': request.route_url('person', id=user_id),
             'buttons': button_html,
-            'is_admin': user.is_admin
+            'is_admin': is_admin
         })
 
     return {
         'delete_title': _('Delete User'),
         'title': _('List of Persons'),
         'people': people_data,
+        'page': page,
+        'term': term,
     }
 
 
 def person_view(context: User, request: IRequest) -> RenderData:
-    session = request.dbsession
-    stmt = (
-        select(User)
-        .options(
-            selectinload(User.comments),
-            selectinload(User.consultations),
-        )
-        .filter_by(id=context.id)
+    meetings = Page(
+        request,
+        select(Meeting.id, Meeting.name)
+        .join(MeetingUserAttendance)
+        .where(MeetingUserAttendance.user_id == context.id)
+        .order_by(Meeting.time.desc(), Meeting.id),
+        PERSON_SECTION_PER_PAGE,
+        param='meetings_page'
+    )
+    consultations = Page(
+        request,
+        select(Consultation.id, Consultation.title)
+        .where(Consultation.creator_id == context.id)
+        .order_by(Consultation.created.desc(), Consultation.id),
+        PERSON_SECTION_PER_PAGE,
+        param='consultations_page'
+    )
+    comments = Page(
+        request,
+        select(Comment.content, Comment.target_id, Comment.target_type)
+        # comments aren't soft delete models, so the session doesn't
+        # filter the deleted ones
+        .where(Comment.user_id == context.id, Comment.deleted.is_(False))
+        .order_by(Comment.created.desc(), Comment.id),
+        PERSON_SECTION_PER_PAGE,
+        param='comments_page'
     )
-    user: User = session.execute(stmt).scalar_one()
 
     meetings_dict = [
         {
-            'name': strip_p_tags(meeting.name),
-            'url': request.route_url('meeting', id=meeting.id)
-        } for meeting in user.meetings
+            'name': strip_p_tags(name),
+            'url': request.route_url('meeting', id=meeting_id)
+        } for meeting_id, name in meetings
     ]
 
     consultation_dict = [
         {
-            'title': strip_p_tags(consultation.title),
-            'url': request.route_url('consultation', id=consultation.id)
-        } for consultation in user.consultations
+            'title': strip_p_tags(title),
+            'url': request.route_url('consultation', id=consultation_id)
+        } for consultation_id, title in consultations
+    ]
+
+    comment_dict = [
+        {
+            'content': shorten(Markup(content).striptags(), 120),
+            'url': (
+                request.route_url('consultation', id=target_id)
+                if target_type == 'consultations' else None
+            )
+        } for content, target_id, target_type in comments
     ]
 
     return {
-        'user': user,
-        'profile_pic_url': user.profile_pic_download_link(request),
+        'user': context,
+        'profile_pic_url': context.profile_pic_download_link(request, 250),
         'meeting_urls': meetings_dict,
-        'consultation_urls': consultation_dict
+        'meetings_page': meetings,
+        'consultation_urls': consultation_dict,
+        'consultations_page': consultations,
+        'comments': comment_dict,
+        'comments_page': comments,
     }
 
 
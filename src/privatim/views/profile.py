@@ -1,12 +1,12 @@
 from __future__ import annotations
 from io import BytesIO
-from PIL import Image
 from pyramid.httpexceptions import HTTPForbidden, HTTPFound
 
 from privatim.controls.controls import Button
 from privatim.i18n import _
 from privatim import authenticated_user
-from privatim.models.file import GeneralFile
+from privatim.models.file import GeneralFile, MAX_IMAGE_PIXELS
+from privatim.models.profile_pic import profile_pic_cache
 
 
 from typing import TYPE_CHECKING
@@ -51,6 +51,7 @@ def profile_view(request: IRequest) -> RenderData:
     )
     return {
         'user': user,
+        'profile_pic_url': profile_pic_cache.url(request, user.id, 250),
         'delete_title': _('Delete photo'),
         'delete_profile_picture_button': delete_profile_pic(),
         'upload_profile_picture_button': upload_profile_pic(),
@@ -68,13 +69,24 @@ def add_profile_image_view(
             in ALLOWED_IMG_EXTENSIONS
         )
 
-    def validate_image(file: BytesIO) -> bool:
+    def validate_image(file: BytesIO) -> str | None:
+        from PIL import Image
+
+        too_large = _(
+            'The image is too large, it may have at most '
+            '${pixels} megapixels',
+            mapping={'pixels': MAX_IMAGE_PIXELS // 1_000_000}
+        )
         try:
             img = Image.open(file)
+            if img.width * img.height > MAX_IMAGE_PIXELS:
+                return too_large
             img.verify()
-            return True
+            return None
+        except Image.DecompressionBombError:
+            return too_large
         except Exception:
-            return False
+            return _('Invalid image file')
 
     user = authenticated_user(request)
     target_url = request.route_url('profile')
@@ -118,14 +130,16 @@ def add_profile_image_view(
             return HTTPFound(location=target_url)
 
         # Validate image content
-        if not validate_image(BytesIO(file_content)):
-            request.messages.add(_('Invalid image file'), 'error')
+        error = validate_image(BytesIO(file_content))
+        if error:
+            request.messages.add(error, 'error')
             return HTTPFound(location=target_url)
 
         # If all validations pass, save the file
         user.profile_pic = GeneralFile(
             filename=input_file.filename, content=file_content
         )
+        user.profile_pic.generate_variants(file_content)
 
         message = _('Successfully updated profile picture')
         request.dbsession.add(user)
@@ -6,6 +6,7 @@ from sqlalchemy import (func, select, literal, Select, Function,
 
 from privatim.forms.search_form import SearchForm
 from privatim.layouts import Layout
+from privatim.metrics import SEARCH_DURATION
 from privatim.i18n import locales
 from privatim.models import AgendaItem
 from privatim.models.file import SearchableFile
@@ -283,7 +284,8 @@ def search(request: IRequest) -> RenderDataOrRedirect:
         collection: SearchCollection = SearchCollection(
             term=query, session=session
         )
-        collection.do_search()
+        with SEARCH_DURATION.time():
+            collection.do_search()
         search_results = []
         for result in collection.results:
             result_dict = result._asdict()  # Convert NamedTuple to dict
@@ -76,26 +76,6 @@ def trash_view(request: IRequest) -> RenderData:
     }
 
 
-def restore_consultation_chain(
-        session: FilteredSession,
-        consultation: Consultation
-) -> None:
-    """Restore an entire consultation chain starting from any point."""
-    # Restore backwards through the chain
-    current: Consultation | None = consultation
-    while current is not None:
-        current.revert_soft_delete()
-        session.add(current)
-        current = current.previous_version
-
-    # Also restore forwards through the chain
-    current = consultation.replaced_by
-    while current is not None:
-        current.revert_soft_delete()
-        session.add(current)
-        current = current.replaced_by
-
-
 def restore_soft_deleted_model_view(
         request: IRequest,
 ) -> RenderDataOrRedirect:
@@ -115,12 +95,8 @@ def restore_soft_deleted_model_view(
         item = session.execute(stmt).scalar_one_or_none()
 
         if item:
-            if isinstance(item, Consultation):
-                restore_consultation_chain(session, item)
-            else:
-                item.revert_soft_delete()
-                session.add(item)
-
+            # restores the whole consultation chain, including the files
+            item.revert_soft_delete()
             session.flush()
             session.refresh(item)
             request.messages.add(_('Item restored successfully.'), 'success')
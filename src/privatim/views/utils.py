@@ -1,5 +1,16 @@
 from __future__ import annotations
 import os
+from urllib.parse import urlencode
+
+
+from typing import Any, Generic, TypeVar, TYPE_CHECKING
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+    from pyramid.interfaces import IRequest
+    from sqlalchemy import Row, Select
+
+
+_T = TypeVar('_T', bound='tuple[Any, ...]')
 
 
 def trim_filename(filename: str) -> str:
@@ -11,3 +22,58 @@ def trim_filename(filename: str) -> str:
         trimmed_name = name[:max_name_length-3] + ".."
         trimmed_filename = trimmed_name + extension
         return trimmed_filename
+
+
+def page_number(request: IRequest, param: str = 'page') -> int:
+    """ Returns the 1-based page number from the query string. """
+    try:
+        return max(int(request.GET.get(param, 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+class Page(Generic[_T]):
+    """ A bounded slice of a query result.
+
+    Rather than counting all the rows, one more row than requested is fetched
+    to find out whether there is a next page.
+    """
+
+    def __init__(
+        self,
+        request: IRequest,
+        stmt: Select[_T],
+        per_page: int,
+        param: str = 'page'
+    ) -> None:
+        self.request = request
+        self.param = param
+        self.number = page_number(request, param)
+        rows = request.dbsession.execute(
+            stmt.limit(per_page + 1).offset((self.number - 1) * per_page)
+        ).all()
+        self.items: Sequence[Row[_T]] = rows[:per_page]
+        self.has_next = len(rows) > per_page
+
+    @property
+    def has_previous(self) -> bool:
+        return self.number > 1
+
+    def url(self, number: int) -> str:
+        """ The url of the given page, keeping all other query parameters. """
+        query = {**self.request.GET, self.param: str(number)}
+        return f'{self.request.path_url}?{urlencode(query)}'
+
+    @property
+    def previous_url(self) -> str | None:
+        return self.url(self.number - 1) if self.has_previous else None
+
+    @property
+    def next_url(self) -> str | None:
+        return self.url(self.number + 1) if self.has_next else None
+
+    def __iter__(self) -> Iterator[Row[_T]]:
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        return len(self.items)
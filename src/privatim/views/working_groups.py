@@ -24,14 +24,8 @@ def working_groups_view(request: IRequest) -> RenderData:
                     {
                         'id': user.id,
                         'fullname': user.fullname,
-                        'picture_url': (
-                            request.route_url(
-                                'download_file', id=user.profile_pic_id
-                            )
-                            if user.profile_pic_id
-                            else request.static_url(
-                                'privatim:static/default_profile_icon.png'
-                            )
+                        'picture_url': user.profile_pic_download_link(
+                            request, 80
                         ),
                         'profile_url': request.route_url('person', id=user.id),
                     }
@@ -0,0 +1,9 @@
+from collections.abc import Sequence
+
+class TweensConfiguratorMixin:
+    def add_tween(
+        self,
+        tween_factory: str,
+        under: str | Sequence[str] | None = ...,
+        over: str | Sequence[str] | None = ...
+    ) -> None: ...
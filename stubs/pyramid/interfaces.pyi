@@ -12,6 +12,7 @@ from privatim.flash import MessageQueue
 from privatim.models import User
 # We overwrite this!
 from privatim.orm.session import FilteredSession as DBSession
+from privatim.security import Identity
 from types import ModuleType
 from types import TracebackType
 from typing import Any
@@ -161,6 +162,7 @@ class IRequest(Interface, _Request):
     #       can override the type for the few views that are
     #       unauthenticated and need to access this
     authenticated_userid: str
+    identity: Identity | None
     user: User
 
     messages: MessageQueue
@@ -1,6 +1,10 @@
+import pytest
+import transaction
 from datetime import timedelta
+from libcloud.storage.types import ObjectDoesNotExistError
 from sedate import utcnow
 from sqlalchemy import select
+from sqlalchemy_file.storage import StorageManager
 
 from privatim.cli.apply_data_retention_policy import (
     delete_old_consultation_chains,
@@ -59,7 +63,8 @@ def test_delete_old_records_consultations(session, user):
     session.flush()
 
     # Run the delete_old_consultation_chains function
-    deleted_ids = delete_old_consultation_chains(session, days_threshold=30)
+    report = delete_old_consultation_chains(session, days_threshold=30)
+    deleted_ids = report.consultation_ids
 
     # Check that the correct consultations were deleted
     assert len(deleted_ids) == 2
@@ -87,7 +92,7 @@ def test_delete_old_consultation_chains_no_deletions(session, user):
     session.flush()
 
     # Run the delete_old_consultation_chains function
-    deleted_ids = delete_old_consultation_chains(session)
+    deleted_ids = delete_old_consultation_chains(session).consultation_ids
 
     # Check that no consultations were deleted
     assert len(deleted_ids) == 0
@@ -142,7 +147,7 @@ def test_delete_old_consultation_chains_handles_files_correctly(session, user):
     # Run the delete_old_consultation_chains function
     deleted_consultation_ids = delete_old_consultation_chains(
         session, days_threshold=30
-    )
+    ).consultation_ids
 
     # Assertions:
     assert len(deleted_consultation_ids) == 2
@@ -162,3 +167,77 @@ def test_delete_old_consultation_chains_handles_files_correctly(session, user):
         assert session.get(SearchableFile, file_to_be_deleted_id) is None
         assert session.get(SearchableFile, file_to_be_kept_recent_id)
         assert session.get(SearchableFile, file_to_be_kept_active_id)
+
+
+def create_chain(session, user, title, days_old, length):
+    """ Creates a soft deleted chain with a file on each version. """
+    previous = None
+    for i in range(length):
+        consultation = create_consultation(
+            session, user, f'{title} {i}', days_old,
+            is_deleted=True, with_file=True
+        )
+        if previous is not None:
+            previous.is_latest_version = 0
+            previous.replaced_by = consultation
+        previous = consultation
+    session.flush()
+    return consultation
+
+
+def test_delete_old_consultation_chains_dry_run(session, user):
+    create_chain(session, user, 'Old', 40, length=3)
+    create_chain(session, user, 'Recent', 10, length=2)
+
+    report = delete_old_consultation_chains(session, dry_run=True)
+    assert report.chains == 1
+    assert report.consultations == 3
+    assert report.files == 3
+    assert report.bytes == 3 * len(b'Test content')
+
+    with session.no_soft_delete_filter(), session.no_consultation_filter():
+        assert session.query(Consultation).count() == 5
+        assert session.query(SearchableFile).count() == 5
+
+
+def test_delete_old_consultation_chains_in_batches(session, user):
+    for i in range(3):
+        create_chain(session, user, f'Chain {i}', 40, length=i + 1)
+    create_chain(session, user, 'Recent', 10, length=2)
+
+    with session.no_soft_delete_filter():
+        paths = [
+            file.file['path']
+            for file in session.scalars(select(SearchableFile))
+        ]
+
+    commits = []
+
+    def commit():
+        commits.append(True)
+        transaction.commit()
+
+    report = delete_old_consultation_chains(
+        session, batch_size=2, commit=commit
+    )
+    assert report.chains == 3
+    assert report.consultations == 6
+    assert report.files == 6
+    assert len(commits) == 2
+
+    with session.no_soft_delete_filter(), session.no_consultation_filter():
+        titles = {c.title for c in session.scalars(select(Consultation))}
+        assert titles == {'Recent 0', 'Recent 1'}
+        remaining = {
+            file.file['path']
+            for file in session.scalars(select(SearchableFile))
+        }
+
+    # the stored files have been removed after the commit
+    assert len(remaining) == 2
+    for path in paths:
+        if path in remaining:
+            assert StorageManager.get_file(path)
+        else:
+            with pytest.raises(ObjectDoesNotExistError):
+                StorageManager.get_file(path)
@@ -0,0 +1,129 @@
+import transaction
+from datetime import datetime, timedelta
+from sedate import utcnow
+from sqlalchemy import func, select, text
+
+from privatim import add_token_expiry
+from privatim.cli.purge_tokens import purge_expired
+from privatim.cli.upgrade import UpgradeContext
+from privatim.models import PasswordChangeToken, TAN, User
+
+
+def count(session, model):
+    return session.scalar(select(func.count()).select_from(model))
+
+
+def test_expires():
+    user = User(email='tan@example.org')
+    now = utcnow()
+    tan = TAN(user, 'hashed', '127.0.0.1', requested=now)
+    assert tan.expires == now + timedelta(hours=72)
+    assert not tan.expired()
+    # the stored expiry is used for the default lifetime
+    tan.expires = now - timedelta(seconds=1)
+    assert tan.expired()
+    assert not tan.expired(hours=1)
+    assert not tan.expired(hours=None)
+    tan.expires = now + timedelta(hours=72)
+    tan.expire()
+    assert tan.expires == tan.time_expired
+
+    token = PasswordChangeToken(user, '127.0.0.1', time_requested=now)
+    assert token.expires == now.replace(tzinfo=None) + timedelta(hours=48)
+    assert not token.expired
+    token.expire()
+    assert token.expires == token.time_expired
+    assert token.expired
+
+
+def test_purge_expired(pg_config):
+    session = pg_config.dbsession
+    engine = session.bind
+    user = User(email='tan@example.org')
+    user.set_password('test')
+    session.add(user)
+    new_user = User(email='new@example.org')
+    session.add(new_user)
+
+    now = utcnow()
+    for index in range(5):
+        session.add(TAN(
+            user, f'old{index}', '127.0.0.1',
+            requested=now - timedelta(days=4)
+        ))
+        session.add(PasswordChangeToken(
+            user, '127.0.0.1', time_requested=now - timedelta(days=3)
+        ))
+    session.add(TAN(user, 'recent', '127.0.0.1', requested=now))
+    used = TAN(user, 'used', '127.0.0.1', requested=now)
+    used.expire()
+    session.add(used)
+    session.add(PasswordChangeToken(user, '127.0.0.1', time_requested=now))
+    # the initial password set link of a new user doesn't expire
+    initial = PasswordChangeToken(
+        new_user, '127.0.0.1', time_requested=now - timedelta(days=3)
+    )
+    initial_token = initial.token
+    session.add(initial)
+    consumed = PasswordChangeToken(
+        new_user, '127.0.0.1', time_requested=now - timedelta(days=3)
+    )
+    consumed.time_consumed = now.replace(tzinfo=None)
+    session.add(consumed)
+    transaction.commit()
+
+    assert purge_expired(engine, TAN, utcnow(), batch_size=2) == 6
+    assert purge_expired(
+        engine, PasswordChangeToken, utcnow(), batch_size=2
+    ) == 6
+
+    assert session.scalars(select(TAN.tan)).all() == ['recent']
+    assert count(session, PasswordChangeToken) == 2
+    assert initial_token in session.scalars(
+        select(PasswordChangeToken.token)
+    ).all()
+    assert count(session, User) == 2
+
+
+def test_add_token_expiry(pg_config):
+    session = pg_config.dbsession
+    user = User(email='tan@example.org')
+    session.add(user)
+    session.flush()
+
+    # the schema before the expiry was added
+    upgrade = UpgradeContext(session)
+    upgrade.drop_column('tans', 'expires')
+    upgrade.drop_index('ix_tans_user_id_tan', 'tans')
+    upgrade.create_index('ix_tans_user_id', 'tans', ['user_id'])
+    upgrade.create_index('ix_tans_tan', 'tans', ['tan'])
+    upgrade.drop_column('password_change_tokens', 'expires')
+    assert not upgrade.drop_index('ix_tans_user_id_tan', 'tans')
+
+    session.execute(
+        text("""
+        INSERT INTO tans (id, user_id, time_requested, time_expired, tan,
+                          ip_address)
+        VALUES ('a9a4e9a4-0d1c-4a37-8d0c-0e2c6e0d5f01', :user_id,
+                '2024-01-01 12:00', NULL, 'open', ''),
+               ('a9a4e9a4-0d1c-4a37-8d0c-0e2c6e0d5f02', :user_id,
+                '2024-01-01 12:00', '2024-01-01 13:00', 'used', '')
+        """),
+        {'user_id': user.id}
+    )
+    add_token_expiry(upgrade)
+
+    assert dict(session.execute(
+        text('SELECT tan, expires FROM tans')
+    ).tuples().all()) == {
+        'open': datetime(2024, 1, 4, 12),
+        'used': datetime(2024, 1, 1, 13),
+    }
+    assert upgrade.index_exists('tans', 'ix_tans_user_id_tan')
+    assert upgrade.index_exists('tans', 'ix_tans_expires')
+    assert not upgrade.index_exists('tans', 'ix_tans_user_id')
+    assert not upgrade.index_exists('tans', 'ix_tans_tan')
+    assert upgrade.has_column('password_change_tokens', 'expires')
+    assert upgrade.index_exists(
+        'password_change_tokens', 'ix_password_change_tokens_expires'
+    )
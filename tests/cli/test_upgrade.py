@@ -1,4 +1,10 @@
+from sqlalchemy import Column, Integer, event, select
+from sqlalchemy.schema import DropIndex
+from privatim import generate_image_variants
 from privatim.cli.upgrade import UpgradeContext
+from privatim.models import GeneralFile, UpgradeStep, User
+from privatim.orm import Base
+from tests.shared.utils import create_png
 
 
 def test_has_table(pg_config):
@@ -11,3 +17,93 @@ def test_has_column(pg_config):
     upgrade = UpgradeContext(pg_config.dbsession)
     assert upgrade.has_column('meetings', 'id')
     assert not upgrade.has_column('meetings', 'bogus')
+
+
+def test_generate_image_variants(pg_config):
+    session = pg_config.dbsession
+    user = User(email='pic@example.org', first_name='Pic', last_name='Ture')
+    user.profile_pic = GeneralFile('pic.png', create_png(300, 300))
+    session.add(user)
+    session.flush()
+    assert user.profile_pic.variants == []
+
+    generate_image_variants(UpgradeContext(session))
+    session.expire_all()
+    assert sorted(v.size for v in user.profile_pic.variants) == [40, 80, 250]
+
+
+def test_create_index_concurrently(pg_config):
+    upgrade = UpgradeContext(pg_config.dbsession)
+    # the index build waits for all open transactions
+    upgrade.commit()
+
+    index = next(
+        index for index in Base.metadata.tables['consultations'].indexes
+        if index.name == 'ix_consultations_latest_created'
+    )
+    assert not upgrade.create_index_concurrently(index)
+
+    with upgrade.engine.begin() as connection:
+        connection.execute(DropIndex(index))
+    assert upgrade.create_index_concurrently(index)
+    assert not upgrade.create_index_concurrently(index)
+
+
+def test_schema_snapshot(pg_config):
+    upgrade = UpgradeContext(pg_config.dbsession)
+    statements = []
+
+    @event.listens_for(upgrade.operations_connection, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    assert upgrade.has_column('meetings', 'id')
+    count = len(statements)
+    assert upgrade.has_table('meetings')
+    assert not upgrade.has_column('meetings', 'bogus')
+    assert not upgrade.has_column('bogus', 'id')
+    assert upgrade.index_exists('consultations', 'ix_consultations_deleted')
+    assert upgrade.get_column_info('users', 'email')['nullable'] is False
+    assert len(statements) == count
+
+    # changes to the schema are picked up
+    assert upgrade.add_column('meetings', Column('bogus', Integer))
+    assert upgrade.has_column('meetings', 'bogus')
+    assert not upgrade.add_column('meetings', Column('bogus', Integer))
+
+
+def test_run_step(pg_config):
+    session = pg_config.dbsession
+    upgrade = UpgradeContext(session)
+    calls = []
+
+    def step(context):
+        calls.append(context)
+
+    assert upgrade.run_step(step)
+    assert not upgrade.run_step(step)
+    assert upgrade.run_step(step, name='other')
+    assert calls == [upgrade, upgrade]
+
+    # the completed steps are recorded
+    assert not UpgradeContext(session).run_step(step)
+    names = set(session.scalars(select(UpgradeStep.name)))
+    assert names == {'step', 'other'}
+
+
+def test_create_index(pg_config):
+    upgrade = UpgradeContext(pg_config.dbsession)
+    assert upgrade.create_index('ix_users_bogus', 'users', ['locale'])
+    assert upgrade.index_exists('users', 'ix_users_bogus')
+    assert not upgrade.create_index('ix_users_bogus', 'users', ['locale'])
+    assert not upgrade.create_index('ix_bogus', 'bogus', ['id'])
+
+    upgrade.commit()
+    upgrade = UpgradeContext(pg_config.dbsession)
+    assert upgrade.create_index(
+        'ix_users_bogus_concurrently', 'users', ['locale'], concurrently=True
+    )
+    assert not upgrade.create_index(
+        'ix_users_bogus_concurrently', 'users', ['locale'], concurrently=True
+    )
+    assert upgrade.index_exists('users', 'ix_users_bogus_concurrently')
@@ -15,12 +15,15 @@ from privatim import main
 from privatim.file.setup import setup_filestorage
 from privatim.models import User, WorkingGroup
 from privatim.models.consultation import Consultation
+from privatim.models.profile_pic import profile_pic_cache
 from privatim.mtan_tool import MTanTool
 from privatim.orm import Base, get_engine, get_session_factory, get_tm_session
+from privatim.security import identity_cache
 from privatim.testing import (
     DummyRequest, DummyMailer, DummySMSGateway, MockRequests
 )
 from tests.shared.client import Client
+from tests.shared.postmark import start_postmark_stand_in
 
 
 # --- Helper Functions ---
@@ -67,6 +70,9 @@ def pg_config(postgresql, monkeypatch):
     config.dbsession = dbsession
 
     setup_filestorage(settings)
+    # the database is recreated for every test
+    profile_pic_cache.clear()
+    identity_cache.clear()
 
     orig_init = DummyRequest.__init__
 
@@ -135,6 +141,14 @@ def mailer(pg_config):
     return mailer
 
 
+@pytest.fixture()
+def postmark_server():
+    server = start_postmark_stand_in()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
 @pytest.fixture
 def sms_gateway(pg_config):
     gateway = DummySMSGateway()
@@ -174,6 +188,7 @@ def app_settings(postgresql):
 
 @pytest.fixture(scope='function')
 def app_inner(app_settings):
+    identity_cache.clear()
     app = main({}, **app_settings)
     yield app
 
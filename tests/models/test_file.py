@@ -0,0 +1,61 @@
+from io import BytesIO
+from PIL import Image
+from sqlalchemy import func, select
+
+
+from privatim.models import GeneralFile, ImageVariant
+from privatim.models.file import IMAGE_VARIANT_SIZES, scale_image
+from tests.shared.utils import create_png
+
+
+def test_scale_image():
+    variants = scale_image(create_png(600, 300))
+    assert [size for size, _, _ in variants] == list(IMAGE_VARIANT_SIZES)
+    for size, content_type, content in variants:
+        assert content_type == 'image/webp'
+        img = Image.open(BytesIO(content))
+        # cropped to a square
+        assert img.size == (size, size)
+
+    assert scale_image(b'Not an image') == []
+
+
+def create_large_png(width, height):
+    # a single bit per pixel keeps the file small
+    output = BytesIO()
+    Image.new('1', (width, height)).save(output, format='PNG')
+    return output.getvalue()
+
+
+def test_scale_image_too_large(monkeypatch):
+    assert scale_image(create_large_png(6000, 5000)) == []
+
+    # Pillow refuses to open decompression bombs
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    assert scale_image(create_png(300, 300)) == []
+
+
+def test_scale_image_jpeg():
+    output = BytesIO()
+    Image.new('RGB', (2000, 1000), 'red').save(output, format='JPEG')
+    variants = scale_image(output.getvalue())
+    assert [
+        Image.open(BytesIO(content)).size for __, __, content in variants
+    ] == [(size, size) for size in IMAGE_VARIANT_SIZES]
+
+
+def test_general_file_variants(session):
+    content = create_png(600, 300)
+    general_file = GeneralFile('pic.png', content)
+    general_file.generate_variants(content)
+    session.add(general_file)
+    session.flush()
+    session.expire_all()
+
+    general_file = session.get(GeneralFile, general_file.id)
+    assert sorted(v.size for v in general_file.variants) == [40, 80, 250]
+
+    # the variants go with the file
+    session.delete(general_file)
+    session.flush()
+    assert session.scalar(select(func.count(ImageVariant.size))) == 0
@@ -91,3 +91,58 @@ def test_agenda_item_relationship_with_meeting(session):
     assert 'Budget Overview' in [
         item.title for item in stored_agenda_item.meeting.agenda_items
     ]
+
+
+def test_copy_agenda_items_from_meeting(session):
+    date = datetime(2023, 5, 1, 12, 0, 0, tzinfo=timezone.utc)
+    group = WorkingGroup(name='Waffle Workshop Group', users=[])
+    source = Meeting(
+        name='Source', time=date, attendees=[], working_group=group
+    )
+    target = Meeting(
+        name='Target', time=date, attendees=[], working_group=group
+    )
+    session.add_all([source, target])
+    session.flush()
+
+    # positions with gaps on purpose, the copy should compact them
+    for position, title in ((3, 'Second'), (1, 'First'), (7, 'Third')):
+        session.add(AgendaItem(
+            title=title,
+            description=f'{title} description',
+            meeting=source,
+            position=position,
+        ))
+    session.add(AgendaItem(
+        title='Existing',
+        description='',
+        meeting=target,
+        position=0,
+    ))
+    session.flush()
+
+    copied = AgendaItem.copy_from_meeting(
+        session, source.id, target, copy_description=False
+    )
+    assert copied == 3
+
+    items = session.execute(
+        select(AgendaItem)
+        .where(AgendaItem.meeting_id == target.id)
+        .order_by(AgendaItem.position)
+    ).scalars().all()
+    assert [(item.title, item.position) for item in items] == [
+        ('Existing', 0),
+        ('First', 1),
+        ('Second', 2),
+        ('Third', 3),
+    ]
+    assert all(item.description == '' for item in items)
+    assert len({item.id for item in items}) == 4
+    # the target's collection is reloaded with the new items
+    assert [item.title for item in target.agenda_items] == [
+        'Existing', 'First', 'Second', 'Third'
+    ]
+
+    # the source meeting is left untouched
+    assert len(source.agenda_items) == 3
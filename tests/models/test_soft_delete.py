@@ -0,0 +1,87 @@
+import transaction
+from sqlalchemy import event, select
+from sqlalchemy.orm.attributes import instance_state
+
+from privatim.models import Consultation, SearchableFile, User
+from tests.shared.utils import create_consultation
+
+
+def count_statements(session):
+    statements = []
+
+    @event.listens_for(session.bind, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    return statements
+
+
+def create_chain(session, length=3):
+    user = User(email='chain@example.org')
+    consultation = None
+    for i in range(length):
+        if consultation is not None:
+            consultation.is_latest_version = 0
+        consultation = create_consultation(
+            title=f'Version {i}',
+            user=user,
+            previous_version=consultation,
+        )
+        session.add(consultation)
+        session.flush()
+    return consultation
+
+
+def test_soft_delete_consultation_chain(session):
+    latest = create_chain(session)
+    consultation_id = latest.id
+    session.flush()
+    session.expire_all()
+
+    latest = session.get(Consultation, consultation_id)
+    statements = count_statements(session)
+    session.delete(latest, soft=True)
+    session.flush()
+
+    # the versions and the files are updated in bulk, without loading them
+    assert len(statements) == 4
+    assert statements[-1].startswith('UPDATE searchable_files')
+    assert 'files' in instance_state(latest).unloaded
+    assert latest.deleted is True
+
+    with session.no_soft_delete_filter(), session.no_consultation_filter():
+        consultations = session.scalars(select(Consultation)).all()
+        assert len(consultations) == 3
+        assert all(c.deleted for c in consultations)
+        files = session.scalars(select(SearchableFile)).all()
+        assert len(files) == 6
+        assert all(f.deleted for f in files)
+
+    assert session.scalars(select(Consultation)).all() == []
+    assert session.scalars(select(SearchableFile)).all() == []
+
+    # restoring any version restores the whole chain
+    first = next(c for c in consultations if c.title == 'Version 0')
+    first.revert_soft_delete()
+    session.flush()
+    assert not any(c.deleted for c in consultations)
+    assert not any(f.deleted for f in files)
+    assert session.scalars(select(Consultation)).one() is latest
+    assert len(session.scalars(select(SearchableFile)).all()) == 6
+
+
+def test_soft_delete_is_committed(session):
+    consultation = create_consultation()
+    session.add(consultation)
+    session.flush()
+    consultation_id = consultation.id
+    transaction.commit()
+
+    # nothing but the bulk updates changes in this transaction
+    session.delete(session.get(Consultation, consultation_id), soft=True)
+    transaction.commit()
+
+    with session.no_soft_delete_filter():
+        assert session.get(Consultation, consultation_id).deleted is True
+        files = session.scalars(select(SearchableFile)).all()
+        assert [f.deleted for f in files] == [True, True]
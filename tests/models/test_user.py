@@ -1,9 +1,12 @@
+import transaction
 from io import BytesIO
 from PIL import Image
 
 
 from privatim.models import User, WorkingGroup, Group, GeneralFile
+from privatim.models.profile_pic import profile_pic_cache
 from sqlalchemy import select
+from tests.shared.utils import count_statements
 
 
 def test_set_password(pg_config):
@@ -131,3 +134,51 @@ def test_generate_profile_picture(session):
     img = Image.open(BytesIO(user.profile_pic.content))
     assert img.size == (250, 250)
     assert img.mode == 'RGB'
+
+
+def test_profile_pic_cache(session):
+    user = User(
+        email='john.doe@example.com', first_name='John', last_name='Doe'
+    )
+    session.add(user)
+    session.flush()
+    user_id = str(user.id)
+
+    cache = profile_pic_cache
+    default_id = cache.pic_id(session, user_id)
+    assert default_id == str(user.picture.id)
+    assert cache.default_pic_id(session) == default_id
+
+    # the default picture is only resolved once
+    with count_statements(session) as statements:
+        assert cache.pic_id(session, user_id) == default_id
+    assert statements == []
+
+    user.profile_pic = GeneralFile('custom.png', b'custom_pic_data')
+    session.flush()
+    # uncommitted changes are not visible yet
+    assert cache.pic_id(session, user_id) == default_id
+
+    transaction.commit()
+    custom_id = cache.pic_id(session, user_id)
+    assert custom_id != default_id
+    assert custom_id == str(session.get(User, user_id).profile_pic_id)
+
+    session.delete(session.get(GeneralFile, custom_id))
+    transaction.commit()
+    assert cache.pic_id(session, user_id) == default_id
+
+
+def test_fullname_and_is_admin_expressions(session):
+    users = [
+        User(email='jane@example.com', first_name='Jane', last_name='Doe'),
+        User(email='admin@example.com', first_name='Site', last_name='ADMIN'),
+        User(email='nameless@example.com', abbrev='NL'),
+    ]
+    session.add_all(users)
+    session.flush()
+
+    for user in users:
+        assert session.execute(
+            select(User.fullname, User.is_admin).filter_by(id=user.id)
+        ).one() == (user.fullname, user.is_admin)
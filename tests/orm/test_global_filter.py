@@ -1,6 +1,7 @@
-from sqlalchemy import select
+from sqlalchemy import event, select
 from privatim.models import User, SearchableFile
 from privatim.models.consultation import Consultation
+from privatim.orm.instrumentation import collect_sql_stats, instrument_engine
 from tests.shared.utils import create_consultation
 
 
@@ -88,3 +89,70 @@ def test_filtered_session_soft_delete_consultation(session):
             SearchableFile.filename == 'document1.txt'
         )).scalars().all()
         assert len(files) == 1
+
+
+def test_filter_criteria_use_the_compiled_cache(session):
+    instrument_engine(session.bind)
+    session.execute(select(Consultation)).all()
+
+    with collect_sql_stats() as stats:
+        for __ in range(3):
+            session.execute(select(Consultation)).all()
+            with session.no_soft_delete_filter():
+                session.execute(select(Consultation)).all()
+
+    assert stats.cache_hits >= 5
+    assert stats.cache_misses <= 1
+
+
+def explain(session, stmt):
+    """ Returns the query plan of the statement, as issued by the session
+    including the global filters. """
+    statements = []
+
+    @event.listens_for(session.bind, 'before_cursor_execute')
+    def capture(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    try:
+        session.execute(stmt).all()
+    finally:
+        event.remove(session.bind, 'before_cursor_execute', capture)
+
+    statement, parameters = statements[-1]
+    connection = session.connection()
+    # the tables are tiny, which would make a sequential scan the cheapest
+    connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    return '\n'.join(
+        row[0] for row in connection.exec_driver_sql(
+            f'EXPLAIN {statement}', parameters
+        )
+    )
+
+
+def test_partial_indexes_match_the_global_filter(session):
+    consultation = create_consultation()
+    session.add(consultation)
+    session.flush()
+
+    plan = explain(
+        session,
+        select(Consultation).order_by(Consultation.created.desc()).limit(10)
+    )
+    assert 'ix_consultations_latest_created' in plan
+
+    plan = explain(
+        session,
+        select(SearchableFile).where(
+            SearchableFile.consultation_id == consultation.id
+        )
+    )
+    assert 'ix_searchable_files_consultation_id_not_deleted' in plan
+
+    plan = explain(
+        session,
+        select(SearchableFile).where(
+            SearchableFile.meeting_id == consultation.id
+        )
+    )
+    assert 'ix_searchable_files_meeting_id_not_deleted' in plan
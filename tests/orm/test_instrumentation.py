@@ -0,0 +1,77 @@
+import logging
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import ProgrammingError
+
+from privatim.models import User
+from privatim.orm.instrumentation import (
+    collect_sql_stats, instrument_engine, statement_shape)
+
+
+def test_statement_shape():
+    assert statement_shape(
+        'SELECT users.id FROM users\n  WHERE users.id IN '
+        '(%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)'
+    ) == statement_shape(
+        'SELECT users.id FROM users WHERE users.id IN (%(id_1_1)s)'
+    )
+
+
+def test_collect_sql_stats(session):
+    instrument_engine(session.bind)
+    users = [User(email=f'{i}@example.org') for i in range(3)]
+    session.add_all(users)
+    session.flush()
+
+    # statements outside of the context manager aren't recorded
+    session.execute(select(User)).all()
+
+    with collect_sql_stats() as stats:
+        session.execute(select(User.id)).all()
+        for user in users:
+            session.execute(select(User).where(User.id == user.id)).one()
+
+    assert stats.statements == 4
+    assert stats.rows == 6
+    assert stats.duration > 0
+    assert stats.repeated(threshold=3) == []
+    [(shape, count)] = stats.repeated(threshold=2)
+    assert count == 3
+    assert shape.startswith('SELECT users.')
+    assert stats.summary(2).startswith('statements=4; ')
+
+
+def test_collect_sql_stats_failed_statement(session):
+    instrument_engine(session.bind)
+    connection = session.connection()
+
+    with collect_sql_stats() as stats:
+        with pytest.raises(ProgrammingError):
+            with connection.begin_nested():
+                connection.execute(text('SELECT * FROM missing_table'))
+        connection.execute(text('SELECT 1')).all()
+
+    # the failed statement leaves nothing behind on the connection
+    assert 'sql_stats_start' not in connection.info
+    assert stats.statements >= 1
+    assert stats.rows == 1
+
+
+@pytest.fixture(scope='function')
+def app_settings(app_settings):
+    app_settings['sql_stats.enabled'] = 'true'
+    app_settings['sql_stats.header'] = 'true'
+    app_settings['sql_stats.repeat_threshold'] = '1'
+    yield app_settings
+
+
+def test_sql_stats_tween(client, engine, caplog):
+    # the test app is bound to a connection of this engine
+    instrument_engine(engine)
+    client.login_admin()
+    with caplog.at_level(logging.INFO, logger='privatim.sql_stats'):
+        page = client.get('/people')
+
+    assert page.headers['X-SQL-Stats'].startswith('statements=')
+    assert 'statements=0;' not in page.headers['X-SQL-Stats']
+    assert 'GET /people: statements=' in caplog.text
@@ -0,0 +1,89 @@
+import pytest
+import transaction
+from pyramid.response import Response
+from sqlalchemy import create_engine, select, text
+
+from privatim.models import User
+from privatim.orm import Base, get_session_factory, get_tm_session
+from privatim.orm.replica import PIN_COOKIE, ReplicaRouting
+from privatim.testing import DummyRequest
+
+
+@pytest.fixture(scope='function')
+def replica(pg_config, postgresql):
+    # a second database on the same server stands in for the replica
+    primary = pg_config.dbsession.bind
+    with primary.connect().execution_options(
+        isolation_level='AUTOCOMMIT'
+    ) as connection:
+        connection.execute(text('DROP DATABASE IF EXISTS replica'))
+        connection.execute(text('CREATE DATABASE replica'))
+
+    engine = create_engine(primary.url.set(database='replica'))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+    with primary.connect().execution_options(
+        isolation_level='AUTOCOMMIT'
+    ) as connection:
+        connection.execute(text('DROP DATABASE replica'))
+
+
+def test_replica_session(pg_config, replica):
+    primary = pg_config.dbsession.bind
+    for engine, email in ((primary, 'primary'), (replica, 'replica')):
+        session = get_session_factory(engine)()
+        session.add(User(email=f'{email}@example.org'))
+        session.commit()
+        session.close()
+
+    factory = get_session_factory(primary, replica)
+    query = select(User.email)
+    with transaction.manager:
+        session = get_tm_session(factory, transaction.manager)
+        assert session.scalars(query).all() == ['primary@example.org']
+
+    with transaction.manager:
+        session = get_tm_session(
+            factory, transaction.manager, use_replica=True
+        )
+        assert session.scalars(query).all() == ['replica@example.org']
+
+        # writes go to the primary, as do all reads afterwards
+        session.add(User(email='new@example.org'))
+        session.flush()
+        assert set(session.scalars(query)) == {
+            'primary@example.org', 'new@example.org'
+        }
+
+    with transaction.manager:
+        session = get_tm_session(
+            factory, transaction.manager, use_replica=True
+        )
+        # locking reads go to the primary as well
+        assert session.scalars(query.with_for_update()).all()
+        assert 'replica@example.org' not in session.scalars(query).all()
+
+
+def test_replica_routing():
+    routing = ReplicaRouting(routes=('search',), sticky_seconds=5)
+
+    def request(method='GET', route='search', cookies=None):
+        request = DummyRequest(cookies=cookies)
+        request.method = method
+        request.matched_route = type('Route', (), {'name': route})()
+        return request
+
+    assert routing.use_replica(request())
+    assert not routing.use_replica(request(route='people'))
+
+    post = request(method='POST')
+    assert not routing.use_replica(post)
+    response = Response()
+    for callback in post.response_callbacks:
+        callback(post, response)
+    assert f'{PIN_COOKIE}=1' in response.headers['Set-Cookie']
+    assert 'Max-Age=5' in response.headers['Set-Cookie']
+
+    assert not routing.use_replica(request(cookies={PIN_COOKIE: '1'}))
@@ -0,0 +1,61 @@
+import pytest
+from pyramid.testing import DummyRequest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+
+from privatim.orm import get_engine, get_session_factory
+from privatim.orm.timeouts import StatementTimeouts, apply_timeouts
+
+
+def test_statement_timeouts_from_settings():
+    timeouts = StatementTimeouts.from_settings({
+        'db.statement_timeout': '5000',
+        'db.statement_timeout.search': '1000',
+        'db.statement_timeout.people': '2000',
+        'db.idle_in_transaction_session_timeout': '30000',
+        'db.idle_in_transaction_session_timeout.people': '0',
+    })
+    assert timeouts.for_route(None) == (5000, 30000)
+    assert timeouts.for_route('meeting') == (5000, 30000)
+    assert timeouts.for_route('search') == (1000, 30000)
+    assert timeouts.for_route('people') == (2000, 0)
+    # the defaults of the expensive routes are kept
+    assert timeouts.for_route('activities') == (15000, 30000)
+    # the exports stay idle in their transaction while rendering
+    assert timeouts.for_route('export_meeting_as_pdf_view') == (
+        60000, 600000
+    )
+
+    request = DummyRequest()
+    request.matched_route = None
+    assert timeouts.for_request(request) == (5000, 30000)
+
+
+def test_apply_timeouts(pg_config):
+    session = get_session_factory(pg_config.dbsession.bind)()
+    apply_timeouts(session, 200, 1000)
+
+    assert session.scalar(text('SHOW statement_timeout')) == '200ms'
+    assert session.scalar(
+        text('SHOW idle_in_transaction_session_timeout')
+    ) == '1s'
+
+    with pytest.raises(OperationalError, match='statement timeout'):
+        session.execute(text('SELECT pg_sleep(1)'))
+    session.close()
+
+
+def test_pgbouncer_mode():
+    settings = {
+        'sqlalchemy.url': 'postgresql+psycopg://localhost/privatim',
+        'db.pgbouncer': 'true',
+        # the options of the connection pool are ignored
+        'sqlalchemy.pool_size': '3',
+        'sqlalchemy.max_overflow': '5',
+        'sqlalchemy.pool_timeout': '10',
+    }
+    assert isinstance(get_engine(settings).pool, NullPool)
+
+    del settings['db.pgbouncer']
+    assert get_engine(settings).pool.size() == 3
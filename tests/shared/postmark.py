@@ -0,0 +1,73 @@
+import json
+import threading
+from email.headerregistry import Address
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from privatim.mail import PostmarkMailer
+
+
+class PostmarkStandIn(BaseHTTPRequestHandler):
+    """ Answers with the queued responses and records the requests.
+
+    A queued response is a tuple of the status, the headers and the JSON
+    data, or bytes which are sent as they are.
+
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def default_response(self, body):
+        message = {'MessageID': 'id', 'ErrorCode': 0}
+        if isinstance(body, dict) and 'Messages' in body:
+            body = body['Messages']
+        if isinstance(body, list):
+            return 200, {}, [message] * len(body)
+        return 200, {}, message
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        body = json.loads(self.rfile.read(length))
+        server = self.server
+        server.requests.append((self.path, self.client_address, body))
+        status, headers, data = (
+            server.responses.pop(0) if server.responses
+            else self.default_response(body)
+        )
+        if isinstance(data, bytes):
+            payload = data
+            content_type = 'text/html'
+        else:
+            payload = json.dumps(data).encode('utf-8')
+            content_type = 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_postmark_stand_in():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PostmarkStandIn)
+    server.requests = []
+    server.responses = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stand_in_mailer(url, **kwargs):
+    return PostmarkMailer(
+        Address(addr_spec='nr@example.com'),
+        'secret-token',
+        'development',
+        api_url=url,
+        backoff_factor=0,
+        **kwargs
+    )
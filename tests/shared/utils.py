@@ -1,6 +1,9 @@
 import hashlib
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
+from io import BytesIO
+from PIL import Image
 from privatim.layouts.layout import DEFAULT_TIMEZONE
 from privatim.models import (
     Meeting,
@@ -11,10 +14,12 @@ from privatim.models import (
 )
 from privatim.models.file import SearchableFile
 from privatim.testing import DummyRequest
+from sqlalchemy import event
 
 
 from typing import TYPE_CHECKING, Any
 if TYPE_CHECKING:
+    from collections.abc import Iterator
     from sqlalchemy.orm import Session
 
 
@@ -175,6 +180,12 @@ class CustomDummyRequest(DummyRequest):
         return f'{self.host}/static/{path}'
 
 
+def create_png(width: int, height: int, color: str = 'red') -> bytes:
+    output = BytesIO()
+    Image.new('RGB', (width, height), color).save(output, format='PNG')
+    return output.getvalue()
+
+
 def hash_file(file_bytes: bytes, hash_algorithm: str = 'sha256') -> str:
     hash_func = hashlib.new(hash_algorithm)
     hash_func.update(file_bytes)
@@ -221,3 +232,29 @@ def aktionen_button_edit_click(page):
     bearbeiten_link = page.locator('.dropdown-menu a:has-text("Bearbeiten")')
     bearbeiten_link.wait_for(state="visible", timeout=5000)
     bearbeiten_link.click()
+
+
+@contextmanager
+def count_statements(session: 'Session') -> 'Iterator[list[str]]':
+    """ Collects the SQL statements emitted through the session's engine.
+
+    For example::
+
+        with count_statements(session) as statements:
+            meeting_view(context, request)
+        assert len(statements) <= 6
+
+    """
+    engine = session.get_bind()
+    statements: list[str] = []
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
@@ -0,0 +1,99 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+
+from privatim.sms.daemon import SMSDeliveryDaemon
+from privatim.sms.daemon import serve_status
+from privatim.sms.delivery import QueuedSMSDelivery
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def daemon(smsdir):
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    daemon = SMSDeliveryDaemon(delivery, coalesce=0.2, poll_interval=60)
+    daemon.runs = 0
+    deliver = daemon.deliver
+
+    def counting_deliver():
+        deliver()
+        daemon.runs += 1
+
+    daemon.deliver = counting_deliver
+    thread = threading.Thread(target=daemon.run)
+    thread.start()
+    wait_for(lambda: daemon.runs == 1)
+    yield daemon
+    daemon.stop()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+@patch('requests.Session.post')
+def test_daemon_delivers_queued_messages(post, smsdir, gateway, daemon):
+    post.return_value = MagicMock(
+        json=lambda: {'StatusInfo': 'OK', 'StatusCode': '1'}
+    )
+    assert daemon.healthy()
+
+    # a burst of messages is sent together
+    for index in range(5):
+        gateway.send(
+            receivers=[f'+4100000{index:02d}'], content=f'Code {index}'
+        )
+    wait_for(lambda: not smsdir.messages() and post.call_count == 5)
+    # each message has been sent exactly once
+    assert sorted(
+        call.kwargs['json']['Recipients'][0]
+        for call in post.call_args_list
+    ) == [f'+4100000{index:02d}' for index in range(5)]
+    assert daemon.healthy()
+
+
+def test_daemon_ignores_hidden_files(smsdir):
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    daemon = SMSDeliveryDaemon(delivery)
+    daemon.notify(f'{smsdir.path}/.sending-abc.json')
+    daemon.notify(f'{smsdir.path}/.rejected-abc.json')
+    daemon.notify(f'{smsdir.path}/abc.tmp')
+    assert not daemon.wakeup.is_set()
+    daemon.notify(f'{smsdir.path}/abc.json')
+    assert daemon.wakeup.is_set()
+
+    # not started yet
+    assert not daemon.healthy()
+
+
+def test_serve_status(daemon):
+    server = serve_status(daemon, '127.0.0.1', 0)
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        with urllib.request.urlopen(f'{url}/health') as response:
+            assert response.read() == b'OK'
+
+        with urllib.request.urlopen(f'{url}/metrics') as response:
+            assert b'privatim_sms_queue_depth 0.0' in response.read()
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'{url}/other')
+        assert error.value.code == 404
+
+        daemon.last_delivery -= 1000
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'{url}/health')
+        assert error.value.code == 503
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,10 +1,20 @@
+import argparse
+import os
+import pytest
+import requests
+import threading
+import time
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 from privatim.sms.delivery import QueuedSMSDelivery
+from privatim.sms.delivery import add_delivery_arguments
+from privatim.sms.delivery import MAX_RECIPIENTS
+from privatim.sms.delivery import TIMEOUT
+from privatim.sms.delivery import TokenBucket
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_send_messages(post, smsdir, gateway):
     delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
     assert len(smsdir.messages()) == 0
@@ -25,10 +35,10 @@ def test_send_messages(post, smsdir, gateway):
         'Recipients': ['+410000000'],
         'MessageText': 'My message'
     }
-    post.assert_called_with(url, json=json)
+    post.assert_called_with(url, json=json, timeout=TIMEOUT)
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_send_messages_encoding(post, smsdir, gateway):
     delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
 
@@ -47,10 +57,10 @@ def test_send_messages_encoding(post, smsdir, gateway):
         'Recipients': ['+410000000'],
         'MessageText': 'Viel Gl\xfcck'
     }
-    post.assert_called_with(url, json=json)
+    post.assert_called_with(url, json=json, timeout=TIMEOUT)
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_send_messages_sender(post, smsdir, gateway):
     delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
 
@@ -69,10 +79,10 @@ def test_send_messages_sender(post, smsdir, gateway):
         'Recipients': ['+410000023'],
         'MessageText': 'Test'
     }
-    post.assert_called_with(url, json=json)
+    post.assert_called_with(url, json=json, timeout=TIMEOUT)
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_send_messages_sender_encoding(post, smsdir, gateway):
     delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
 
@@ -91,16 +101,400 @@ def test_send_messages_sender_encoding(post, smsdir, gateway):
         'Recipients': ['+410000023'],
         'MessageText': 'Test'
     }
-    post.assert_called_with(url, json=json)
+    post.assert_called_with(url, json=json, timeout=TIMEOUT)
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_send_messages_error(post, smsdir, gateway, caplog):
     delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
     post.return_value = MagicMock(json=lambda: {'StatusInfo': 'ERROR'})
     gateway.send(receivers=['+410000000'], content='My message')
     delivery.send_messages()
-    assert len(smsdir.messages()) == 1
-    assert 'Error while sending SMS' in caplog.text
+    # the rejected message is kept, but not sent again
+    assert len(smsdir.messages()) == 0
+    assert len(rejected_messages(smsdir)) == 1
+    assert not locked_messages(smsdir)
+    assert 'was rejected' in caplog.text
     msg = 'Sending SMS failed, got: "{\'StatusInfo\': \'ERROR\'}'
     assert msg in caplog.text
+
+    delivery.send_messages()
+    assert post.call_count == 1
+
+
+def locked_messages(smsdir):
+    return [
+        name for name in os.listdir(smsdir.path)
+        if name.startswith('.sending-')
+    ]
+
+
+def rejected_messages(smsdir):
+    return [
+        name for name in os.listdir(smsdir.path)
+        if name.startswith('.rejected-')
+    ]
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return response
+
+
+@pytest.mark.parametrize('error, retried', [
+    (requests.ConnectionError(), True),
+    (requests.ConnectTimeout(), True),
+    (http_error(429), True),
+    (http_error(503), True),
+    (requests.ReadTimeout(), False),
+    (ValueError('Invalid JSON'), False),
+])
+@patch('requests.Session.post')
+def test_send_messages_failure(post, smsdir, gateway, error, retried):
+    if isinstance(error, requests.Response):
+        post.return_value = error
+    else:
+        post.side_effect = error
+    gateway.send(receivers=['+410000001'], content='Code 1234')
+
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    delivery.send_messages()
+    assert len(smsdir.messages()) == 1
+    assert not rejected_messages(smsdir)
+    # after a transient error the message was not sent and is retried,
+    # otherwise it might have been sent and stays locked until
+    # MAX_SEND_TIME has passed
+    assert bool(locked_messages(smsdir)) is not retried
+
+    delivery.send_messages()
+    assert post.call_count == (2 if retried else 1)
+
+
+@patch('requests.Session.post')
+def test_send_messages_client_error(post, smsdir, gateway):
+    post.return_value = http_error(401)
+    gateway.send(receivers=['+410000001'], content='Code 1234')
+
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    delivery.send_messages()
+    assert len(smsdir.messages()) == 0
+    assert len(rejected_messages(smsdir)) == 1
+
+
+class RecordingAPI:
+    """ Records the recipients and the number of concurrent calls. """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.recipients = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, url, json, timeout):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+            self.recipients.extend(json['Recipients'])
+        return MagicMock(
+            json=lambda: {'StatusInfo': 'OK', 'StatusCode': '1'}
+        )
+
+
+@patch('requests.Session.post')
+def test_send_messages_concurrently(post, smsdir, gateway):
+    post.side_effect = api = RecordingAPI(delay=0.05)
+    for index in range(12):
+        gateway.send(
+            receivers=[f'+4100000{index:02d}'], content=f'Code {index}'
+        )
+
+    delivery = QueuedSMSDelivery(
+        smsdir.path, 'username', 'password', workers=4
+    )
+    delivery.send_messages()
+    assert len(smsdir.messages()) == 0
+    assert os.listdir(smsdir.path) == []
+    assert sorted(api.recipients) == [
+        f'+4100000{index:02d}' for index in range(12)
+    ]
+    assert 1 < api.max_active <= 4
+
+
+@patch('requests.Session.post')
+def test_send_messages_shared_queue(post, smsdir, gateway):
+    post.side_effect = api = RecordingAPI(delay=0.01)
+    for index in range(20):
+        gateway.send(
+            receivers=[f'+4100000{index:02d}'], content=f'Code {index}'
+        )
+
+    deliveries = [
+        QueuedSMSDelivery(smsdir.path, 'username', 'password', workers=3)
+        for __ in range(3)
+    ]
+    threads = [
+        threading.Thread(target=delivery.send_messages)
+        for delivery in deliveries
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # every message has been sent exactly once
+    assert sorted(api.recipients) == [
+        f'+4100000{index:02d}' for index in range(20)
+    ]
+    assert os.listdir(smsdir.path) == []
+
+
+@patch('requests.Session.post')
+def test_send_messages_skips_locked(post, smsdir, gateway):
+    post.side_effect = api = RecordingAPI()
+    gateway.send(receivers=['+410000000'], content='Sending')
+    filename, = smsdir.filenames()
+    head, tail = os.path.split(filename)
+    # another worker is sending this message
+    os.link(filename, os.path.join(head, '.sending-' + tail))
+
+    gateway.send(receivers=['+410000001'], content='')  # rejected
+
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    delivery.send_messages()
+    delivery.send_messages()
+    assert api.recipients == []
+    assert len(smsdir.messages()) == 1
+    assert sorted(
+        name.split('-')[0] for name in os.listdir(smsdir.path)
+    ) == ['.rejected', '.sending', tail]
+
+
+def test_token_bucket():
+    now = 0.0
+    sleeps = []
+
+    def sleep(seconds):
+        nonlocal now
+        sleeps.append(seconds)
+        now += seconds
+
+    bucket = TokenBucket(rate=2, burst=2, clock=lambda: now, sleep=sleep)
+    bucket.acquire()
+    bucket.acquire()
+    assert sleeps == []
+
+    # the burst is used up, we have to wait for the next token
+    bucket.acquire()
+    assert sleeps == [0.5]
+    bucket.acquire()
+    assert sleeps == [0.5, 0.5]
+
+    # the tokens are refilled up to the burst
+    now += 10
+    bucket.acquire()
+    bucket.acquire()
+    assert sleeps == [0.5, 0.5]
+
+
+@patch('requests.Session.post')
+def test_send_messages_rate_limit(post, smsdir, gateway):
+    post.side_effect = RecordingAPI()
+    for index in range(3):
+        gateway.send(
+            receivers=[f'+4100000{index:02d}'], content=f'Code {index}'
+        )
+
+    delivery = QueuedSMSDelivery(
+        smsdir.path, 'username', 'password', rate=20, burst=1
+    )
+    start = time.monotonic()
+    delivery.send_messages()
+    # the first message is sent right away, the others 50ms apart
+    assert time.monotonic() - start >= 0.1
+    assert len(smsdir.messages()) == 0
+
+
+@patch('requests.Session.post')
+def test_send_messages_grouped(post, smsdir, gateway):
+    post.side_effect = RecordingAPI()
+    gateway.send(receivers=['+410000001'], content='Meeting at 10')
+    gateway.send(
+        receivers=['+410000002', '+410000001'], content='Meeting at 10'
+    )
+    gateway.send(receivers=['+410000003'], content='Meeting at 10', sender='X')
+    gateway.send(receivers=['+410000004'], content='Code 1234')
+
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    delivery.send_messages()
+    assert os.listdir(smsdir.path) == []
+    assert post.call_count == 3
+    calls = sorted(
+        (call.kwargs['json']['Originator'],
+         call.kwargs['json']['MessageText'],
+         call.kwargs['json']['Recipients'])
+        for call in post.call_args_list
+    )
+    assert calls == [
+        ('Privatim', 'Code 1234', ['+410000004']),
+        ('Privatim', 'Meeting at 10', ['+410000001', '+410000002']),
+        ('X', 'Meeting at 10', ['+410000003']),
+    ]
+
+
+@patch('requests.Session.post')
+def test_send_messages_grouped_within_window(post, smsdir, gateway):
+    post.side_effect = RecordingAPI()
+    gateway.send(receivers=['+410000001'], content='Reminder')
+    old, = smsdir.filenames()
+    os.utime(old, (time.time() - 60, time.time() - 60))
+    gateway.send(receivers=['+410000002'], content='Reminder')
+
+    delivery = QueuedSMSDelivery(
+        smsdir.path, 'username', 'password', group_window=5
+    )
+    delivery.send_messages()
+    assert post.call_count == 2
+
+
+@patch('requests.Session.post')
+def test_send_messages_grouped_recipient_limit(post, smsdir, gateway):
+    post.side_effect = api = RecordingAPI()
+    for index in range(MAX_RECIPIENTS + 1):
+        gateway.send(receivers=[f'+41000{index:04d}'], content='Broadcast')
+
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    delivery.send_messages()
+    assert post.call_count == 2
+    assert len(api.recipients) == MAX_RECIPIENTS + 1
+    assert os.listdir(smsdir.path) == []
+
+
+@patch('requests.Session.post')
+def test_send_messages_grouped_error(post, smsdir, gateway, caplog):
+    post.return_value = MagicMock(json=lambda: {'StatusInfo': 'ERROR'})
+    gateway.send(receivers=['+410000001'], content='Meeting at 10')
+    gateway.send(receivers=['+410000002'], content='Meeting at 10')
+
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    delivery.send_messages()
+    # the group, then each message on its own
+    assert post.call_count == 3
+    # both messages are rejected and not sent again
+    assert len(smsdir.messages()) == 0
+    assert len(rejected_messages(smsdir)) == 2
+    assert not locked_messages(smsdir)
+    assert 'sending them one by one' in caplog.text
+
+    delivery.send_messages()
+    assert post.call_count == 3
+
+
+@patch('requests.Session.post')
+def test_send_messages_grouped_invalid_recipient(post, smsdir, gateway):
+    def api(url, json, timeout):
+        if '+41invalid' in json['Recipients']:
+            result = {'StatusInfo': 'Invalid number', 'StatusCode': '31'}
+        else:
+            result = {'StatusInfo': 'OK', 'StatusCode': '1'}
+        return MagicMock(json=lambda: result)
+
+    post.side_effect = api
+    gateway.send(receivers=['+410000001'], content='Meeting at 10')
+    gateway.send(receivers=['+41invalid'], content='Meeting at 10')
+    gateway.send(receivers=['+410000002'], content='Meeting at 10')
+    invalid = next(
+        filename for filename in smsdir.filenames()
+        if '+41invalid' in open(filename).read()
+    )
+
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    delivery.send_messages()
+    # the group is rejected, so each message is sent on its own
+    assert [
+        call.kwargs['json']['Recipients'] for call in post.call_args_list
+    ] == [
+        ['+410000001', '+41invalid', '+410000002'],
+        ['+410000001'],
+        ['+41invalid'],
+        ['+410000002'],
+    ]
+    # only the message of the invalid recipient is left, as rejected
+    assert smsdir.filenames() == []
+    assert rejected_messages(smsdir) == [
+        '.rejected-' + os.path.basename(invalid)
+    ]
+
+
+@patch('requests.Session.post')
+def test_send_messages_locks_each_batch(post, smsdir, gateway):
+    locked = []
+
+    def api(url, json, timeout):
+        locked.append(sorted(
+            name for name in os.listdir(smsdir.path)
+            if name.startswith('.sending-')
+        ))
+        return MagicMock(
+            json=lambda: {'StatusInfo': 'OK', 'StatusCode': '1'}
+        )
+
+    post.side_effect = api
+    for index in range(3):
+        gateway.send(
+            receivers=[f'+4100000{index:02d}'], content=f'Code {index}'
+        )
+
+    delivery = QueuedSMSDelivery(
+        smsdir.path, 'username', 'password', workers=1
+    )
+    delivery.send_messages()
+    # only the message in flight is locked
+    assert [len(names) for names in locked] == [1, 1, 1]
+    assert os.listdir(smsdir.path) == []
+
+
+@patch('requests.Session.post')
+def test_send_messages_grouped_acknowledged_separately(
+    post, smsdir, gateway, caplog
+):
+    post.side_effect = RecordingAPI()
+    gateway.send(receivers=['+410000001'], content='Meeting at 10')
+    gateway.send(receivers=['+410000002'], content='Meeting at 10')
+    first, second = sorted(smsdir.filenames(), key=os.path.getmtime)
+
+    delivery = QueuedSMSDelivery(smsdir.path, 'username', 'password')
+    remove_message = delivery._remove_message
+
+    def failing_remove(filename):
+        if filename == first:
+            raise OSError('Read-only file system')
+        remove_message(filename)
+
+    delivery._remove_message = failing_remove
+    delivery.send_messages()
+    assert post.call_count == 1
+    assert 'Error while removing the sent SMS' in caplog.text
+
+    # the message which could not be removed stays locked, the other one
+    # is acknowledged and neither is sent again
+    assert smsdir.filenames() == [first]
+    assert not os.path.exists(second)
+    delivery.send_messages()
+    assert post.call_count == 1
+
+
+def test_delivery_arguments():
+    parser = argparse.ArgumentParser()
+    add_delivery_arguments(parser)
+    args = parser.parse_args(['--config', 'development.ini'])
+    assert args.config == 'development.ini'
+    assert args.workers == 4
+
+    # the config is needed for the logging and the credentials
+    with pytest.raises(SystemExit):
+        parser.parse_args([])
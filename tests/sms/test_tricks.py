@@ -2,6 +2,7 @@ from unittest.mock import MagicMock
 from unittest.mock import patch
 from watchdog.events import FileCreatedEvent
 
+from privatim.sms.delivery import TIMEOUT
 from privatim.sms.tricks import SMSDeliveryTrick
 
 
@@ -17,7 +18,7 @@ def test_in_smsdir(tmpdir):
     assert not trick.in_smsdir(tmpdir.join('message.json'))
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_send_messages_on_init(post, smsdir, gateway):
     SMSDeliveryTrick(
         smsdir=smsdir.path,
@@ -46,10 +47,10 @@ def test_send_messages_on_init(post, smsdir, gateway):
         'Recipients': ['+410000000'],
         'MessageText': 'My message'
     }
-    post.assert_called_with(url, json=json)
+    post.assert_called_with(url, json=json, timeout=TIMEOUT)
 
 
-@patch('requests.post')
+@patch('requests.Session.post')
 def test_on_created(post, smsdir, gateway):
     trick = SMSDeliveryTrick(
         smsdir=smsdir.path,
@@ -75,4 +76,4 @@ def test_on_created(post, smsdir, gateway):
         'Recipients': ['+410000000'],
         'MessageText': 'My message'
     }
-    post.assert_called_with(url, json=json)
+    post.assert_called_with(url, json=json, timeout=TIMEOUT)
@@ -1,3 +1,5 @@
+import threading
+from privatim.cache import ProcessCache
 from privatim.cache import clear_instance_cache
 from privatim.cache import instance_cache
 
@@ -76,3 +78,58 @@ def test_clear_instance_cache():
     assert obj.method.cache(obj) == {}
     assert obj.method() == 'called'
     assert obj.calls == 2
+
+
+def test_process_cache():
+    cache = ProcessCache(maxsize=2, ttl=300)
+    loads = []
+
+    def load(value):
+        def load():
+            loads.append(value)
+            return value
+        return load
+
+    assert cache.get('a', load(1)) == 1
+    assert cache.get('a', load(2)) == 1
+    assert cache.get('b', load(None)) is None
+    assert cache.get('b', load(3)) is None
+    assert loads == [1, None]
+
+    # the least recently used entry is dropped
+    cache.get('a', load(4))
+    assert cache.get('c', load(5)) == 5
+    assert list(cache.entries) == ['a', 'c']
+
+    cache.invalidate('a')
+    assert cache.get('a', load(6)) == 6
+
+    # expired entries are loaded again
+    cache.ttl = -1
+    cache.get('d', load(7))
+    assert cache.get('d', load(8)) == 8
+
+
+def test_process_cache_threads():
+    cache = ProcessCache(maxsize=4, ttl=300)
+    errors = []
+
+    def use(offset):
+        try:
+            for index in range(2000):
+                key = (index + offset) % 8
+                cache.get(key, lambda: key)
+                cache.invalidate((key + 1) % 8)
+        except Exception as exception:
+            errors.append(exception)
+
+    threads = [
+        threading.Thread(target=use, args=(offset,)) for offset in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(cache.entries) <= 4
@@ -0,0 +1,44 @@
+import json
+import subprocess  # nosec:B404
+import sys
+
+import pytest
+
+
+HEAVY_MODULES = (
+    'bleach',
+    'docx',
+    'html2text',
+    'lxml',
+    'magic',
+    'pdftotext',
+    'PIL',
+    'weasyprint',
+)
+
+
+@pytest.mark.parametrize('module', [
+    'privatim',
+    'privatim.cli.apply_data_retention_policy',
+    'privatim.cli.deliver_mail',
+    'privatim.cli.purge_tokens',
+    'privatim.cli.upgrade',
+    'privatim.cli.user',
+    'privatim.sms.daemon',
+    'privatim.sms.delivery',
+    'privatim.sms.watchmedo',
+])
+def test_heavy_dependencies_are_imported_lazily(module):
+    # a fresh interpreter, the test session has imported everything already
+    code = (
+        f'import json, sys, {module}\n'
+        f'print(json.dumps([m for m in {HEAVY_MODULES!r} '
+        'if m in sys.modules]))'
+    )
+    output = subprocess.run(  # nosec:B603
+        [sys.executable, '-c', code],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    assert json.loads(output.splitlines()[-1]) == []
@@ -0,0 +1,184 @@
+import transaction
+from datetime import timedelta
+from email.headerregistry import Address
+from sedate import utcnow
+from sqlalchemy import select
+
+from privatim.mail import MailState
+from privatim.mail.outbox import deliver_queued_mails
+from privatim.mail.outbox import outbox_depth
+from privatim.mail.outbox import queue_mail
+from privatim.mail.outbox import queue_template_mail
+from privatim.models import QueuedMail
+from tests.shared.postmark import stand_in_mailer
+
+
+def queued(session):
+    return session.scalars(select(QueuedMail).order_by(QueuedMail.id)).all()
+
+
+def test_deliver_queued_mails(session, mailer):
+    queue_mail(
+        session,
+        Address('Sender', addr_spec='sender@example.com'),
+        [
+            Address('First', addr_spec='first@example.com'),
+            Address('Second', addr_spec='second@example.com'),
+        ],
+        'Subject',
+        'Content',
+        tag='tagged',
+        attachments=[{
+            'filename': 'test.txt',
+            'content': b'\x00binary',
+            'content_type': 'text/plain',
+        }],
+    )
+    queue_template_mail(
+        session,
+        None,
+        Address('Recipient', addr_spec='recipient@example.com'),
+        'password-reset',
+        {'name': 'Recipient'},
+    )
+    session.flush()
+    assert mailer.mails == []
+    assert outbox_depth(session)[MailState.queued] == 2
+
+    report = deliver_queued_mails(session, mailer)
+    assert report.sent == 2
+    assert report.deferred == report.failed == 0
+    assert queued(session) == []
+
+    mail, template_mail = mailer.mails
+    assert mail['sender'] == Address('Sender', addr_spec='sender@example.com')
+    assert [r.addr_spec for r in mail['receivers']] == [
+        'first@example.com', 'second@example.com'
+    ]
+    assert mail['subject'] == 'Subject'
+    assert mail['tag'] == 'tagged'
+    assert mail['attachments'][0]['content'] == b'\x00binary'
+
+    assert template_mail['receivers'].display_name == 'Recipient'
+    assert template_mail['template'] == 'dummy-password-reset'
+    assert template_mail['data'] == {'name': 'Recipient'}
+
+
+def test_queued_mails_are_transactional(session, mailer):
+    queue_mail(session, None, Address(addr_spec='a@example.com'), 'A', 'A')
+    transaction.abort()
+    assert queued(session) == []
+
+    queue_mail(session, None, Address(addr_spec='b@example.com'), 'B', 'B')
+    transaction.commit()
+    assert len(queued(session)) == 1
+
+
+def test_deliver_queued_mails_in_batches(session, mailer):
+    for index in range(5):
+        queue_mail(
+            session, None, Address(addr_spec=f'{index}@example.com'), 'S', 'C'
+        )
+    session.flush()
+
+    commits = []
+    report = deliver_queued_mails(
+        session, mailer, batch_size=2, commit=lambda: commits.append(1)
+    )
+    assert report.sent == 5
+    assert len(commits) == 3
+    # in the order they have been queued
+    assert [m['receivers'].addr_spec for m in mailer.mails] == [
+        f'{index}@example.com' for index in range(5)
+    ]
+
+
+def test_deliver_queued_mails_retries_temporary_failures(session, mailer):
+    queue_mail(session, None, Address(addr_spec='a@example.com'), 'S', 'C')
+    session.flush()
+
+    mailer.error_state = MailState.temporary_failure
+    report = deliver_queued_mails(session, mailer, max_attempts=2)
+    assert report.deferred == 1
+    mail, = queued(session)
+    assert mail.attempts == 1
+    assert mail.state == MailState.queued
+    assert mail.next_attempt > utcnow()
+
+    # not due yet
+    assert deliver_queued_mails(session, mailer).deferred == 0
+
+    mail.next_attempt = utcnow() - timedelta(seconds=1)
+    session.flush()
+    report = deliver_queued_mails(session, mailer, max_attempts=2)
+    assert report.failed == 1
+    assert mail.attempts == 2
+    assert mail.state == MailState.failed
+    assert outbox_depth(session) == {
+        MailState.queued: 0,
+        MailState.failed: 1,
+        MailState.inactive_recipient: 0,
+    }
+
+
+def test_deliver_queued_mails_mail_error(session, mailer):
+    queue_template_mail(
+        session, None, Address(addr_spec='a@example.com'), 'welcome', {}
+    )
+    session.flush()
+
+    mailer.raise_mail_error = True
+    assert deliver_queued_mails(session, mailer).deferred == 1
+    mail, = queued(session)
+    assert mail.last_error == 'Failed sending mail.'
+
+    mailer.raise_mail_error = False
+    mail.next_attempt = utcnow() - timedelta(seconds=1)
+    session.flush()
+    assert deliver_queued_mails(session, mailer).sent == 1
+    assert queued(session) == []
+
+
+def test_deliver_queued_mails_inactive_recipient(session, mailer):
+    queue_mail(session, None, Address(addr_spec='a@example.com'), 'S', 'C')
+    session.flush()
+
+    mailer.error_state = MailState.inactive_recipient
+    assert deliver_queued_mails(session, mailer).failed == 1
+    mail, = queued(session)
+    assert mail.state == MailState.inactive_recipient
+
+
+def test_deliver_queued_mails_postmark_outage(session, postmark_server):
+    queue_mail(session, None, Address(addr_spec='a@example.com'), 'S', 'C')
+    queue_template_mail(
+        session, None, Address(addr_spec='b@example.com'), 'welcome', {}
+    )
+    session.flush()
+
+    # both batches fail, even after the retries of the session
+    postmark_server.responses = [
+        (503, {}, {'Message': 'Unavailable', 'ErrorCode': 0}),
+        (502, {}, b'<html>Bad Gateway</html>'),
+    ] * 2
+    mailer = stand_in_mailer(postmark_server.url, retries=1)
+    report = deliver_queued_mails(session, mailer)
+    assert report.deferred == 2
+    assert report.failed == 0
+    for mail in queued(session):
+        assert mail.state == MailState.queued
+        assert mail.attempts == 1
+        assert mail.last_error == 'temporary_failure'
+        mail.next_attempt = utcnow() - timedelta(seconds=1)
+    session.flush()
+
+    # the API is available again
+    report = deliver_queued_mails(session, mailer)
+    mailer.close()
+    assert report.sent == 2
+    assert queued(session) == []
+    assert [path for path, *__ in postmark_server.requests] == [
+        '/email/batch', '/email/batch',
+        '/email/batchWithTemplates', '/email/batchWithTemplates',
+        '/email/batch', '/email/batchWithTemplates',
+    ]
@@ -1,5 +1,6 @@
 import base64
 import json
+import socket
 from email.headerregistry import Address
 from email.policy import SMTP
 
@@ -16,6 +17,7 @@ from privatim.mail.mailer import needs_header_encode
 from privatim.mail.mailer import plus_regex
 from privatim.testing import MockResponse
 from privatim.testing import verify_interface
+from tests.shared.postmark import stand_in_mailer
 
 
 def addr(email, name=''):
@@ -888,3 +890,107 @@ def test_get_message_state(mock_requests):
     ]})
     mock_requests.set_response(response)
     assert mailer.get_message_state('some-message-id') == MailState.read
+
+
+def test_send_keeps_connection_alive(postmark_server):
+    mailer = stand_in_mailer(postmark_server.url)
+    for __ in range(3):
+        assert mailer.send(
+            None, addr('recipient@example.com'), 'Subject', 'Content'
+        ) == 'id'
+    mailer.close()
+
+    assert len(postmark_server.requests) == 3
+    # all requests were sent over the same connection
+    clients = {client for path, client, body in postmark_server.requests}
+    assert len(clients) == 1
+
+
+def test_send_retries_unavailable(postmark_server):
+    postmark_server.responses = [
+        (503, {}, {'Message': 'Unavailable', 'ErrorCode': 0}),
+        (429, {'Retry-After': '0'}, {'Message': 'Too many', 'ErrorCode': 0}),
+    ]
+    mailer = stand_in_mailer(postmark_server.url)
+    assert mailer.send(
+        None, addr('recipient@example.com'), 'Subject', 'Content'
+    ) == 'id'
+    mailer.close()
+
+    assert [path for path, *__ in postmark_server.requests] == [
+        '/email', '/email', '/email'
+    ]
+
+
+def test_send_gives_up_after_retries(postmark_server):
+    postmark_server.responses = [
+        (500, {}, {'Message': 'Server error', 'ErrorCode': 0}),
+    ] * 3
+    mailer = stand_in_mailer(postmark_server.url, retries=2)
+    with pytest.raises(MailError, match='Server error'):
+        mailer.send(None, addr('recipient@example.com'), 'Subject', 'Body')
+    mailer.close()
+
+    assert len(postmark_server.requests) == 3
+
+
+def test_bulk_send_retries_unavailable(postmark_server):
+    postmark_server.responses = [
+        (503, {}, {'Message': 'Unavailable', 'ErrorCode': 0}),
+        (200, {}, [{'MessageID': 'id', 'ErrorCode': 0}]),
+    ]
+    mailer = stand_in_mailer(postmark_server.url)
+    assert mailer.bulk_send([{
+        'receivers': addr('recipient@example.com'),
+        'subject': 'Subject',
+        'content': 'Content',
+    }]) == ['id']
+    mailer.close()
+
+    assert len(postmark_server.requests) == 2
+
+
+def test_bulk_send_unavailable(postmark_server):
+    mail = {
+        'receivers': addr('recipient@example.com'),
+        'subject': 'Subject',
+        'content': 'Content',
+    }
+    postmark_server.responses = [
+        (503, {}, {'Message': 'Unavailable', 'ErrorCode': 0}),
+    ] * 2 + [
+        # e.g. a proxy in front of the API
+        (502, {}, b'<html>Bad Gateway</html>'),
+    ] * 2 + [
+        (200, {}, b'<html>Maintenance</html>'),
+        (422, {}, {'Message': 'Invalid request', 'ErrorCode': 300}),
+    ]
+    mailer = stand_in_mailer(postmark_server.url, retries=1)
+    # the outages are temporary failures, which are retried later
+    assert mailer.bulk_send([mail]) == [MailState.temporary_failure]
+    assert mailer.bulk_send([mail]) == [MailState.temporary_failure]
+    assert mailer.bulk_send([mail]) == [MailState.temporary_failure]
+    # invalid requests won't succeed later
+    assert mailer.bulk_send([mail]) == [MailState.failed]
+    mailer.close()
+
+    assert len(postmark_server.requests) == 6
+
+
+def test_send_unreachable():
+    # reserve a port nobody listens on
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    mailer = stand_in_mailer(f'http://127.0.0.1:{port}', retries=1)
+    with pytest.raises(MailConnectionError):
+        mailer.send(None, addr('recipient@example.com'), 'Subject', 'Body')
+
+    # failed bulk sends are temporary failures
+    assert mailer.bulk_send([{
+        'receivers': addr('recipient@example.com'),
+        'subject': 'Subject',
+        'content': 'Content',
+    }]) == [MailState.temporary_failure]
+    mailer.close()
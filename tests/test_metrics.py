@@ -0,0 +1,72 @@
+import pytest
+from prometheus_client import Gauge, Histogram, values
+
+from privatim.metrics import child_exit, generate_metrics, instrument_pool
+
+
+@pytest.fixture(scope='function')
+def app_settings(app_settings):
+    app_settings['metrics.token'] = 'secret'
+    yield app_settings
+
+
+def test_metrics_view(client, engine):
+    # the test app is bound to a connection of this engine
+    instrument_pool(engine)
+    client.login_admin()
+    client.get('/people')
+
+    client.get('/metrics', status=403)
+    client.get(
+        '/metrics', headers={'Authorization': 'Bearer wrong'}, status=403
+    )
+
+    page = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert page.content_type == 'text/plain'
+    assert (
+        'privatim_request_duration_seconds_count'
+        '{method="GET",route="people"}'
+    ) in page.text
+    assert 'privatim_response_size_bytes_bucket' in page.text
+    assert 'privatim_db_pool_checkouts_total' in page.text
+    assert 'privatim_mail_outbox{state="queued"} 0.0' in page.text
+
+
+def test_metrics_multiprocess(tmp_path, monkeypatch):
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+
+    # simulate two worker processes writing to the shared directory
+    for pid in (1001, 1002):
+        monkeypatch.setattr(
+            values, 'ValueClass', values.MultiProcessValue(lambda: pid)
+        )
+        histogram = Histogram('privatim_test_seconds', 'Test', registry=None)
+        histogram.observe(0.2)
+
+    body, content_type = generate_metrics()
+    assert content_type.startswith('text/plain')
+    assert b'privatim_test_seconds_count 2.0' in body
+
+
+def test_metrics_child_exit(tmp_path, monkeypatch):
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+
+    for pid in (1001, 1002):
+        monkeypatch.setattr(
+            values, 'ValueClass', values.MultiProcessValue(lambda: pid)
+        )
+        gauge = Gauge(
+            'privatim_test_live', 'Test', registry=None,
+            multiprocess_mode='livesum'
+        )
+        gauge.set(3)
+
+    body, content_type = generate_metrics()
+    assert b'privatim_test_live 6.0' in body
+
+    class Worker:
+        pid = 1001
+
+    child_exit(None, Worker())
+    body, content_type = generate_metrics()
+    assert b'privatim_test_live 3.0' in body
@@ -0,0 +1,32 @@
+from io import BytesIO
+from PIL import Image
+import pytest
+
+from privatim.pyavatar import AvatarRenderer, PyAvatar, RenderingSizeError
+
+
+def test_avatar_renderer_matches_pyavatar():
+    renderer = AvatarRenderer(size=250, char_spacing=35)
+    content = renderer.render('jd', '#1abc9c')
+
+    img = Image.open(BytesIO(content))
+    assert img.size == (250, 250)
+    assert img.mode == 'RGB'
+
+    expected = PyAvatar('jd', size=250, char_spacing=35, color='#1abc9c')
+    assert img.tobytes() == expected.image.tobytes()
+
+    # the same text and color is only rendered once
+    assert renderer.render('JD', '#1abc9c') is content
+
+
+def test_avatar_renderer_validation():
+    with pytest.raises(RenderingSizeError):
+        AvatarRenderer(size=10)
+
+    renderer = AvatarRenderer()
+    with pytest.raises(ValueError):
+        renderer.render('ABCD', '#1abc9c')
+
+    # users without a name still get an avatar
+    assert renderer.render('', '#1abc9c')
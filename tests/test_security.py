@@ -0,0 +1,123 @@
+import transaction
+from pyramid.authorization import Authenticated
+from sedate import utcnow
+from sqlalchemy import event, update
+
+from privatim.models import User
+from privatim.security import get_identity, identity_cache
+from privatim.security_policy import SessionSecurityPolicy
+from privatim.testing import DummyRequest
+
+
+def count_statements(engine):
+    statements = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    return statements
+
+
+def test_identity_cache(pg_config):
+    session = pg_config.dbsession
+    user = User(email='max@example.org', first_name='Max', last_name='Müller')
+    session.add(user)
+    session.flush()
+    user_id = user.id
+    transaction.commit()
+
+    identity = get_identity(session, user_id)
+    assert identity.id == user_id
+    assert identity.fullname == 'Max Müller (MM)'
+    assert identity.profile_pic_id is None
+
+    statements = count_statements(session.bind)
+    assert get_identity(session, user_id) is identity
+    assert statements == []
+
+    # editing the user invalidates the entry
+    user = session.get(User, user_id)
+    user.locale = 'fr'
+    session.flush()
+    transaction.commit()
+    assert get_identity(session, user_id).locale == 'fr'
+
+    session.delete(session.get(User, user_id))
+    session.flush()
+    transaction.commit()
+    assert get_identity(session, user_id) is None
+
+
+def test_identity_cache_maxsize(pg_config):
+    session = pg_config.dbsession
+    users = [User(email=f'{i}@example.org') for i in range(3)]
+    session.add_all(users)
+    session.flush()
+
+    identity_cache.maxsize = 2
+    try:
+        for user in users:
+            get_identity(session, user.id)
+        assert list(identity_cache.entries) == [users[1].id, users[2].id]
+    finally:
+        identity_cache.maxsize = 1024
+
+
+def test_principals_after_password_change(pg_config):
+    session = pg_config.dbsession
+    user = User(email='max@example.org', first_name='Max', last_name='Müller')
+    user.set_password('test')
+    session.add(user)
+    session.flush()
+    user_id = user.id
+    transaction.commit()
+
+    policy = SessionSecurityPolicy()
+    request = DummyRequest()
+    policy.remember(request, user_id)
+    assert policy.identity(request).id == user_id
+    assert policy.principals(request) == [Authenticated, f'user:{user_id}']
+
+    # a password change invalidates existing sessions
+    session.get(User, user_id).set_password('new')
+    session.flush()
+    transaction.commit()
+    request = DummyRequest(session=request.session)
+    assert policy.identity(request) is None
+    assert 'auth.userid' not in request.session
+
+
+def test_authentication_is_not_cached(pg_config):
+    session = pg_config.dbsession
+    user = User(email='max@example.org', first_name='Max', last_name='Müller')
+    user.set_password('test')
+    session.add(user)
+    session.flush()
+    user_id = user.id
+    transaction.commit()
+
+    policy = SessionSecurityPolicy()
+    request = DummyRequest()
+    policy.remember(request, user_id)
+    assert policy.identity(request).id == user_id
+    # the user is checked once per request
+    statements = count_statements(session.bind)
+    assert policy.authenticated_userid(request) == user_id
+    assert statements == []
+
+    # changes by other processes don't invalidate the cached identity
+    for statement in (
+        update(User)
+        .where(User.id == user_id)
+        .values(last_password_change=utcnow()),
+        update(User).where(User.id == user_id).values(locale='fr'),
+    ):
+        with session.bind.begin() as connection:
+            connection.execute(statement)
+    assert identity_cache.entries[user_id][1].locale is None
+
+    # but the password change is noticed on the next request
+    request = DummyRequest(session=request.session)
+    assert policy.authenticated_userid(request) is None
+    assert policy.identity(request) is None
@@ -0,0 +1,144 @@
+import time
+import pytest
+from pyramid.response import Response
+from pyramid.testing import DummyRequest
+from sqlalchemy import func, select
+
+from privatim.models import HTTPSession
+from privatim.sessions import session_factory_from_settings
+
+
+@pytest.fixture(scope='function')
+def app_settings(app_settings):
+    app_settings['session.type'] = 'postgresql'
+    yield app_settings
+
+
+def make_request(session_factory, cookie=None):
+    request = DummyRequest()
+    if cookie is not None:
+        request.cookies['privatim'] = cookie
+    session = session_factory(request)
+    return request, session
+
+
+def finish(request):
+    response = Response()
+    for callback in request.response_callbacks:
+        callback(request, response)
+    return response.headers.get('Set-Cookie')
+
+
+def session_count(engine):
+    with engine.connect() as connection:
+        return connection.scalar(
+            select(func.count()).select_from(HTTPSession)
+        )
+
+
+def store_data(engine):
+    with engine.connect() as connection:
+        return connection.scalars(select(HTTPSession.data)).all()
+
+
+def test_server_side_session(pg_config):
+    engine = pg_config.dbsession.bind
+    factory = session_factory_from_settings(
+        {'session.key': 'privatim', 'session.touch_interval': '60'}, engine
+    )
+
+    # untouched new sessions aren't stored
+    request, session = make_request(factory)
+    assert session.new
+    assert finish(request) is None
+    assert session_count(engine) == 0
+
+    request, session = make_request(factory)
+    session['foo'] = 'bar'
+    session.flash('hello')
+    cookie = finish(request)
+    assert cookie.startswith(f'privatim={session.id};')
+    assert session_count(engine) == 1
+    session_id = session.id
+
+    # reading the session (including an empty flash queue) doesn't write
+    request, session = make_request(factory, session_id)
+    assert not session.new
+    assert session['foo'] == 'bar'
+    assert session.pop_flash('other') == []
+    assert not session.dirty
+    assert finish(request) is None
+
+    # the access time is only updated once the interval has passed
+    request, session = make_request(factory, session_id)
+    session.now += 61
+    assert finish(request) is not None
+    request, session = make_request(factory, session_id)
+    assert session.accessed > session.created
+    assert session.pop_flash() == ['hello']
+    assert session.dirty
+    finish(request)
+
+    request, session = make_request(factory, session_id)
+    assert session.peek_flash() == []
+
+    # the stored id is hashed
+    with engine.connect() as connection:
+        assert connection.scalar(select(HTTPSession.id)) != session_id
+
+    # a new id takes over the data, the old one stops working
+    session.regenerate_id()
+    finish(request)
+    assert session.id != session_id
+    request, old = make_request(factory, session_id)
+    assert old.new
+    request, session = make_request(factory, session.id)
+    assert session['foo'] == 'bar'
+
+    # other sessions are only stored when saved explicitly
+    other = session.get_by_id(session.id)
+    other['foo'] = 'baz'
+    assert session.get_by_id('unknown') is None
+    other.save()
+    assert store_data(engine) == [{'foo': 'baz'}]
+
+    session.invalidate()
+    assert 'Max-Age=0' in finish(request)
+    assert session_count(engine) == 0
+
+
+def test_server_side_session_timeout(pg_config):
+    engine = pg_config.dbsession.bind
+    factory = session_factory_from_settings({'session.timeout': '60'}, engine)
+
+    request, session = make_request(factory)
+    session['foo'] = 'bar'
+    session.now -= 120
+    finish(request)
+
+    request, session = make_request(factory, session.id)
+    assert session.new
+    assert 'foo' not in session
+
+
+def test_purge_sessions(pg_config):
+    engine = pg_config.dbsession.bind
+    store = session_factory_from_settings({}, engine).store
+
+    now = time.time()
+    for index in range(5):
+        store.save(f'old{index}', {}, now - 7200, now - 7200)
+    store.save('recent', {'foo': 'bar'}, now, now)
+
+    assert store.purge(now - 3600, batch_size=2) == 5
+    assert session_count(engine) == 1
+    assert store.load('recent').data == {'foo': 'bar'}
+
+
+def test_login_with_server_side_session(client, engine):
+    page = client.login_admin().maybe_follow()
+    assert page.request.path == '/activities'
+    assert session_count(engine) == 1
+
+    page = client.get('/people')
+    assert page.status_code == 200
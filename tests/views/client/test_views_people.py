@@ -0,0 +1,23 @@
+from privatim.models import User
+
+
+def test_view_people_filter(client):
+    user = User(email='max@example.org', first_name='Max', last_name='Müller')
+    client.db.add(user)
+    client.db.commit()
+
+    client.login_admin()
+    page = client.get('/people')
+    assert 'Max Müller' in page
+    assert 'John Doe' in page
+
+    page = client.get('/people', params={'q': 'müller'})
+    assert 'Max Müller' in page
+    assert 'John Doe' not in page
+
+    page = client.get('/people', params={'q': 'nobody'})
+    assert 'Max Müller' not in page
+    assert 'Keine Personen gefunden' in page
+
+    page = client.get(f'/person/{user.id}')
+    assert page.status_code == 200
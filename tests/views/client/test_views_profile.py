@@ -1,4 +1,6 @@
+from io import BytesIO
 from pathlib import Path
+from PIL import Image
 from sqlalchemy import select
 from webtest.forms import Upload
 from privatim.models import GeneralFile
@@ -28,6 +30,13 @@ def test_profile_image_upload(client):
     page = page.form.submit().follow()
     assert 'Ungültige Bilddatei' in page
 
+    # Images with too many pixels are not decoded
+    output = BytesIO()
+    Image.new('1', (6000, 5000)).save(output, format='PNG')
+    page.form['profilePic'] = Upload('huge.png', output.getvalue())
+    page = page.form.submit().follow()
+    assert 'Das Bild ist zu gross' in page
+
     # Test case 6: Valid image file
     file = Path(__file__).parent / 'pic' / 'pict.png'
     bytes_profile_pic = file.read_bytes()
@@ -41,3 +50,32 @@ def test_profile_image_upload(client):
     general_file = client.db.execute(stmt).scalar_one_or_none()
     assert general_file is not None
     assert general_file.content == bytes_profile_pic
+
+
+def test_profile_image_variants(client):
+    client.login_admin()
+    page = client.get('/profile')
+
+    file = Path(__file__).parent / 'pic' / 'pict.png'
+    page.form['profilePic'] = Upload('pict.png', file.read_bytes())
+    page.form.submit().follow()
+
+    general_file = client.db.execute(
+        select(GeneralFile).where(GeneralFile.filename == 'pict.png')
+    ).scalar_one()
+    file_id = general_file.id
+
+    response = client.get(f'/download/file/{file_id}/80')
+    assert response.content_type == 'image/webp'
+    assert Image.open(BytesIO(response.body)).size == (80, 80)
+    assert 'max-age' in response.headers['Cache-Control']
+
+    # only the predefined sizes are available
+    client.get(f'/download/file/{file_id}/81', status=404)
+
+    # files without variants fall back to the original
+    other = GeneralFile('other.png', b'not really an image')
+    client.db.add(other)
+    client.db.commit()
+    response = client.get(f'/download/file/{other.id}/80')
+    assert response.body == b'not really an image'
@@ -1,7 +1,12 @@
 
+from privatim.models import AgendaItem, User
+from privatim.models.file import SearchableFile
+from privatim.route_factories import default_meeting_factory
 from privatim.testing import DummyRequest
-from privatim.views import move_agenda_item
+from privatim.views import meeting_view, move_agenda_item
 from tests.shared.utils import (
+    count_statements,
+    create_meeting,
     create_meeting_with_agenda_items,
     verify_sequential_positions,
 )
@@ -131,3 +136,67 @@ def test_sortable_agenda_items_view_2(pg_config):
 # ['Introduction', 1],
 # ['Budget Review', 2],
 # ['Next Steps', 3]]
+
+
+def test_meeting_view_issues_fixed_number_of_statements(pg_config):
+    for name, pattern in (
+        ('meeting', '/meeting/{id}'),
+        ('meetings', '/working_groups/{id}/meetings/'),
+        ('edit_meeting', '/meetings/{id}/edit'),
+        ('delete_meeting', '/meetings/{id}/delete'),
+        ('copy_agenda_item', '/meetings/{id}/copy_agenda_item'),
+        ('export_meeting_as_pdf_view', '/meetings/{id}/export'),
+        ('export_meeting_as_docx_view', '/meetings/{id}/export/docx'),
+        ('edit_agenda_item', '/agenda_items/{id}/edit'),
+        ('delete_agenda_item', '/agenda_items/{id}/delete'),
+        ('sortable_agenda_items', '/meetings/agenda_items/{id}/move/'
+                                  '{subject_id}/{direction}/{target_id}'),
+        ('person', '/person/{id}'),
+        ('download_file', '/download/file/{id}'),
+    ):
+        pg_config.add_route(name, pattern)
+    pg_config.add_static_view('static', 'privatim:static')
+
+    db = pg_config.dbsession
+    attendees = [
+        User(email=f'user{i}@example.org', first_name='User', last_name=f'{i}')
+        for i in range(20)
+    ]
+    files = [
+        SearchableFile(
+            filename=f'document{i}.txt',
+            content=b'Some content',
+            content_type='text/plain',
+        )
+        for i in range(5)
+    ]
+    meeting = create_meeting(attendees=attendees, files=files)
+    db.add(meeting)
+    db.flush()
+    for i in range(25):
+        db.add(AgendaItem(
+            title=f'Item {i}',
+            description='Description',
+            meeting=meeting,
+            position=i,
+        ))
+    db.flush()
+    meeting_id = meeting.id
+    pg_config.testing_securitypolicy(userid=attendees[0].id)
+
+    # start from an empty identity map, like a fresh request would
+    db.expunge_all()
+    request = DummyRequest(add_action_menu_entries=lambda entries: None)
+    request.matchdict = {'id': meeting_id}
+    assert request.user is not None
+
+    with count_statements(db) as statements:
+        context = default_meeting_factory(request)
+        result = meeting_view(context, request)
+        # render the lazy parts of the page
+        str(result['meeting_attendees'])
+        assert len(result['agenda_items']) == 25
+        assert len(result['documents']) == 5
+
+    # meeting, agenda items, attendees, files, meeting count, preferences
+    assert len(statements) <= 6, statements
@@ -1,5 +1,6 @@
 import logging
 
+from privatim.mail.outbox import deliver_queued_mails
 from privatim.testing import DummyRequest
 from privatim.views.password_retrieval import password_retrieval_view
 
@@ -31,6 +32,8 @@ def test_view_submit(pg_config, user, mailer, caplog):
     assert 'An email has been sent' in messages[0]['message']
 
     # Mail
+    assert len(mailer.mails) == 0
+    assert deliver_queued_mails(session, mailer).sent == 1
     assert len(mailer.mails) == 1
     message = mailer.mails[0]
     assert message['receivers'].display_name == 'gregory@house.com'
@@ -58,6 +61,8 @@ def test_view_submit_username(pg_config, user, mailer):
     assert result.status_int == 302
 
     # Mail
+    assert len(mailer.mails) == 0
+    assert deliver_queued_mails(session, mailer).sent == 1
     assert len(mailer.mails) == 1
     message = mailer.mails[0]
     assert message['receivers'].display_name == 'Gregory House'
@@ -1,12 +1,16 @@
 from webob.multidict import MultiDict
 from sqlalchemy import select, exists, func
-from privatim.models import User, WorkingGroup
+from privatim.models import Comment, User, WorkingGroup
 from privatim.testing import DummyRequest
 from privatim.views.people import (
+    PEOPLE_PER_PAGE,
     add_user_view,
     edit_user_view,
     delete_user_view,
+    people_view,
+    person_view,
 )
+from tests.shared.utils import CustomDummyRequest
 
 
 def test_add_user_view(pg_config, mailer):
@@ -145,3 +149,69 @@ def test_delete_user_view(pg_config):
         select(~exists().where(User.email == 'delete@example.com'))
     )
     assert not_exists
+
+
+def test_people_view_pagination_and_filter(pg_config):
+    pg_config.add_route('person', '/person/{id}')
+    pg_config.add_route('edit_user', '/person/{id}/edit')
+    pg_config.add_route('delete_user', '/person/{id}/delete')
+    db = pg_config.dbsession
+    db.add_all(
+        User(
+            email=f'user{i:03d}@example.com',
+            first_name='Person',
+            last_name=f'Number{i:03d}',
+        )
+        for i in range(PEOPLE_PER_PAGE + 5)
+    )
+    db.add(User(email='jane@example.com', first_name='Jane', last_name='Doe'))
+    db.add(User(
+        email='admin@example.com', first_name='Admin', last_name='Aaron'
+    ))
+    db.flush()
+
+    data = people_view(CustomDummyRequest(params=MultiDict({'q': 'admin'})))
+    assert [p['name'] for p in data['people']] == ['Aaron Admin']
+    assert data['people'][0]['is_admin']
+    db.delete(db.scalars(select(User).filter_by(first_name='Admin')).one())
+    db.flush()
+
+    data = people_view(CustomDummyRequest())
+    assert len(data['people']) == PEOPLE_PER_PAGE
+    assert data['people'][0]['name'] == 'Doe Jane'
+    assert not data['page'].has_previous
+    assert data['page'].has_next
+
+    data = people_view(CustomDummyRequest(params=MultiDict({'page': '2'})))
+    assert len(data['people']) == 6
+    assert data['page'].has_previous
+    assert not data['page'].has_next
+
+    # the search term is matched case insensitively and kept in the links
+    data = people_view(CustomDummyRequest(params=MultiDict({'q': 'JANE'})))
+    assert [p['name'] for p in data['people']] == ['Doe Jane']
+    assert not data['people'][0]['is_admin']
+    assert data['term'] == 'JANE'
+
+    # wildcards in the search term are taken literally
+    data = people_view(CustomDummyRequest(params=MultiDict({'q': '%'})))
+    assert data['people'] == []
+
+
+def test_person_view_hides_deleted_comments(pg_config):
+    pg_config.add_route('consultation', '/consultation/{id}')
+    pg_config.add_static_view('static', 'privatim:static')
+    db = pg_config.dbsession
+    user = User(email='jane@example.com', first_name='Jane', last_name='Doe')
+    db.add(user)
+    db.add(Comment('<p>Visible</p>', user, target_id=user.id))
+    db.add(Comment('<p>Removed</p>', user, target_id=user.id))
+    db.flush()
+    removed = db.scalars(select(Comment).filter_by(
+        content='<p>Removed</p>'
+    )).one()
+    removed.deleted = True
+    db.flush()
+
+    data = person_view(user, DummyRequest())
+    assert [c['content'] for c in data['comments']] == ['Visible']
@@ -1,3 +1,4 @@
+from pyramid.httpexceptions import HTTPNotFound
 from tests.shared.utils import Bunch
 from sedate import utcnow
 from sqlalchemy import select, func
@@ -11,6 +12,8 @@ from privatim.models import (
 )
 from privatim.views import update_single_agenda_item_state, \
     update_bulk_agenda_items_state
+from privatim.views.agenda_items import delete_agenda_item_view
+from privatim.testing import DummyRequest
 
 
 def test_update_agenda_item_state(pg_config):
@@ -51,15 +54,10 @@ def test_update_agenda_item_state(pg_config):
     assert response == {'status': 'success'}
 
     # Verify preference was created
-    preference = db.execute(
-        select(AgendaItemStatePreference).where(
-            AgendaItemStatePreference.agenda_item_id == agenda_item.id,
-            AgendaItemStatePreference.user_id == user.id,
-        )
-    ).scalar_one()
-
-    assert preference is not None
-    assert preference.state == AgendaItemDisplayState.EXPANDED.value
+    states = AgendaItemStatePreference.get_states(
+        db, user.id, agenda_item.meeting_id
+    )
+    assert states == {agenda_item.id: AgendaItemDisplayState.EXPANDED}
 
     # Test updating existing preference to COLLAPSED
     request.json_body = {'state': AgendaItemDisplayState.COLLAPSED.value}
@@ -67,20 +65,17 @@ def test_update_agenda_item_state(pg_config):
     assert response == {'status': 'success'}
 
     # Verify preference was updated
-    preference = db.execute(
-        select(AgendaItemStatePreference).where(
-            AgendaItemStatePreference.agenda_item_id == agenda_item.id,
-            AgendaItemStatePreference.user_id == user.id,
-            )
-    ).scalar_one()
-    assert preference.state == AgendaItemDisplayState.COLLAPSED.value
+    states = AgendaItemStatePreference.get_states(
+        db, user.id, agenda_item.meeting_id
+    )
+    assert states == {agenda_item.id: AgendaItemDisplayState.COLLAPSED}
 
-    # Verify only one preference exists
+    # Verify only one record exists for the user and meeting
     preference_count = db.scalar(
         select(func.count())
         .select_from(AgendaItemStatePreference)
         .where(
-            AgendaItemStatePreference.agenda_item_id == agenda_item.id,
+            AgendaItemStatePreference.meeting_id == agenda_item.meeting_id,
             AgendaItemStatePreference.user_id == user.id,
         )
     )
@@ -135,15 +130,11 @@ def test_bulk_update_agenda_items_state(pg_config):
     assert response == {'status': 'success', 'updated': 3}
 
     # Verify preferences were created for all items
-    for agenda_item in agenda_items:
-        preference = db.execute(
-            select(AgendaItemStatePreference).where(
-                AgendaItemStatePreference.agenda_item_id == agenda_item.id,
-                AgendaItemStatePreference.user_id == user.id,
-            )
-        ).scalar_one()
-        assert preference is not None
-        assert preference.state == AgendaItemDisplayState.EXPANDED.value
+    states = AgendaItemStatePreference.get_states(db, user.id, meeting.id)
+    assert states == {
+        agenda_item.id: AgendaItemDisplayState.EXPANDED
+        for agenda_item in agenda_items
+    }
 
     # Test updating existing preferences to COLLAPSED
     request.json_body = {'state': AgendaItemDisplayState.COLLAPSED.value}
@@ -151,53 +142,40 @@ def test_bulk_update_agenda_items_state(pg_config):
     assert response == {'status': 'success', 'updated': 3}
 
     # Verify all preferences were updated
-    for agenda_item in agenda_items:
-        preference = db.execute(
-            select(AgendaItemStatePreference).where(
-                AgendaItemStatePreference.agenda_item_id == agenda_item.id,
-                AgendaItemStatePreference.user_id == user.id,
-            )
-        ).scalar_one()
-        assert preference.state == AgendaItemDisplayState.COLLAPSED.value
-
-    # Verify only one preference exists per agenda item
-    for agenda_item in agenda_items:
-        preference_count = db.scalar(
-            select(func.count())
-            .select_from(AgendaItemStatePreference)
-            .where(
-                AgendaItemStatePreference.agenda_item_id == agenda_item.id,
-                AgendaItemStatePreference.user_id == user.id,
-            )
-        )
-        assert preference_count == 1
-
-    # Test mixed state scenario - delete one preference
-    first_item_preference = db.execute(
-        select(AgendaItemStatePreference).where(
-            AgendaItemStatePreference.agenda_item_id == agenda_items[0].id,
-            AgendaItemStatePreference.user_id == user.id,
-        )
-    ).scalar_one()
-    db.delete(first_item_preference)
-    db.flush()
-
-    # Update states again
+    states = AgendaItemStatePreference.get_states(db, user.id, meeting.id)
+    assert states == {
+        agenda_item.id: AgendaItemDisplayState.COLLAPSED
+        for agenda_item in agenda_items
+    }
+
+    # Test mixed state scenario - expand a single item
+    request.matchdict = {'id': str(agenda_items[0].id)}
     request.json_body = {'state': AgendaItemDisplayState.EXPANDED.value}
+    update_single_agenda_item_state(request)
+    states = AgendaItemStatePreference.get_states(db, user.id, meeting.id)
+    assert states[agenda_items[0].id] == AgendaItemDisplayState.EXPANDED
+    assert states[agenda_items[1].id] == AgendaItemDisplayState.COLLAPSED
+
+    # A stale entry of a deleted agenda item is dropped by the bulk update
+    AgendaItemStatePreference.set_states(
+        db,
+        user.id,
+        meeting.id,
+        {'00000000-0000-0000-0000-000000000000': (
+            AgendaItemDisplayState.EXPANDED
+        )},
+    )
+    request.matchdict = {'id': str(meeting.id)}
     response = update_bulk_agenda_items_state(meeting, request)
     assert response['status'] == 'success'
 
-    # Verify first item got new preference and others were updated
-    new_preference = db.execute(
-        select(AgendaItemStatePreference).where(
-            AgendaItemStatePreference.agenda_item_id == agenda_items[0].id,
-            AgendaItemStatePreference.user_id == user.id,
-        )
-    ).scalar_one()
-    assert new_preference is not None
-    assert new_preference.state == AgendaItemDisplayState.EXPANDED.value
+    states = AgendaItemStatePreference.get_states(db, user.id, meeting.id)
+    assert states == {
+        agenda_item.id: AgendaItemDisplayState.EXPANDED
+        for agenda_item in agenda_items
+    }
 
-    # Check total preference count is still correct
+    # Check there is still a single record for the user
     total_preferences = db.scalar(
         select(func.count())
         .select_from(AgendaItemStatePreference)
@@ -205,4 +183,64 @@ def test_bulk_update_agenda_items_state(pg_config):
             AgendaItemStatePreference.user_id == user.id,
         )
     )
-    assert total_preferences == len(agenda_items)
+    assert total_preferences == 1
+
+
+def test_update_agenda_item_state_not_found(pg_config):
+    db = pg_config.dbsession
+    user = User(email='test@example.com')
+    db.add(user)
+    db.flush()
+
+    request = Bunch(
+        matchdict={'id': '00000000-0000-0000-0000-000000000000'},
+        json_body={'state': AgendaItemDisplayState.EXPANDED.value},
+        user=user,
+        dbsession=db,
+    )
+    assert isinstance(update_single_agenda_item_state(request), HTTPNotFound)
+    assert db.scalar(
+        select(func.count()).select_from(AgendaItemStatePreference)
+    ) == 0
+
+
+def test_delete_agenda_item_drops_states(pg_config):
+    pg_config.add_route('meeting', '/meeting/{id}')
+    db = pg_config.dbsession
+
+    users = [User(email=f'user{i}@example.com') for i in range(2)]
+    meeting = Meeting(
+        name='Test Meeting',
+        time=utcnow(),
+        attendees=users,
+        working_group=WorkingGroup(name='Test Group'),
+    )
+    kept, deleted = (
+        AgendaItem(
+            title=f'Test Item {i}',
+            description='Test Description',
+            meeting=meeting,
+            position=i,
+        )
+        for i in range(2)
+    )
+    db.add_all([*users, meeting, kept, deleted])
+    db.flush()
+
+    for user in users:
+        AgendaItemStatePreference.set_states(
+            db,
+            user.id,
+            meeting.id,
+            {
+                kept.id: AgendaItemDisplayState.EXPANDED,
+                deleted.id: AgendaItemDisplayState.EXPANDED,
+            },
+        )
+
+    delete_agenda_item_view(deleted, DummyRequest())
+    db.expire_all()
+
+    for user in users:
+        states = AgendaItemStatePreference.get_states(db, user.id, meeting.id)
+        assert states == {kept.id: AgendaItemDisplayState.EXPANDED}